@@ -0,0 +1,84 @@
+"""Benchmark of multilog's import time at startup: importing the drivers
+(and views) of all supported devices compared to importing only the
+devices configured in a config file. Each measurement is run in a fresh
+python interpreter.
+
+Usage (from multilog's main directory):
+    python3 ./benchmarks/startup_imports.py -c ./config.yml --gui
+"""
+from argparse import ArgumentParser
+import os
+import statistics
+import subprocess
+import sys
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from multilog import registry
+
+
+# executed in a fresh interpreter, argv: kind ("device" / "view"), device names
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import multilog.acquisition
+from multilog import registry
+failed = []
+for device_name in sys.argv[2:]:
+    try:
+        registry.load(registry.get_entry(device_name)[sys.argv[1]])
+    except Exception as e:
+        failed.append(f"{device_name} ({type(e).__name__}: {e})")
+print(time.perf_counter() - start)
+for device in failed:
+    print(device)
+"""
+
+
+def measure(kind, device_names, repetitions):
+    """Measure the import time in fresh interpreters.
+
+    Args:
+        kind (str): "device" or "view".
+        device_names (list): device names to be imported.
+        repetitions (int): number of measurements.
+
+    Returns:
+        tuple: (median time in s, list of devices that failed to import)
+    """
+    times = []
+    for _ in range(repetitions):
+        output = subprocess.check_output(
+            [sys.executable, "-c", SCRIPT, kind, *device_names],
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+            stderr=subprocess.DEVNULL,
+        ).decode().splitlines()
+        times.append(float(output[0]))
+    return statistics.median(times), output[1:]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark of multilog's import time.")
+    parser.add_argument("-c", "--config", default="./config.yml")
+    parser.add_argument("-n", "--repetitions", type=int, default=5)
+    parser.add_argument(
+        "--gui", action="store_true", help="include the views of the devices"
+    )
+    args = parser.parse_args()
+    with open(args.config, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    configured = [
+        device_name
+        for device_name in config["devices"]
+        if not config["devices"][device_name]["skip"]
+    ]
+    kinds = ["device", "view"] if args.gui else ["device"]
+    for kind in kinds:
+        for label, device_names in [
+            ("all devices", list(registry.DEVICES)),
+            ("configured devices", configured),
+        ]:
+            duration, failed = measure(kind, device_names, args.repetitions)
+            print(f"{kind} modules, {label} ({len(device_names)}): {duration * 1000:.0f} ms")
+            for device in failed:
+                print(f"    not importable: {device}")
@@ -0,0 +1,170 @@
+"""Benchmark of the stream compression (setting stream-compression of a
+device): CPU time versus bytes saved for the outputs of the different
+device types. The lines are compressed in blocks of --rows lines, as
+the writer thread does on each flush; a heat map of the IR camera is
+compressed as one block. Without --directory, synthetic data is used,
+otherwise the csv files of a measurement directory.
+
+Usage (from multilog's main directory):
+    python3 ./benchmarks/stream_compression.py --rows 1 10 100
+    python3 ./benchmarks/stream_compression.py -d ./measdata_2024-01-01_#01
+"""
+from argparse import ArgumentParser
+import datetime
+import glob
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from multilog.writer import compress
+
+METHODS = [("gzip", 1), ("gzip", 6), ("lzma", 0), ("lzma", 6)]
+
+
+def scalar_lines(rows=3600, columns=8, seed=0):
+    """Synthetic csv of a scalar device: 1 s time step, slowly drifting
+    values with noise.
+
+    Returns:
+        list: lines including header.
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    values = 20 + np.cumsum(rng.normal(0, 0.05, (rows, columns)), axis=0)
+    lines = [
+        "# datetime,s,-," + "-," * columns + "\n",
+        "time_abs,time_rel,seq," + "".join(f"value{i}," for i in range(columns)) + "\n",
+    ]
+    for i in range(rows):
+        timestamp = (start + datetime.timedelta(seconds=i)).isoformat(
+            timespec="milliseconds"
+        ).replace("T", " ")
+        lines.append(
+            f"{timestamp},{float(i)},{i}," + "".join(f"{v:.3f}," for v in values[i]) + "\n"
+        )
+    return lines
+
+
+def images_lines(rows=3600):
+    """Synthetic _images.csv of a camera.
+
+    Returns:
+        list: lines including header.
+    """
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    lines = ["# datetime,s,-,filename,\n", "time_abs,time_rel,seq,img-name,\n"]
+    for i in range(rows):
+        timestamp = (start + datetime.timedelta(seconds=i)).isoformat(
+            timespec="milliseconds"
+        ).replace("T", " ")
+        lines.append(f"{timestamp},{float(i)},{i},img_{i + 1:06},\n")
+    return lines
+
+
+def heat_map(seed=0):
+    """Synthetic heat map of the IR camera (480 x 640, as written with
+    np.savetxt).
+
+    Returns:
+        str
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:480, 0:640]
+    frame = 200 + 800 * np.exp(-((x - 320) ** 2 + (y - 240) ** 2) / 20000)
+    frame = np.round(frame + rng.normal(0, 0.3, frame.shape), 1)
+    return "".join(" ".join(f"{value:.2f}" for value in row) + "\n" for row in frame)
+
+
+def blocks(lines, rows):
+    """Split lines into blocks as written by the writer thread.
+
+    Args:
+        lines (list): lines, the first two are the header.
+        rows (int): lines per block.
+
+    Returns:
+        list: blocks (bytes), the header is the first block.
+    """
+    data = ["".join(lines[:2])]
+    data += ["".join(lines[i : i + rows]) for i in range(2, len(lines), rows)]
+    return [block.encode("utf-8") for block in data]
+
+
+def measure(data, compression, level):
+    """Compress blocks.
+
+    Args:
+        data (list): blocks (bytes).
+        compression (str): "gzip" or "lzma".
+        level (int): compression level.
+
+    Returns:
+        tuple: (compressed size in bytes, CPU time in s)
+    """
+    start = time.process_time()
+    size = sum(len(compress(block, compression, level)) for block in data)
+    return size, time.process_time() - start
+
+
+def report(label, data, count, unit="line"):
+    """Print size and CPU time of all methods.
+
+    Args:
+        label (str): name of the data set.
+        data (list): blocks (bytes).
+        count (int): number of samplings in the blocks.
+        unit (str, optional): name of a sampling. Defaults to "line".
+    """
+    raw = sum(len(block) for block in data)
+    print(f"{label}: {raw / 1e6:.2f} MB, {count} {unit}s, {len(data)} blocks")
+    for compression, level in METHODS:
+        size, cpu = measure(data, compression, level)
+        print(
+            f"    {compression} {level}: ratio {raw / size:5.1f}, "
+            f"saved {(raw - size) / 1e6:6.2f} MB, "
+            f"CPU {cpu / raw * 1e9:6.1f} ms/MB, {cpu / max(count, 1) * 1e3:8.3f} ms/{unit}"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark of the stream compression.")
+    parser.add_argument(
+        "-d", "--directory", help="measurement directory with csv files"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[100],
+        help="lines per block (samplings per flush)",
+    )
+    args = parser.parse_args()
+    if args.directory is None:
+        scalar = {"scalar device (synthetic)": scalar_lines()}
+        images = {"camera _images.csv (synthetic)": images_lines()}
+        heat_maps = {"IR camera heat map (synthetic)": [heat_map()]}
+    else:
+        scalar = {}
+        for filename in sorted(glob.glob(f"{args.directory}/*.csv")):
+            with open(filename, encoding="utf-8") as f:
+                scalar.update({os.path.basename(filename): f.readlines()})
+        images = {}
+        for filename in sorted(glob.glob(f"{args.directory}/*/_images.csv")):
+            with open(filename, encoding="utf-8") as f:
+                images.update({os.path.relpath(filename, args.directory): f.readlines()})
+        heat_maps = {}
+        for directory in sorted(glob.glob(f"{args.directory}/*/")):
+            filenames = sorted(glob.glob(f"{directory}img_*.csv"))[:10]
+            if filenames:
+                text = []
+                for filename in filenames:
+                    with open(filename, encoding="utf-8") as f:
+                        text.append(f.read())
+                heat_maps.update({f"{os.path.basename(directory[:-1])} heat maps": text})
+    for rows in args.rows:
+        for label, lines in {**scalar, **images}.items():
+            report(f"{label}, {rows} lines per block", blocks(lines, rows), len(lines) - 2)
+    for label, text in heat_maps.items():
+        report(label, [t.encode("utf-8") for t in text], len(text), "frame")
@@ -2,7 +2,6 @@
 
 from argparse import ArgumentParser
 
-from multilog.main import main
 from multilog import __version__
 
 
@@ -23,6 +22,36 @@ if __name__ == "__main__":
         help="directory where to put the output [optional, default='.']",
         default=".",
     )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="record without graphical user interface, stop with Ctrl+C [optional]",
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        help="recording duration in s for headless mode [optional, default: unlimited]",
+        default=None,
+    )
+    parser.add_argument(
+        "--to-csv",
+        metavar="DIR",
+        help="generate csv files from binary storage (npy, hdf5) in a measurement directory and exit [optional]",
+        default=None,
+    )
+    parser.add_argument(
+        "--nomad",
+        metavar="DIR",
+        help="write the image lists of the cameras to the NOMAD archive files in a measurement directory and exit [optional]",
+        default=None,
+    )
+    parser.add_argument(
+        "--recover",
+        metavar="DIR",
+        help="rebuild the output files of a measurement directory from its journal after a crash and exit [optional]",
+        default=None,
+    )
     parser.add_argument(
         "-v",
         "--version",
@@ -30,4 +59,26 @@ if __name__ == "__main__":
         version=f"{parser.prog} version {__version__}",
     )
     args = parser.parse_args()
-    main(args.config, args.out_dir)
+    if args.to_csv is not None:
+        from multilog.storage import convert
+
+        for filename in convert(args.to_csv):
+            print(f"written {filename}")
+    elif args.nomad is not None:
+        from multilog.archive import export
+
+        for filename in export(args.nomad):
+            print(f"written {filename}")
+    elif args.recover is not None:
+        from multilog.journal import recover
+
+        for filename in recover(args.recover):
+            print(f"rebuilt {filename}")
+    elif args.headless:
+        from multilog.acquisition import Acquisition
+
+        Acquisition(args.config, args.out_dir).run(args.duration)
+    else:
+        from multilog.main import main
+
+        main(args.config, args.out_dir)
@@ -0,0 +1,1228 @@
+"""This module contains the acquisition-part of multilog. It sets up the
+devices, samplers and output files and manages the sampling loop. It
+doesn't depend on PyQt widgets and can be used without GUI, e.g., for
+headless operation or embedded in other Python scripts:
+
+    from multilog.acquisition import Acquisition
+    Acquisition("./config.yml", "./output").run(duration=3600)
+"""
+from PyQt5.QtCore import (
+    Qt,
+    QCoreApplication,
+    QTimer,
+    QThread,
+    QObject,
+    pyqtSignal,
+)
+import datetime
+import yaml
+import shutil
+import signal
+import sys
+import os
+import subprocess
+import platform
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter_ns
+
+from . import archive, registry
+from .aio import IOEngine
+from .health import CircuitBreaker, is_valid, nan_like
+from .writer import Writer
+from .scheduler import Scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+# This metaclass is required because the pyqtSignal 'signal' must be a class varaible
+# see https://stackoverflow.com/questions/50294652/is-it-possible-to-create-pyqtsignals-on-instances-at-runtime-without-using-class
+class SignalMetaclass(type(QObject)):
+    """Metaclass used to create new signals on the fly, required to
+    setup Sampler class, see
+    https://stackoverflow.com/questions/50294652/is-it-possible-to-create-pyqtsignals-on-instances-at-runtime-without-using-class"""
+
+    def __new__(cls, name, bases, dct):
+        """Create new class including a pyqtSignal."""
+        dct["signal"] = pyqtSignal(object)
+        return super().__new__(cls, name, bases, dct)
+
+
+class Sampler(QObject, metaclass=SignalMetaclass):
+    """This class is used to sample the devices from separate threads.
+
+    Sampling steps are requested from the scheduler thread. If the
+    previous sampling is still running when a new step is requested
+    (overrun), the step is handled according to the policy:
+    - drop: the new step is discarded.
+    - coalesce: only the latest pending step is kept.
+    - queue: up to queue_size steps are kept.
+    Discarded and late steps are counted and written to
+    sampling_events.csv in the output directory.
+    """
+
+    # start sampling in sampler thread, connect to sample() after moveToThread()
+    signal_sample = pyqtSignal(object)
+    # queued behind running jobs, connect to barrier() after moveToThread()
+    signal_barrier = pyqtSignal(object)
+    POLICIES = ["drop", "coalesce", "queue"]
+    events_lock = threading.Lock()  # shared by all samplers
+
+    def __init__(self, devices, dt=None, policy="coalesce", queue_size=1):
+        """Create sampler object
+
+        Args:
+            devices (dict): devices to be sampled.
+            dt (int, optional): [ms] sampling time step, used to detect
+                late sampling steps. Defaults to None.
+            policy (str, optional): overrun policy: "drop", "coalesce"
+                or "queue". Defaults to "coalesce".
+            queue_size (int, optional): maximum number of pending
+                sampling steps for policy "queue". Defaults to 1.
+        """
+        super().__init__()
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f"Unknown overrun policy '{policy}'. Use one of {self.POLICIES}."
+            )
+        self.devices = devices
+        self.name = ", ".join(devices)
+        self.dt = None if dt is None else int(dt * 1e6)  # ns
+        self.policy = policy
+        self.queue_size = {"drop": 0, "coalesce": 1, "queue": queue_size}[policy]
+        self.rel_time = []  # relative time of saved samplings
+        self.lock = threading.Lock()
+        self.in_flight = False
+        self.pending = deque()
+        self.missed = 0
+        self.late = 0
+        self.events_file = None
+        self.timing = {}  # device: (request, response) [ns] perf_counter_ns
+        self.latency = {}  # device: statistics of request / response times
+        self.breakers = {}  # device: CircuitBreaker
+
+    def init_output(self, directory):
+        """Set the file used to record missed and late sampling steps.
+        It is shared by all samplers.
+
+        Args:
+            directory (str): output directory.
+        """
+        self.events_file = f"{directory}/sampling_events.csv"
+        with self.events_lock:
+            if not os.path.exists(self.events_file):
+                with open(self.events_file, "w", encoding="utf-8") as f:
+                    f.write("# datetime,s,-,-,-,ms,\n")
+                    f.write("time_abs,time_rel,seq,device,event,delay,\n")
+
+    def record_event(self, time, event, delay=0):
+        """Count a missed or late sampling step and write it to file.
+
+        Args:
+            time (Tick): sampling step as provided by the scheduler.
+            event (str): "missed" or "late".
+            delay (int, optional): [ns] delay of the sampling step.
+        """
+        if event == "missed":
+            self.missed += 1
+        else:
+            self.late += 1
+        logger.warning(
+            f"Sampler {self.name}: {event} sampling step {time.time_rel} s (delay {delay / 1e6:.1f} ms, {self.missed} missed, {self.late} late)"
+        )
+        if self.events_file is None:
+            return
+        line = f"{time.timestamp},{time.time_rel},{time.seq},{self.name},{event},{delay / 1e6:.1f},\n"
+        with self.events_lock:
+            with open(self.events_file, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def request(self, time):
+        """Request a sampling step. This is called from the scheduler
+        thread (direct connection) and must return fast: the sampling
+        is started in the sampler's thread if it is idle, otherwise the
+        overrun policy is applied.
+
+        Args:
+            time (Tick): sampling step as provided by the scheduler.
+        """
+        with self.lock:
+            if not self.in_flight:
+                self.in_flight = True
+                self.signal_sample.emit(time)
+                return
+            if len(self.pending) < self.queue_size:
+                self.pending.append(time)
+                return
+            if self.policy == "drop":
+                missed = time
+            elif self.policy == "coalesce":
+                missed = self.pending.popleft()
+                self.pending.append(time)
+            else:  # queue is full
+                missed = time
+        self.record_event(missed, "missed")
+
+    def barrier(self, event):
+        """Set the event once all jobs queued before it in the sampler's
+        thread (update, sample) are finished.
+
+        Args:
+            event (threading.Event): event to be set.
+        """
+        event.set()
+
+    def available_devices(self):
+        """Get the devices that may be sampled, i.e., the devices whose
+        circuit breaker is not open.
+
+        Returns:
+            dict: {device name: device object}
+        """
+        return {
+            device: self.devices[device]
+            for device in self.devices
+            if device not in self.breakers or self.breakers[device].allow()
+        }
+
+    def update_health(self, devices, sampling):
+        """Update the circuit breakers of the sampled devices. Samplings
+        that raised an exception or contain NaN only count as failed.
+
+        Args:
+            devices (dict): sampled devices.
+            sampling (dict): {device name: sampling} of all successful
+                samplings.
+        """
+        for device in devices:
+            if device in self.breakers:
+                if device in sampling:
+                    self.breakers[device].empty = nan_like(sampling[device])
+                if device in sampling and is_valid(sampling[device]):
+                    self.breakers[device].success()
+                else:
+                    self.breakers[device].failure()
+
+    def sample_devices(self):
+        """Sample all devices of this sampler.
+
+        Returns:
+            dict: {device name: sampling} of all successful samplings.
+        """
+        sampling = {}
+        devices = self.available_devices()
+        for device in devices:
+            try:
+                logger.debug(f"Sampler: sampling {device}")
+                request = perf_counter_ns()
+                sampling.update({device: self.devices[device].sample()})
+                self.timing.update({device: (request, perf_counter_ns())})
+                logger.debug(f"Sampler: sampled {device}")
+            except Exception as e:
+                logger.exception(f"Error in sampling of {device}")
+        self.update_health(devices, sampling)
+        return sampling
+
+    def update(self):
+        """Sampling during initialization. Data is not saved."""
+        self.signal.emit(self.sample_devices())  # update graphics
+
+    def sample(self, time):
+        """Sampling during recording. Data is visualized and saved.
+        Pending sampling steps that were requested in the meantime are
+        processed afterwards.
+
+        Args:
+            time (Tick): global timestamp of sampling step.
+        """
+        while time is not None:
+            delay = perf_counter_ns() - time.deadline
+            if self.dt is not None and delay > self.dt:
+                self.record_event(time, "late", delay)
+            self.sample_step(time)
+            with self.lock:
+                if self.pending:
+                    time = self.pending.popleft()
+                else:
+                    time = None
+                    self.in_flight = False
+
+    def sample_step(self, time):
+        """Sample and save the data of one sampling step.
+
+        Args:
+            time (Tick): global timestamp of sampling step.
+        """
+        self.rel_time.append(time.time_rel)
+        logger.debug(
+            f"Sampler: sampling {self.name}, timestep {time.timestamp} - {time.time_rel}"
+        )
+        sampling = self.sample_devices()
+        skipped = [
+            device
+            for device, breaker in self.breakers.items()
+            if device not in sampling and not breaker.allow() and breaker.empty is not None
+        ]
+        for device in skipped:
+            # NaN row, so that the time series doesn't have gaps
+            sampling.update({device: self.breakers[device].empty})
+        meas_data = {}
+        for device in sampling:
+            try:
+                if device in skipped:
+                    self.devices[device].save_measurement(time, sampling[device])
+                    meas_data.update({device: self.devices[device].meas_data})
+                    continue
+                timing = self.get_timing(device, time)
+                if self.devices[device].config.get("timing-columns", False):
+                    self.devices[device].save_measurement(
+                        time, sampling[device], timing=timing
+                    )
+                else:
+                    self.devices[device].save_measurement(time, sampling[device])
+                meas_data.update({device: self.devices[device].meas_data})
+            except Exception as e:
+                logger.exception(f"Error in saving of {device}")
+        self.signal.emit(meas_data)  # update graphics
+
+    def get_timing(self, device, time):
+        """Get request and response time of the last sampling of a
+        device relative to the sampling step and update the latency
+        statistics.
+
+        Args:
+            device (str): device name.
+            time (Tick): sampling step as provided by the scheduler.
+
+        Returns:
+            dict: {"request": int, "response": int} in ns.
+        """
+        request, response = self.timing[device]
+        timing = {
+            "request": request - time.deadline,
+            "response": response - time.deadline,
+        }
+        if device not in self.latency:
+            self.latency.update(
+                {device: {"samplings": 0, "sum": 0, "min": None, "max": 0, "delay": 0}}
+            )
+        statistics = self.latency[device]
+        latency = response - request
+        statistics["samplings"] += 1
+        statistics["sum"] += latency
+        statistics["delay"] += timing["response"]
+        statistics["max"] = max(statistics["max"], latency)
+        if statistics["min"] is None or latency < statistics["min"]:
+            statistics["min"] = latency
+        return timing
+
+    def write_latency(self, filename):
+        """Append the latency statistics of all devices to file.
+
+        Args:
+            filename (str): csv file, header is written if it doesn't
+                exist.
+        """
+        with self.events_lock:
+            if not os.path.exists(filename):
+                with open(filename, "w", encoding="utf-8") as f:
+                    f.write("# -,-,ms,ms,ms,ms,\n")
+                    f.write("device,samplings,latency mean,latency min,latency max,response delay mean,\n")
+            with open(filename, "a", encoding="utf-8") as f:
+                for device, statistics in self.latency.items():
+                    n = statistics["samplings"]
+                    logger.info(
+                        f"Sampler {self.name}: {device} latency mean {statistics['sum'] / n / 1e6:.1f} ms, max {statistics['max'] / 1e6:.1f} ms"
+                    )
+                    f.write(
+                        f"{device},{n},{statistics['sum'] / n / 1e6:.3f},{statistics['min'] / 1e6:.3f},{statistics['max'] / 1e6:.3f},{statistics['delay'] / n / 1e6:.3f},\n"
+                    )
+
+
+class AsyncSampler(Sampler):
+    """Sampler for network devices using the asyncio I/O engine. All
+    devices of a sampling group share one sampler (and thread), their
+    requests are issued concurrently on the engine's event loop."""
+
+    def __init__(self, io_engine, *args, **kwargs):
+        """Create sampler object.
+
+        Args:
+            io_engine (IOEngine): I/O engine used for sampling.
+            other arguments: see Sampler.
+        """
+        super().__init__(*args, **kwargs)
+        self.io_engine = io_engine
+
+    def add_device(self, device_name, device):
+        """Add a device to this sampler.
+
+        Args:
+            device_name (str): name of the device.
+            device: device object.
+        """
+        self.devices.update({device_name: device})
+        self.name = ", ".join(self.devices)
+
+    def sample_devices(self):
+        """Sample all devices concurrently using the I/O engine.
+
+        Returns:
+            dict: {device name: sampling} of all successful samplings.
+        """
+        devices = self.available_devices()
+        try:
+            sampling = self.io_engine.sample(devices, self.timing)
+        except Exception as e:
+            logger.exception(f"Error in sampling of {self.name}")
+            sampling = {}
+        self.update_health(devices, sampling)
+        return sampling
+
+
+class Trigger(QObject, metaclass=SignalMetaclass):
+    """This class is used to trigger the sampling of a group of devices
+    sharing the same time step and phase."""
+
+    def __init__(self, name):
+        """Create trigger object.
+
+        Args:
+            name (str): name of the sampling group.
+        """
+        super().__init__()
+        self.name = name
+
+    def trigger(self, time):
+        """Emit the sampling signal. This is called by the scheduler.
+
+        Args:
+            time (Tick): sampling step.
+        """
+        logger.info(f"sample {self.name}")
+        self.signal.emit(time)
+
+
+class Acquisition(QObject):
+    """Main class controlling multilog's devices, sampling and saving of
+    data. It has no graphical user interface, the visualization is added
+    by the Controller class in the main module."""
+
+    # signals to communicate with threads
+    signal_update_main = pyqtSignal()  # sample and update view
+    signal_update_camera = pyqtSignal()  # sample and update view
+    signal_Vifcon     = pyqtSignal() 
+    signal_current_time = pyqtSignal(str)  # update time label in main thread
+    signal_check_leakage = pyqtSignal()  # flow balance check in main thread
+
+    def __init__(self, config, output_dir="."):
+        """Setup devices and samplers. Sampling is not started yet.
+
+        Args:
+            config (str/dict): File path of configuration file or
+                configuration as dict.
+            output_dir (str, optional): Directory where to put the
+                output. Defaults to ".".
+        """
+        super().__init__()
+
+        # load configuration, setup logging
+        if isinstance(config, dict):
+            self.config = config
+        else:
+            with open(config, encoding="utf-8") as f:
+                self.config = yaml.safe_load(f)
+        logging.basicConfig(**self.config["logging"])
+        logging.info("initializing multilog")
+        logging.info(f"configuration: {self.config}")
+
+        self.output_dir = output_dir
+        self.directory = None
+        self.sampling_started = False  # this will to be true once "start" was clicked
+        self.sampling_stopped = False
+        self.writer = None
+        self.combined = None  # CombinedTable, if combined-table is configured
+
+        # setup scheduler that triggers sampling once recording is started
+        # it runs in a separate thread using absolute deadlines
+        self.scheduler = Scheduler(
+            self.config["settings"].get("scheduler-policy", "skip")
+        )
+        # main loop (updates clock and checks flow balance), sampling
+        # jobs are added per group of devices below
+        self.scheduler.add_job("main", self.config["settings"]["dt-main"], self.sample_main)
+        # setup timers that emit the signals for updating before recording
+        # main sampling loop after startup (without saving data)
+        self.timer_update_main = QTimer()
+        self.timer_update_main.setInterval(self.config["settings"]["dt-init"])
+        self.timer_update_main.timeout.connect(self.update_main)
+        # camera frame update loop
+        self.timer_update_camera = QTimer()
+        self.timer_update_camera.setInterval(
+            self.config["settings"]["dt-camera-update"]
+        )
+        self.timer_update_camera.timeout.connect(self.update_camera)
+
+        self.start_time = None
+
+        self.init_view()
+        self.signal_check_leakage.connect(self.check_leakage)
+
+        # setup devices, they are initialized concurrently
+        self.devices = {}
+        self.cameras = []
+        self.init_devices(
+            [
+                device_name
+                for device_name in self.config["devices"]
+                if not self.config["devices"][device_name]["skip"]
+            ]
+        )
+
+        vifcon_trigger = []
+        port_List  = [] # Liste der Ports
+        vifconDevices = []
+        ip = self.config["settings"]["IP-Vifcon"]
+        for device_name in self.config["devices"]:
+            if device_name in self.devices:
+                device = self.devices[device_name]
+                self.add_view(device_name, device)
+
+                ### VIFCON CONECTION
+                # Ist der Port Null, wird keine Verbindung hergestellt:
+                try:
+                    if self.config["devices"][device_name]['Port-Vifcon'] != 0:
+                        port_List.append(self.config["devices"][device_name]['Port-Vifcon'])
+                        vifcon_trigger.append(device_name)
+                        vifconDevices.append(self.devices[device_name])
+                except:
+                    logger.debug(f"{self.config['devices'][device_name]} has no Vifcon Port")
+
+        # devices without explicit phase that share a serial port or
+        # network host get separate jobs, their phases are set at start
+        self.staggered = {}  # (link, dt): [device names]
+        phase_stagger = self.config["settings"].get("phase-stagger", "auto")
+        if phase_stagger not in ["auto", "off"]:
+            raise ValueError(
+                f"Unknown phase-stagger '{phase_stagger}'. Use 'auto' or 'off'."
+            )
+        if phase_stagger == "auto":
+            links = {}
+            for device in self.devices:
+                link = self.get_link(device)
+                if link is not None and "phase" not in self.config["devices"][device]:
+                    group = (link, self.get_sampling_time(device)[0])
+                    links.update({group: links.get(group, []) + [device]})
+            for group, device_names in links.items():
+                if len(device_names) > 1:
+                    self.staggered.update({group: device_names})
+
+        # group devices by sampling time step and phase, each group is
+        # triggered by a separate scheduler job
+        self.triggers = {}  # (dt, phase) or device name if staggered: Trigger
+        self.device_triggers = {}  # device name: Trigger
+        for (link, dt), device_names in self.staggered.items():
+            for device in device_names:
+                name = f"{device} dt={dt}ms phase=auto"
+                trigger = Trigger(name)
+                self.scheduler.add_job(name, dt, trigger.trigger)
+                self.triggers.update({device: trigger})
+                self.device_triggers.update({device: trigger})
+                logger.info(f"Sampling {device} with dt = {dt} ms, phase staggered on {link}")
+        for device in self.devices:
+            if device in self.device_triggers:
+                continue
+            dt, phase = self.get_sampling_time(device)
+            if (dt, phase) not in self.triggers:
+                name = f"dt={dt}ms phase={phase}ms"
+                trigger = Trigger(name)
+                self.scheduler.add_job(name, dt, trigger.trigger, phase)
+                self.triggers.update({(dt, phase): trigger})
+            self.device_triggers.update({device: self.triggers[(dt, phase)]})
+            logger.info(f"Sampling {device} with dt = {dt} ms, phase = {phase} ms")
+
+        # network devices may be sampled on a common asyncio event loop
+        self.io_engine = None
+        if self.config["settings"].get("io-engine", "threads") == "asyncio":
+            self.io_engine = IOEngine(
+                self.config["settings"].get("io-timeout", 1000) / 1000
+            )
+        elif self.config["settings"].get("io-engine", "threads") != "threads":
+            raise ValueError(
+                f"Unknown io-engine '{self.config['settings']['io-engine']}'. Use 'threads' or 'asyncio'."
+            )
+        self.storage = self.config["settings"].get("storage", "csv")
+        if self.storage not in ["csv", "npy", "hdf5"]:
+            raise ValueError(
+                f"Unknown storage '{self.storage}'. Use 'csv', 'npy' or 'hdf5'."
+            )
+        for device_name in self.devices:
+            compression = self.config["devices"][device_name].get("stream-compression")
+            if compression not in [None, "gzip", "lzma"]:
+                raise ValueError(
+                    f"Unknown stream-compression '{compression}' of {device_name}. Use 'gzip' or 'lzma'."
+                )
+
+        # setup threads
+        logger.debug("Setting up threads")
+        self.samplers = {}
+        self.threads = []
+        async_samplers = {}  # Trigger: AsyncSampler
+        for device in self.devices:
+            device_config = self.config["devices"][device]
+            sampler_args = [
+                {device: self.devices[device]},
+                self.get_sampling_time(device)[0],
+                device_config.get(
+                    "overrun-policy",
+                    self.config["settings"].get("overrun-policy", "coalesce"),
+                ),
+                device_config.get(
+                    "overrun-queue", self.config["settings"].get("overrun-queue", 1)
+                ),
+            ]
+            if self.io_engine is not None and getattr(
+                self.devices[device], "asynchronous", False
+            ):
+                # network devices of a sampling group share one sampler
+                group = self.device_triggers[device]
+                if group in async_samplers:
+                    async_samplers[group].add_device(device, self.devices[device])
+                    self.samplers.update({device: async_samplers[group]})
+                    logger.debug(f"{device} in sampler {async_samplers[group].name}")
+                    continue
+                sampler = AsyncSampler(self.io_engine, *sampler_args)
+                async_samplers.update({group: sampler})
+            else:
+                sampler = Sampler(*sampler_args)
+            thread = QThread()
+            logger.debug(f"{device} in thread {thread}")
+            sampler.moveToThread(thread)
+            sampler.signal_sample.connect(sampler.sample)
+            sampler.signal_barrier.connect(sampler.barrier)
+            sampler.signal.connect(self.update_view)
+            if device in self.cameras:
+                self.signal_update_camera.connect(sampler.update)
+            else:
+                self.signal_update_main.connect(sampler.update)
+            self.device_triggers[device].signal.connect(
+                sampler.request, Qt.DirectConnection
+            )
+            self.samplers.update({device: sampler})
+            self.threads.append(thread)
+        for device in self.devices:
+            if not registry.is_monitored(device):
+                continue
+            self.samplers[device].breakers.update(
+                {
+                    device: CircuitBreaker(
+                        device,
+                        self.devices[device],
+                        self.config["settings"].get("breaker-threshold", 3),
+                        self.config["settings"].get("reconnect-interval", 1000) / 1000,
+                        self.config["settings"].get("reconnect-interval-max", 60000) / 1000,
+                    )
+                }
+            )
+
+        # Multilog Trigger Thread erstellen:
+        self.VifconNutzung = self.config['settings']['Vifcon_Link']
+        if self.VifconNutzung:
+            from .devices.vifcon import Vifcon
+
+            self.LinkVifconThread = QThread()
+            self.VifconLink = Vifcon(ip, port_List, vifcon_trigger, vifconDevices)
+            self.VifconLink.moveToThread(self.LinkVifconThread)
+            self.LinkVifconThread.start()
+            self.signal_Vifcon.connect(self.VifconLink.event_Loop)
+            self.signal_Vifcon.emit()
+
+    def init_devices(self, device_names):
+        """Create the device objects in a thread pool, so that slow
+        connections and configuration of the devices don't add up.
+        Devices that aren't initialized within init-timeout are skipped.
+        A report of the initialization is logged.
+
+        Args:
+            device_names (list): names of the devices in the config file.
+        """
+        workers = self.config["settings"].get("init-workers", 8)
+        timeout = self.config["settings"].get("init-timeout", 60)  # s
+        started = {}  # device name: time.monotonic()
+        durations = {}  # device name: [s]
+        finished = {}  # device name: device object, initialized in time
+        timed_out = []
+        lock = threading.Lock()  # for finished and timed_out
+        start = perf_counter_ns()
+
+        def create(device_name):
+            started.update({device_name: time.monotonic()})
+            device = self.create_device(device_name)
+            with lock:
+                if device_name in timed_out:
+                    # the timeout was already reported, don't use the device
+                    logger.warning(f"{device_name} initialized after timeout, discarded.")
+                    self.discard_device(device)
+                    return
+                durations.update({device_name: time.monotonic() - started[device_name]})
+                finished.update({device_name: device})
+
+        executor = ThreadPoolExecutor(max(workers, 1), "DeviceInit")
+        futures = {executor.submit(create, name): name for name in device_names}
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, 0.1, FIRST_COMPLETED)
+            for future in list(pending):
+                device_name = futures[future]
+                if (
+                    device_name in started
+                    and time.monotonic() - started[device_name] > timeout
+                ):
+                    with lock:
+                        if device_name not in finished:
+                            pending.remove(future)
+                            timed_out.append(device_name)
+        executor.shutdown(wait=False)
+
+        with lock:
+            for future, device_name in futures.items():
+                if device_name in timed_out:
+                    continue
+                future.result()  # raise errors of the initialization
+                self.devices.update({device_name: finished[device_name]})
+                if registry.is_camera(device_name):
+                    self.cameras.append(device_name)
+        logger.info(
+            f"Initialized {len(self.devices)} devices in {(perf_counter_ns() - start) / 1e9:.2f} s"
+        )
+        for device_name in device_names:
+            if device_name in timed_out:
+                self.warning(
+                    f"Initialization of {device_name} timed out after {timeout} s, the device is skipped."
+                )
+                continue
+            status = ""
+            if type(getattr(self.devices[device_name], "serial", None)).__name__ == "SerialMock":
+                status = ", no connection (SerialMock)"
+            logger.info(f"  {device_name}: {durations[device_name]:.2f} s{status}")
+
+    def create_device(self, device_name):
+        """Create the device object for a device in the config file.
+        The device type is defined by its name, see registry module.
+
+        Args:
+            device_name (str): name of the device in the config file.
+
+        Returns:
+            device object
+        """
+        # do that after logging has been configured to log possible errors
+        device_class = registry.get_device_class(device_name)
+        config = self.config["devices"][device_name]
+        if registry.is_camera(device_name):
+            # a camera process publishes frames only as fast as they are read
+            config = {
+                **config,
+                "grab-interval": min(
+                    config.get("dt", self.config["settings"]["dt-camera"]),
+                    self.config["settings"]["dt-camera-update"],
+                ),
+            }
+        return device_class(config, device_name)
+
+    def discard_device(self, device):
+        """Release a device that is not used, e.g., because its
+        initialization timed out.
+
+        Args:
+            device: device object.
+        """
+        try:
+            if getattr(device, "camera_process", None) is not None:
+                device.camera_process.stop()
+            if hasattr(getattr(device, "serial", None), "close"):
+                device.serial.close()
+        except Exception as e:
+            logger.warning(f"Could not close {getattr(device, 'name', device)}.", exc_info=True)
+
+    def init_view(self):
+        """Setup the visualization. Not used without GUI."""
+        pass
+
+    def add_view(self, device_name, device):
+        """Setup the visualization of a device. Not used without GUI.
+
+        Args:
+            device_name (str): name of the device.
+            device: device object.
+        """
+        pass
+
+    def update_view(self, device_sampling):
+        """Update the visualization. This is called by the Sampler
+        class's update and sample functions (using a signal). Not used
+        without GUI.
+
+        Args:
+            device_sampling (dict): {device-name: sampling}
+        """
+        pass
+
+    def warning(self, message):
+        """Show a warning to the user.
+
+        Args:
+            message (str): warning message.
+        """
+        logger.warning(message)
+
+    def get_sampling_time(self, device_name):
+        """Get sampling time step and phase of a device. These can be
+        defined in the device's configuration using "dt" and "phase",
+        otherwise dt-main / dt-camera from the settings are used.
+
+        Args:
+            device_name (str): name of the device.
+
+        Returns:
+            tuple: (dt, phase) in ms.
+        """
+        device_config = self.config["devices"][device_name]
+        if device_name in self.cameras:
+            default_dt = self.config["settings"]["dt-camera"]
+        else:
+            default_dt = self.config["settings"]["dt-main"]
+        dt = device_config.get("dt", default_dt)
+        phase = device_config.get("phase", 0)
+        if dt <= 0 or phase < 0:
+            raise ValueError(f"Invalid dt / phase configured for {device_name}.")
+        return dt, phase
+
+    def get_link(self, device_name):
+        """Get the serial port or network host a device is connected to.
+        Devices sharing a link are sampled with staggered phases. It
+        can be set explicitly with "link" in the device's configuration.
+
+        Args:
+            device_name (str): name of the device.
+
+        Returns:
+            str: link, e.g. "serial:/dev/ttyUSB0", or None.
+        """
+        device_config = self.config["devices"][device_name]
+        if "link" in device_config:
+            return str(device_config["link"])
+        if "serial-interface" in device_config:
+            return f"serial:{device_config['serial-interface'].get('port')}"
+        if "tcp-interface" in device_config:
+            return f"tcp:{device_config['tcp-interface'].get('IP')}"
+        if "IP" in device_config:
+            return f"tcp:{str(device_config['IP']).partition(':')[0]}"
+        return None
+
+    def stagger_phases(self):
+        """Spread the sampling steps of devices sharing a link across the
+        time step. The phases are based on the latencies measured during
+        initialization: each device starts after the previous one has
+        finished, the remaining time is distributed evenly in between.
+        If the latencies add up to more than the time step, the devices
+        are distributed evenly.
+        """
+        for (link, dt), device_names in self.staggered.items():
+            latencies = []  # ms
+            for device in device_names:
+                request, response = self.samplers[device].timing.get(device, (0, 0))
+                latencies.append((response - request) / 1e6)
+            gap = (dt - sum(latencies)) / len(device_names)
+            phase = 0
+            for device, latency in zip(device_names, latencies):
+                if gap < 0:  # link is saturated
+                    phase = device_names.index(device) * dt / len(device_names)
+                self.scheduler.set_phase(self.device_triggers[device].name, int(phase))
+                logger.info(
+                    f"Sampling {device} with phase {int(phase)} ms on {link} (latency {latency:.1f} ms)"
+                )
+                phase += latency + gap
+
+    def start_threads(self):
+        """Start the sampler threads and the I/O engine."""
+        if self.io_engine is not None:
+            self.io_engine.start()
+        for thread in self.threads:
+            thread.start()
+
+    def start(self):
+        """Start recording. This is executed when the start button is
+        clicked."""
+        logger.info("Stop updating.")
+        self.timer_update_main.stop()
+        self.wait_idle()  # to finish running update jobs (running in separate threads)
+        self.stagger_phases()
+        if "IFM-flowmeter" in self.devices:
+            logger.info("Checking if water flow greater zero.")
+            for sensor, flow in self.devices["IFM-flowmeter"].last_sampling["Flow"].items():
+                if flow == 0:
+                    self.warning(f"No cooling water flow at sensor {sensor}.")
+        logger.info("Start sampling.")
+        self.init_output_files()
+        # output files are kept open by the writer thread during recording
+        self.writer = Writer(
+            self.config["settings"].get("flush-interval", 1000) / 1000,
+            self.config["settings"].get("flush-rows", 100),
+            self.config["settings"].get("fsync", False),
+            (
+                f"{self.directory}/journal.bin"
+                if self.config["settings"].get("journal", False)
+                else None
+            ),
+            self.config["settings"].get("segment-size", 0) * 1e6 or None,
+            self.config["settings"].get("segment-interval", 0) * 60 or None,
+            f"{self.directory}/manifest.csv",
+        )
+        segments = bool(self.writer.segment_size or self.writer.segment_interval)
+        if self.config["settings"].get("combined-table", False):
+            self.init_combined_table(segments)
+        for device_name, device in self.devices.items():
+            compression = self.config["devices"][device_name].get("stream-compression")
+            if not segments and compression is None:
+                continue
+            for filename in [
+                getattr(device, "filename", None),  # csv of scalar devices
+                f"{getattr(device, 'directory', None)}/_images.csv",  # cameras
+            ]:
+                if filename is not None and os.path.exists(filename):
+                    self.writer.register(
+                        filename,
+                        compression,
+                        self.config["devices"][device_name].get(
+                            "stream-compression-level"
+                        ),
+                        segments,
+                    )
+        self.writer.start()
+        self.sampling_started = True
+        self.scheduler.start()
+        self.start_time = self.scheduler.start_time
+
+    def init_combined_table(self, segments=False):
+        """Create combined.csv with one row per main step and the values
+        of all devices with scalar time series. The lines written by the
+        devices (or the samplings appended to the binary storage) are
+        passed to the combined table. This has to be called after the
+        writer was created and before the device files are registered.
+
+        Args:
+            segments (bool, optional): split combined.csv into segments.
+                Defaults to False.
+        """
+        from .combined import CombinedTable
+
+        self.combined = CombinedTable(
+            f"{self.directory}/combined.csv",
+            self.config["settings"]["dt-main"],
+            math.ceil(
+                self.config["settings"].get(
+                    "combined-delay", 2 * self.config["settings"]["dt-main"]
+                )
+                / self.config["settings"]["dt-main"]
+            ),
+        )
+        for device_name, device in self.devices.items():
+            if not hasattr(device, "storage"):  # cameras, process conditions
+                continue
+            job = self.scheduler.jobs[self.device_triggers[device_name].name]
+            if device.storage is not None:
+                units, header = device.storage.units, device.storage.header
+                device.storage.callback = (
+                    lambda tick, values, name=device_name: self.combined.add(
+                        name, tick.time_rel, values
+                    )
+                )
+            else:
+                with open(device.filename, encoding="utf-8") as f:
+                    units, header = f.readline(), f.readline()
+                self.writer.tap(
+                    device.filename,
+                    lambda text, name=device_name: self.combined.add_line(name, text),
+                )
+            self.combined.add_device(
+                device_name,
+                units,
+                header,
+                job.dt / 1e6,
+                job.phase / 1e6,
+                self.samplers[device_name].breakers.get(device_name),
+            )
+        self.combined.write_header()
+        if segments:
+            self.writer.register(self.combined.filename, segments=True)
+
+    def stop(self):
+        """Stop recording and quit the sampler threads."""
+        if self.sampling_stopped:
+            return
+        self.sampling_stopped = True
+        if self.VifconNutzung:
+            self.LinkVifconThread.quit()
+            if not self.VifconLink.done:
+                self.VifconLink.ende()
+        
+        logger.info("Stopping sampling")
+        self.timer_update_main.stop()
+        self.timer_update_camera.stop()
+        logger.debug("Stopped timer_update_camera")
+        self.scheduler.stop()
+        logger.debug("Stopped scheduler")
+        self.wait_idle()  # to finish last sampling jobs (running in separate threads)
+        for sampler in dict.fromkeys(self.samplers.values()):
+            for breaker in sampler.breakers.values():
+                breaker.stop()
+        for thread in self.threads:
+            logger.debug(f"Quitting thread {thread}")
+            thread.quit()
+        for thread in self.threads:
+            if not thread.wait(5000):
+                logger.warning(f"Thread {thread} didn't finish.")
+        if self.combined is not None:
+            self.combined.close()
+        for device in self.devices.values():
+            # pools before the container, pending images are written to it
+            for output in [
+                "storage",
+                "frame_store",
+                "render_pool",
+                "image_pool",
+                "image_container",
+            ]:
+                if getattr(device, output, None) is not None:
+                    getattr(device, output).close()
+        if self.writer is not None:
+            self.writer.close()
+            logger.debug("Closed output files")
+        if self.directory is not None:
+            # image lists of the cameras, from the complete _images.csv
+            try:
+                archive.export(self.directory)
+            except Exception:
+                logger.error("Could not write NOMAD image lists.", exc_info=True)
+        if self.io_engine is not None:
+            self.io_engine.stop(5)
+            logger.debug("Stopped I/O engine")
+        for device in self.devices.values():
+            if getattr(device, "camera_process", None) is not None:
+                device.camera_process.stop()
+        for sampler in dict.fromkeys(self.samplers.values()):
+            logger.info(
+                f"Sampler {sampler.name}: {sampler.missed} missed, {sampler.late} late sampling steps"
+            )
+            if self.directory is not None:
+                sampler.write_latency(f"{self.directory}/sampling_latency.csv")
+        logger.info("Stopped sampling")
+
+    def run(self, duration=None):
+        """Run multilog without GUI: start recording immediately and
+        sample until the duration has elapsed or SIGINT / SIGTERM
+        (Ctrl+C) is received.
+
+        Args:
+            duration (float, optional): [s] duration of the recording.
+                Defaults to None (unlimited).
+
+        Returns:
+            str: output directory.
+        """
+        app = QCoreApplication.instance()
+        if app is None:
+            app = QCoreApplication(sys.argv)
+        for signal_number in [signal.SIGINT, signal.SIGTERM]:
+            signal.signal(signal_number, lambda *args: app.quit())
+        # the python interpreter needs to run from time to time to
+        # handle signals while the Qt event loop is running
+        timer_signals = QTimer()
+        timer_signals.timeout.connect(lambda: None)
+        timer_signals.start(200)
+
+        def start_recording():
+            self.start()
+            logger.info(f"Recording to {self.directory}")
+            if duration is not None:
+                QTimer.singleShot(int(duration * 1000), app.quit)
+
+        # sample once without saving (e.g. to get the initial water flow)
+        self.start_threads()
+        self.update_main()
+        QTimer.singleShot(self.config["settings"]["dt-init"], start_recording)
+        app.exec()
+        timer_signals.stop()
+        self.stop()
+        return self.directory
+
+    def wait_idle(self, timeout=10):
+        """Wait until all samplers have finished their running and
+        queued jobs. A barrier is queued in each sampler thread, it's
+        passed once the jobs queued before are finished.
+
+        Args:
+            timeout (float, optional): [s] maximum waiting time.
+                Defaults to 10.
+
+        Returns:
+            bool: True if all samplers are idle.
+        """
+        start = perf_counter_ns()
+        barriers = {}
+        for sampler in dict.fromkeys(self.samplers.values()):
+            if sampler.thread().isRunning():
+                event = threading.Event()
+                sampler.signal_barrier.emit(event)
+                barriers.update({sampler: event})
+        deadline = time.monotonic() + timeout
+        idle = True
+        for sampler, event in barriers.items():
+            if not event.wait(max(deadline - time.monotonic(), 0)):
+                logger.warning(f"Sampler {sampler.name} still busy after {timeout} s.")
+                idle = False
+        logger.debug(f"Waited {(perf_counter_ns() - start) / 1e6:.1f} ms for samplers")
+        return idle
+
+    def init_output_files(self):
+        """Create directory for sampling and initialize output files."""
+        logger.info("Setting up output files.")
+        date = datetime.datetime.now().strftime("%Y-%m-%d")
+        for i in range(100):
+            if i == 99:
+                raise ValueError("Too high directory count.")
+            self.directory = f"{self.output_dir}/measdata_{date}_#{i+1:02}"
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+                break
+        for device in self.devices:
+            self.devices[device].init_output(self.directory)
+            self.samplers[device].init_output(self.directory)
+            # devices with scalar time series support binary storage
+            if self.storage != "csv" and hasattr(self.devices[device], "storage"):
+                from . import storage
+
+                self.devices[device].storage = storage.create(
+                    self.storage,
+                    self.devices[device].filename,
+                    self.config["settings"].get("chunk-rows", 100),
+                )
+        self.write_nomad_file()
+        self.write_metadata()
+        shutil.copy(
+            archive.template_path("base_classes.schema.archive.yaml"),
+            f"{self.directory}/base_classes.schema.archive.yaml",
+        )
+
+    def write_nomad_file(self):
+        """Write main multilog.archive.yaml including an overview of all devices."""
+        nomad_dict = archive.load_template("archive_template_main.yml")
+        data = nomad_dict.pop("data")
+        try:
+            multilog_version = (
+                subprocess.check_output(
+                    ["git", "describe", "--tags", "--dirty", "--always"]
+                )
+                .strip()
+                .decode("utf-8")
+            )
+        except FileNotFoundError:
+            logger.warning("Unable to determine multilog version.", exc_info=True)
+            multilog_version = "unknown"
+        data["timestamp"] = datetime.datetime.now(datetime.timezone.utc).astimezone().isoformat(timespec='milliseconds').replace('T', ' ')
+        data["tasks"][0].update(
+            {
+                "software": f"multilog {multilog_version}",
+                "sampling_time": self.config["settings"]["dt-main"],
+                "image_time": self.config["settings"]["dt-camera"],
+            }
+        )
+
+        for device_name in self.devices:
+            nomad_name = device_name.replace(" ", "_").replace("-", "_")
+            if "Optris-IP-640" in device_name:
+                nomad_dict["definitions"]["sections"]["MeltCzochralski"]["sub_sections"]["instrumentation"]["section"]["quantities"].update(
+                    {nomad_name: {"type": f"../upload/raw/{device_name}.archive.yaml#IR_camera"}}
+                )
+                data["instrumentation"][nomad_name] = f"../upload/raw/{device_name}.archive.yaml#data"
+            elif "Basler" in device_name:
+                nomad_dict["definitions"]["sections"]["MeltCzochralski"]["sub_sections"]["instrumentation"]["section"]["quantities"].update(
+                    {nomad_name: {"type": f"../upload/raw/{device_name}.archive.yaml#camera"}}
+                )
+                data["instrumentation"][nomad_name] = f"../upload/raw/{device_name}.archive.yaml#data"
+            else:
+                nomad_dict["definitions"]["sections"]["MeltCzochralski"]["sub_sections"]["instrumentation"]["section"]["quantities"].update(
+                    {nomad_name: {"type": f"../upload/raw/{device_name}.archive.yaml#Sensors_list"}}
+                )
+                data["instrumentation"][nomad_name] = f"../upload/raw/{device_name}.archive.yaml#data"
+
+        nomad_dict.update({"data": data})
+        with open(f"{self.directory}/multilog_eln.archive.yaml", "w", encoding="utf-8") as f:
+            yaml.safe_dump(nomad_dict, f, sort_keys=False)
+
+    def write_metadata(self):
+        """Write a csv file with information about multilog version,
+        python version and operating system.
+        """
+        try:
+            multilog_version = (
+                subprocess.check_output(
+                    ["git", "describe", "--tags", "--dirty", "--always"]
+                )
+                .strip()
+                .decode("utf-8")
+            )
+        except FileNotFoundError:
+            logger.warning("Unable to determine multilog version.", exc_info=True)
+            multilog_version = "unknown"
+        metadata = f"multilog version,python version,system information,\n"
+        metadata += f"{multilog_version},{platform.python_version()},{str(platform.uname()).replace(',',';')},\n"
+        with open(f"{self.directory}/config.yml", "w", encoding="utf-8") as f:
+            yaml.dump(self.config, f)
+        with open(f"{self.directory}/metadata.csv", "w", encoding="utf-8") as f:
+            f.write(metadata)
+
+    def update_main(self):
+        """Function that triggers sampling after startup (without saving).
+        This function is called by a timer and leads to a call of the
+        update function of the Sampler objects (running in their
+        respective threads)."""
+        logger.info("update main")
+        self.signal_current_time.emit(datetime.datetime.now().strftime("%H:%M:%S"))
+        self.signal_update_main.emit()
+        self.check_leakage()
+
+    def check_leakage(self):
+        """Check the flow balance of the cooling water, if configured."""
+        if "IFM-flowmeter" in self.devices:
+            flowmeter = self.devices["IFM-flowmeter"]
+            flowmeter.check_leakage()
+
+    def update_camera(self):
+        """Function that triggers graphics update for cameras (without saving).
+        This function is called by a timer and leads to a call of the
+        update function of the Sampler objects (running in their
+        respective threads)."""
+        logger.info("update camera")
+        self.signal_update_camera.emit()
+
+    def sample_main(self, time):
+        """Function that updates the clock and checks the flow balance
+        with the main time step. This function is called by the
+        scheduler (in the scheduler thread). Sampling & saving of data
+        is triggered by the Trigger objects of the sampling groups.
+
+        Args:
+            time (Tick): sampling step.
+        """
+        logger.info("sample main")
+        if self.combined is not None:
+            self.combined.tick(time)
+        self.signal_current_time.emit(f"{time.time_abs:%H:%M:%S}")
+        self.signal_check_leakage.emit()
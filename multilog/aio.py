@@ -0,0 +1,159 @@
+"""This module contains the asyncio-based I/O engine of multilog. If it
+is activated with the setting "io-engine: asyncio", the network-attached
+devices (TCP / HTTP) are sampled on one common event loop instead of
+using blocking calls in their samplers' threads. The requests of all
+devices sampled in the same step are issued concurrently and each
+request is limited by a timeout."""
+import asyncio
+import json
+import logging
+import threading
+from time import perf_counter_ns
+
+
+logger = logging.getLogger(__name__)
+
+
+async def request(sock, message, bufsize=1024, timeout=1):
+    """Send a message over a connected TCP socket and wait for the
+    response. The socket is switched to non-blocking mode.
+
+    Args:
+        sock (socket.socket): connected socket.
+        message (bytes): request.
+        bufsize (int, optional): maximum size of the response. Defaults
+            to 1024.
+        timeout (float, optional): [s] timeout for the response.
+            Defaults to 1.
+
+    Returns:
+        bytes: response.
+    """
+    loop = asyncio.get_running_loop()
+    sock.setblocking(False)
+    # discard late responses of previous requests that timed out
+    try:
+        while sock.recv(bufsize):
+            pass
+    except BlockingIOError:
+        pass
+    await loop.sock_sendall(sock, message)
+    return await asyncio.wait_for(loop.sock_recv(sock, bufsize), timeout)
+
+
+async def http_get_json(host, path, timeout=1):
+    """Minimal HTTP GET request returning the decoded JSON response.
+
+    Args:
+        host (str): IP or host name, optionally with port (host:port).
+        path (str): requested path, e.g. "/index.json".
+        timeout (float, optional): [s] timeout for connection and
+            response. Defaults to 1.
+
+    Returns:
+        decoded JSON data.
+    """
+    address, _, port = host.partition(":")
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(address, int(port or 80)), timeout
+    )
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.0\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    header, _, body = response.partition(b"\r\n\r\n")
+    status = header.split(b"\r\n", 1)[0].decode("latin-1")
+    if status.split(" ")[1:2] != ["200"]:
+        raise IOError(f"HTTP request http://{host}{path} failed: {status}")
+    return json.loads(body)
+
+
+class IOEngine(threading.Thread):
+    """Event loop running in a separate thread. Devices that support it
+    implement a coroutine sample_async(timeout) in addition to
+    sample(). The samplers call sample() of this class from their
+    threads and wait for the result."""
+
+    def __init__(self, timeout=1):
+        """Create I/O engine. The event loop is started with start().
+
+        Args:
+            timeout (float, optional): [s] timeout for each request.
+                Defaults to 1.
+        """
+        super().__init__(name="IOEngine", daemon=True)
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        """Run the event loop until stop() is called."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def stop(self, timeout=None):
+        """Stop the event loop and wait for the thread to finish.
+
+        Args:
+            timeout (float, optional): [s] timeout for joining the
+                thread. Defaults to None.
+        """
+        if self.is_alive():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+            self.join(timeout)
+
+    async def _shutdown(self):
+        """Cancel running requests and stop the event loop."""
+        tasks = [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    def sample(self, devices, timing=None):
+        """Sample devices concurrently. This blocks the calling thread
+        until all devices returned or timed out.
+
+        Args:
+            devices (dict): {device name: device object}
+            timing (dict, optional): {device name: (request, response)}
+                in ns (perf_counter_ns) is written into this dict.
+                Defaults to None.
+
+        Returns:
+            dict: {device name: sampling} of all successful samplings.
+        """
+        if timing is None:
+            timing = {}
+        future = asyncio.run_coroutine_threadsafe(
+            self._sample(devices, timing), self.loop
+        )
+        return future.result()
+
+    async def _sample(self, devices, timing):
+        """Coroutine gathering the samplings of all devices."""
+        results = await asyncio.gather(
+            *[self._sample_device(device, devices[device], timing) for device in devices],
+            return_exceptions=True,
+        )
+        sampling = {}
+        for device, result in zip(devices, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error in sampling of {device}", exc_info=result)
+            else:
+                sampling.update({device: result})
+        return sampling
+
+    async def _sample_device(self, name, device, timing):
+        """Coroutine sampling one device and recording request and
+        response time."""
+        request = perf_counter_ns()
+        sampling = await device.sample_async(self.timeout)
+        timing.update({name: (request, perf_counter_ns())})
+        return sampling
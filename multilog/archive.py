@@ -0,0 +1,177 @@
+"""This module is used to create the NOMAD archive files. The templates
+are parsed once and cached. The image lists of the cameras are not
+appended to the archive in each sampling step but generated from the
+image index (_images.csv) when the recording is stopped or with
+multilog.py --nomad <dir>. The entries are streamed to the file, so the
+index is never loaded completely."""
+import copy
+import csv
+import glob
+import logging
+import os
+import threading
+import yaml
+
+from .writer import COMPRESSION, open_text, segment_files
+
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(__file__), "nomad")
+_templates = {}  # filename: parsed template
+_templates_lock = threading.Lock()
+
+# m_def of the camera archive: (key of the image list, write heat map)
+IMAGE_LISTS = {
+    "camera": ("images_list", False),
+    "IR_camera": ("ir_images_list", True),
+}
+
+
+def template_path(filename):
+    """Get the path of a template file.
+
+    Args:
+        filename (str): e.g. "archive_template_sensor.yml".
+
+    Returns:
+        str
+    """
+    return os.path.join(TEMPLATE_DIRECTORY, filename)
+
+
+def load_template(filename):
+    """Get a NOMAD template. It's parsed on first use, a copy is returned
+    that can be modified.
+
+    Args:
+        filename (str): e.g. "archive_template_sensor.yml".
+
+    Returns:
+        dict
+    """
+    with _templates_lock:
+        if filename not in _templates:
+            with open(template_path(filename), encoding="utf-8") as f:
+                _templates.update({filename: yaml.safe_load(f)})
+        return copy.deepcopy(_templates[filename])
+
+
+def heat_map_path(directory, name, img_name):
+    """Find the file format of the heat maps of the IR camera: csv files
+    (optionally compressed) or, with frame-store, the frame container
+    (until the csv files are exported with multilog.py --to-csv).
+
+    Args:
+        directory (str): measurement directory.
+        name (str): device name.
+        img_name (str): name of the first image.
+
+    Returns:
+        str: path relative to the camera directory, with placeholder
+            {img_name} for csv files.
+    """
+    for suffix in [""] + list(COMPRESSION.values()):
+        if os.path.exists(f"{directory}/{name}/{img_name}.csv{suffix}"):
+            return f"{{img_name}}.csv{suffix}"
+    for container in ["frames.npy", "frames.h5"]:
+        if os.path.exists(f"{directory}/{name}/{container}"):
+            return container
+    return "{img_name}.csv"
+
+
+def image_entries(directory, name, heat_map=False):
+    """Read the entries of the image list from _images.csv (and its
+    segments).
+
+    Args:
+        directory (str): measurement directory.
+        name (str): device name.
+        heat_map (bool, optional): add the heat map (IR camera).
+            Defaults to False.
+
+    Yields:
+        str: entry of the image list in YAML.
+    """
+    heat_map_file = None  # {img_name}.csv(.gz / .xz) or frame container
+    for filename in segment_files(f"{directory}/{name}/_images.csv"):
+        with open_text(filename) as f:
+            f.readline()  # units
+            for row in csv.DictReader(f):
+                img_name = row["img-name"]
+                image = img_name if "." in img_name else f"{img_name}.png"
+                if row.get("container"):
+                    image = f"{row['container']}/{image}"
+                entry = f"  - name: {img_name}\n" f"    image: {name}/{image}\n"
+                if heat_map:
+                    if heat_map_file is None:
+                        heat_map_file = heat_map_path(directory, name, img_name)
+                    entry += f"    heat_map: {name}/{heat_map_file.format(img_name=img_name)}\n"
+                entry += (
+                    f"    timestamp_rel: {row['time_rel']}\n"
+                    f"    timestamp_abs: {row['time_abs']}\n"
+                )
+                yield entry
+
+
+def write_image_list(directory, name):
+    """Write the image list of a camera to its archive file. An existing
+    list is replaced.
+
+    Args:
+        directory (str): measurement directory.
+        name (str): device name.
+
+    Returns:
+        int: number of images.
+    """
+    filename = f"{directory}/{name}.archive.yaml"
+    m_def = None
+    end = None  # end of the header
+    with open(filename, "rb") as f:
+        for line in iter(f.readline, b""):
+            if line.startswith(b"  m_def: "):
+                m_def = line.split(b":", 1)[1].strip().decode()
+            elif m_def in IMAGE_LISTS and line.rstrip() == (
+                f"  {IMAGE_LISTS[m_def][0]}:".encode()
+            ):
+                end = f.tell() - len(line)
+                break
+    if m_def not in IMAGE_LISTS:
+        raise ValueError(f"{filename} is not a camera archive.")
+    key, heat_map = IMAGE_LISTS[m_def]
+    images = 0
+    with open(filename, "r+", encoding="utf-8", newline="") as f:
+        if end is not None:
+            f.seek(end)
+            f.truncate()
+        else:
+            f.seek(0, os.SEEK_END)
+        f.write(f"  {key}:\n")
+        for entry in image_entries(directory, name, heat_map):
+            f.write(entry)
+            images += 1
+    return images
+
+
+def export(directory):
+    """Write the image lists of all cameras in a measurement directory.
+
+    Args:
+        directory (str): measurement directory.
+
+    Returns:
+        list: updated archive files.
+    """
+    filenames = []
+    names = [
+        os.path.basename(os.path.dirname(images_csv))
+        for images_csv in glob.glob(f"{directory}/*/_images.csv*")
+    ]
+    for name in sorted(set(names)):
+        if not os.path.exists(f"{directory}/{name}.archive.yaml"):
+            continue
+        images = write_image_list(directory, name)
+        logger.info(f"Wrote {images} images to {name}.archive.yaml")
+        filenames.append(f"{directory}/{name}.archive.yaml")
+    return filenames
@@ -0,0 +1,241 @@
+"""This module contains the combined table of multilog. If it's enabled
+(setting combined-table: 1), the samplings of all devices with scalar
+time series are collected for each step of the main loop (dt-main) and
+written as one wide row to combined.csv, so that the whole recording
+can be read at once without aligning the files of the devices."""
+import logging
+import math
+import threading
+
+from .storage import TIMING_COLUMNS
+from .writer import write
+
+
+logger = logging.getLogger(__name__)
+
+# status of a device in a row of the combined table:
+# ok: sampled in this main step (the last sampling if there are several)
+# down: the circuit breaker of the device is open (NaN rows)
+# missing: not sampled before the row was written (e.g., dropped by the
+#   overrun policy, an error in saving, or a device that is behind)
+# none: no sampling step of the device in this main step (dt > dt-main)
+# Samplings that arrive after their row was written are counted as late.
+STATUS = ["ok", "down", "missing", "none"]
+
+
+class CombinedTable:
+    """Wide table with one row per main step and the value columns of
+    all devices. The samplings are assigned to the main step they were
+    scheduled in by their time_rel, as the seq of devices with another
+    time step counts other steps; seq in the table is the sequence
+    number of the main step. A row is written once all devices due in this step
+    have been sampled, or after delay main steps at the latest; devices
+    without sampling are written as NaN with their status. Samplings
+    arriving after their row was written are only counted (late)."""
+
+    def __init__(self, filename, dt, delay=2):
+        """Create combined table.
+
+        Args:
+            filename (str): file path, usually
+                <measurement directory>/combined.csv.
+            dt (int): [ms] main time step.
+            delay (int, optional): number of main steps a row waits for
+                slow devices. Defaults to 2.
+        """
+        self.filename = filename
+        self.dt = int(dt * 1e6)  # ns
+        self.delay = delay
+        self.devices = {}  # device name: {columns, units, indices, dt, phase}
+        self.rows = {}  # seq: {device name: (step [ns], values, status)}
+        self.ticks = {}  # seq: Tick of the main step
+        self.next = 0  # seq of the next row
+        self.counts = {}  # device name: {status: rows}
+        self.late = {}  # device name: samplings after the row was written
+        self.lock = threading.Lock()
+
+    def add_device(self, name, units, header, dt, phase=0, breaker=None):
+        """Add the value columns of a device. It has to be called before
+        write_header().
+
+        Args:
+            name (str): device name.
+            units (str): units line of the device's csv file.
+            header (str): header line of the device's csv file.
+            dt (int): [ms] time step of the device.
+            phase (int, optional): [ms] phase of the device. Defaults
+                to 0.
+            breaker (CircuitBreaker, optional): circuit breaker of the
+                device, its samplings are down while it's open. Defaults
+                to None.
+        """
+        columns = header.strip().split(",")
+        units = units.strip()[2:].split(",")  # without "# "
+        indices = [
+            i
+            for i, column in enumerate(columns)
+            if column
+            and column not in ["time_abs", "time_rel", "seq"] + TIMING_COLUMNS
+        ]
+        self.devices.update(
+            {
+                name: {
+                    "columns": [columns[i] for i in indices],
+                    "units": [units[i] if i < len(units) else "" for i in indices],
+                    "indices": indices,
+                    "dt": int(dt * 1e6),
+                    "phase": int(phase * 1e6),
+                    "breaker": breaker,
+                }
+            }
+        )
+        self.counts.update({name: {status: 0 for status in STATUS}})
+        self.late.update({name: 0})
+
+    def write_header(self):
+        """Create the file with units and column names."""
+        units = "# datetime,s,-,"
+        header = "time_abs,time_rel,seq,"
+        for name, device in self.devices.items():
+            for column, unit in zip(device["columns"], device["units"]):
+                units += f"{unit},"
+                header += f"{name}:{column},"
+            units += "-,"
+            header += f"{name}:status,"
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write(f"{units}\n{header}\n")
+
+    def last_step(self, name, seq):
+        """Get the last sampling step of a device in a main step.
+
+        Args:
+            name (str): device name.
+            seq (int): sequence number of the main step.
+
+        Returns:
+            int: [ns] relative time of the sampling step, None if the
+                device has no sampling step in this main step.
+        """
+        device = self.devices[name]
+        end = (seq + 1) * self.dt - device["phase"]
+        k = math.ceil(end / device["dt"]) - 1
+        step = device["phase"] + k * device["dt"]
+        if k < 0 or step < seq * self.dt:
+            return None
+        return step
+
+    def add(self, name, time_rel, values):
+        """Add a sampling of a device.
+
+        Args:
+            name (str): device name.
+            time_rel (float): [s] relative time of the sampling step.
+            values (list): values in the order of the device's columns.
+        """
+        step = round(float(time_rel) * 1e9)
+        seq = step // self.dt
+        status = "down" if self.is_down(name) else "ok"
+        with self.lock:
+            if seq < self.next:
+                self.late[name] += 1
+                return
+            if seq not in self.rows:
+                self.rows.update({seq: {}})
+            self.rows[seq].update({name: (step, values, status)})
+            self.flush()
+
+    def is_down(self, name):
+        """Check if the circuit breaker of a device is open.
+
+        Args:
+            name (str): device name.
+
+        Returns:
+            bool
+        """
+        breaker = self.devices[name]["breaker"]
+        return breaker is not None and not breaker.allow()
+
+    def add_line(self, name, text):
+        """Add a sampling of a device as written to its csv file.
+
+        Args:
+            name (str): device name.
+            text (str): csv line.
+        """
+        fields = text.strip().split(",")
+        values = [
+            fields[i] if i < len(fields) else "nan"
+            for i in self.devices[name]["indices"]
+        ]
+        self.add(name, fields[1], values)
+
+    def tick(self, tick):
+        """Add a main step, called by the main job of the scheduler.
+
+        Args:
+            tick (Tick): main step.
+        """
+        with self.lock:
+            self.ticks.update({tick.seq: tick})
+            self.flush()
+
+    def flush(self, final=False):
+        """Write the rows that are complete or waited long enough. Rows of
+        main steps skipped by the scheduler are not written.
+
+        Args:
+            final (bool, optional): write all rows. Defaults to False.
+        """
+        while self.ticks:
+            seq = min(self.ticks)
+            row = self.rows.get(seq, {})
+            complete = all(
+                row.get(name, (None,))[0] == self.last_step(name, seq)
+                for name in self.devices
+            )
+            if not (complete or final or max(self.ticks) - seq >= self.delay):
+                return
+            self.write_row(self.ticks.pop(seq), row)
+            for s in [s for s in self.rows if s <= seq]:
+                del self.rows[s]
+            self.next = seq + 1
+
+    def write_row(self, tick, row):
+        """Write a row of the combined table.
+
+        Args:
+            tick (Tick): main step.
+            row (dict): {device name: (step, values, status)} sampled in
+                this main step.
+        """
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},"
+        for name, device in self.devices.items():
+            if name in row:
+                values, status = row[name][1:]
+            else:
+                values = ["nan"] * len(device["columns"])
+                if self.last_step(name, tick.seq) is None:
+                    status = "none"
+                elif self.is_down(name):
+                    status = "down"
+                else:
+                    status = "missing"
+            self.counts[name][status] += 1
+            for value in values:
+                line += f"{value},"
+            line += f"{status},"
+        write(self.filename, f"{line}\n")
+
+    def close(self):
+        """Write the remaining rows and log the status counts. It has to
+        be called after the last sampling and before the writer is
+        closed."""
+        with self.lock:
+            self.flush(final=True)
+        for name, counts in self.counts.items():
+            logger.info(
+                f"Combined table {name}: "
+                + ", ".join(f"{counts[status]} {status}" for status in STATUS)
+                + f", {self.late[name]} late samplings after the row was written"
+            )
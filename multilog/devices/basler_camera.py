@@ -1,8 +1,13 @@
-import datetime
+import io
 import logging
 import os
 import shutil
 
+from .camera_process import CameraProcess
+from .render_pool import ImagePool
+from ..archive import template_path
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 try:
     from pypylon import pylon
@@ -32,9 +37,23 @@ class BaslerCamera:
         self.config = config
         logger.info(f"Initializing BaslerCamera device '{name}'")
         self.name = name
+        self.camera_process = None
+        self.meas_data = []
+        self.image_counter = 1
+        self.fileformat = config["file-format"]
+        if config.get("separate-process", False):
+            # grab in separate process, the device is set up there
+            self.camera_process = CameraProcess(
+                BaslerCamera,
+                {**config, "separate-process": False},
+                name,
+                max(config.get("grab-interval", 0) / 1000, 1 / config["frame-rate"]),
+            )
+            for key, value in self.camera_process.info.items():
+                self.__dict__.setdefault(key, value)
+            return
         self._timeout = config["timeout"]
         device_number = config["device-number"]
-        self.fileformat = config["file-format"]
         tl_factory = pylon.TlFactory.GetInstance()
         self.device_name = tl_factory.EnumerateDevices()[
             device_number
@@ -56,8 +75,6 @@ class BaslerCamera:
         self._device.Open()
         self._device.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
         # self._device.StartGrabbing(pylon.GrabStrategy_UpcomingImage)
-        self.meas_data = []
-        self.image_counter = 1
 
     def _set_exposure_time(self, exposure_time):
         """Set exposure time."""
@@ -85,6 +102,8 @@ class BaslerCamera:
         Returns:
             numpy.array: image.
         """
+        if self.camera_process is not None:
+            return self.camera_process.sample()
         grab = self._device.RetrieveResult(self._timeout, pylon.TimeoutHandling_Return)
         if grab.GrabSucceeded():
             image = self._converter.Convert(grab).GetArray()
@@ -102,11 +121,33 @@ class BaslerCamera:
         self.base_directory = directory
         self.directory = f"{directory}/{self.name}"
         os.makedirs(self.directory)
+        self.image_container = None
+        units = "# datetime,s,-,filename,"
+        header = "time_abs,time_rel,seq,img-name,"
+        if self.config.get("image-container", False):
+            from ..storage import ImageContainer
+
+            self.image_container = ImageContainer(
+                self.directory, max_frames=self.config.get("container-frames", 1000)
+            )
+            units += "filename,bytes,bytes,"
+            header += "container,offset,size,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
         with open(f"{self.directory}/_images.csv", "w", encoding="utf-8") as f:
-            f.write("# datetime,s,filename,\n")
-            f.write("time_abs,time_rel,img-name,\n")
+            f.write(f"{units}\n")
+            f.write(f"{header}\n")
         with open(f"{self.directory}/device.txt", "w", encoding="utf-8") as f:
             f.write(self.device_name)
+        # images are encoded by workers, not in the sampler thread
+        self.image_pool = ImagePool(
+            self.name,
+            self.config.get("encode-workers", 2),
+            self.config.get("encode-queue", 8),
+            self.config.get("encode-policy", "drop"),
+            self.config.get("encode-processes", False),
+        )
         self.write_nomad_file(directory)
 
     def write_nomad_file(self, directory="./"):
@@ -116,51 +157,143 @@ class BaslerCamera:
             directory (str, optional): Output directory. Defaults to "./".
         """
         shutil.copy(
-            "./multilog/nomad/archive_template_Camera.yml",
+            template_path("archive_template_Camera.yml"),
             f"{directory}/{self.name}.archive.yaml",
         )
         with open(f"{self.base_directory}/{self.name}.archive.yaml", "a") as f:
             f.write(f"  exposure_time: {self.config['exposure-time']}\n")
             if "comment" in self.config:
                 f.write(f"  comment: {self.config['comment']}\n")
-            f.write(f"  images_list:\n")
+        # images_list is generated from _images.csv at the end
+
+    @staticmethod
+    def encode_image(image, filename, compression_level=None):
+        """Encode and write an image (called by the workers of the image
+        pool).
+
+        Args:
+            image (numpy.array): image as returned from sample().
+            filename (str): file path, the format is given by the
+                extension.
+            compression_level (int, optional): png: zlib level 0-9,
+                jpg: quality 1-95, tif: 0 uncompressed, else deflate.
+                Defaults to None (default of imageio).
+        """
+        if compression_level is None:
+            imwrite(filename, image)
+            return
+        extension = os.path.splitext(filename)[1]
+        Image.fromarray(image).save(
+            filename, **BaslerCamera.image_options(extension, compression_level)
+        )
+
+    @staticmethod
+    def encode_image_data(image, fileformat, compression_level=None):
+        """Encode an image in memory (called by the workers of the image
+        pool if image-container is configured).
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+        Args:
+            image (numpy.array): image as returned from sample().
+            fileformat (str): e.g. "jpeg", "tiff" or "png".
+            compression_level (int, optional): see encode_image().
+                Defaults to None (default of Pillow).
+
+        Returns:
+            bytes: encoded image.
+        """
+        buffer = io.BytesIO()
+        fileformat = {"jpg": "jpeg", "tif": "tiff"}.get(fileformat.lower(), fileformat)
+        options = {}
+        if compression_level is not None:
+            options = BaslerCamera.image_options(fileformat, compression_level)
+        Image.fromarray(image).save(buffer, fileformat, **options)
+        return buffer.getvalue()
+
+    @staticmethod
+    def image_options(fileformat, compression_level):
+        """Get the Pillow options for a compression level.
+
+        Args:
+            fileformat (str): format or file extension, e.g. ".jpeg".
+            compression_level (int): see encode_image().
+
+        Returns:
+            dict: keyword arguments for Image.save.
+        """
+        fileformat = fileformat.lower().lstrip(".")
+        if fileformat == "png":
+            return {"compress_level": compression_level}
+        if fileformat in ["jpg", "jpeg"]:
+            return {"quality": compression_level}
+        if fileformat in ["tif", "tiff"]:
+            return {"compression": "tiff_adobe_deflate" if compression_level else None}
+        return {}
+
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to files:
-        - jpg file with image
+        - jpg file with image (encoded by the image pool, the image is
+          dropped if encode-queue images are waiting)
         - csv with metadata
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (numpy.array): image as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timeRightNow = datetime.datetime.now(datetime.timezone.utc).astimezone() # this is bad coding, but the code has to be fast so I have to reuse this timestamp.
-
-        timediff = (
-            timeRightNow - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
         # saving the data:
         self.meas_data = sampling
         img_name = f"img_{self.image_counter:06}.{self.fileformat}"
-        imwrite(f"{self.directory}/{img_name}", sampling)
-        
-        with open(f"{self.directory}/_images.csv", "a", encoding="utf-8") as f:
-            f.write(
-                f"{timeRightNow.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{img_name},\n"
+        compression_level = self.config.get("compression-level")
+        if self.image_container is not None:
+            # the entry is written once the image is stored in the container
+            submitted = self.image_pool.submit(
+                self.encode_image_data,
+                sampling,
+                self.fileformat,
+                compression_level,
+                callback=lambda data: self.write_entry(
+                    img_name,
+                    tick,
+                    timing,
+                    self.image_container.append(img_name, data),
+                ),
             )
-        with open(f"{self.base_directory}/{self.name}.archive.yaml", "a") as f:  # todo
-            f.write(f"  - name: {img_name}\n")
-            f.write(f"    image: {self.name}/{img_name}\n")
-            f.write(f"    timestamp_rel: {time_rel}\n")
-            f.write(
-                f"    timestamp_abs: {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')}\n"
+        else:
+            submitted = self.image_pool.submit(
+                self.encode_image,
+                sampling,
+                f"{self.directory}/{img_name}",
+                compression_level,
             )
-        self.image_counter += 1
+            if submitted:
+                self.write_entry(img_name, tick, timing)
+        if submitted:
+            self.image_counter += 1
+
+    def write_entry(self, img_name, tick, timing, location=None):
+        """Write the entry of an image to _images.csv.
+
+        Args:
+            img_name (str): image name.
+            tick (Tick): timestamp of the sampling step.
+            timing (dict): request / response time or None.
+            location (tuple, optional): (container, offset, size) if
+                image-container is configured. Defaults to None.
+        """
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{img_name},"
+        if location is not None:
+            line += f"{location[0]},{location[1]},{location[2]},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
+        line += "\n"
+        write(f"{self.directory}/_images.csv", line)
 
     def set_frame_rate(self, frame_rate):
         """Set frame rate for continous sampling. The latest frame is
@@ -186,6 +319,9 @@ class BaslerCamera:
     def __del__(self):
         """Stopp sampling, reset device."""
         logger.debug(f"Deleting balser camera {self}")
+        if getattr(self, "camera_process", None) is not None:
+            self.camera_process.stop()
+            return
         self._device.StopGrabbing()
         self._device.Close()
         logger.debug(f"Stopped grabbing and closed device.")
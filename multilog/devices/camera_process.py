@@ -0,0 +1,275 @@
+"""This module is used to run the grab loop of a camera in a separate
+process, so that image conversion and copying doesn't compete with the
+GUI for the GIL. Frames are published through a ring buffer in shared
+memory and read by the main process without pickling."""
+import logging
+import logging.handlers
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+import time
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+def attach_shared_memory(name):
+    """Attach to an existing shared memory block. It's unlinked by the
+    creating process; the camera process shares the resource tracker of
+    the main process, so it must not unregister the block.
+
+    Args:
+        name (str): name of the shared memory block.
+
+    Returns:
+        multiprocessing.shared_memory.SharedMemory
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # python >= 3.13
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class FrameRing:
+    """Ring buffer of frames in shared memory with one writer and any
+    number of readers. Each slot stores a sequence number and a
+    timestamp; the sequence number is set to -1 while the slot is
+    written so that readers can detect torn frames."""
+
+    def __init__(self, shape, dtype, slots=4, name=None):
+        """Create a new ring buffer or attach to an existing one.
+
+        Args:
+            shape (tuple): shape of the frames.
+            dtype (numpy.dtype / str): data type of the frames.
+            slots (int, optional): number of frames in the buffer.
+                Defaults to 4.
+            name (str, optional): name of an existing shared memory
+                block. Defaults to None (create new buffer).
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.owner = name is None
+        frame_size = int(np.prod(self.shape)) * self.dtype.itemsize
+        header_size = 8 * (1 + 2 * slots)
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=header_size + slots * frame_size
+            )
+        else:
+            self.shm = attach_shared_memory(name)
+        self.name = self.shm.name
+        # [latest sequence number, (sequence number, timestamp) per slot]
+        self.header = np.ndarray((1 + 2 * slots,), np.int64, self.shm.buf)
+        self.frames = np.ndarray(
+            (slots, *self.shape), self.dtype, self.shm.buf, offset=header_size
+        )
+        if self.owner:
+            self.header[:] = -1
+
+    def publish(self, frame, timestamp):
+        """Write a frame into the next slot.
+
+        Args:
+            frame (numpy.array): frame.
+            timestamp (int): [ns] timestamp of the frame
+                (time.monotonic_ns).
+        """
+        seq = int(self.header[0]) + 1
+        slot = seq % self.slots
+        self.header[1 + 2 * slot] = -1
+        self.frames[slot] = frame
+        self.header[2 + 2 * slot] = timestamp
+        self.header[1 + 2 * slot] = seq
+        self.header[0] = seq
+
+    def read(self):
+        """Copy the latest frame out of the buffer.
+
+        Returns:
+            tuple: (sequence number, timestamp, frame) or None if no
+                frame was published yet.
+        """
+        for i in range(self.slots):
+            seq = int(self.header[0])
+            if seq < 0:
+                return None
+            slot = seq % self.slots
+            frame = self.frames[slot].copy()
+            timestamp = int(self.header[2 + 2 * slot])
+            if self.header[1 + 2 * slot] == seq:
+                return seq, timestamp, frame
+        raise RuntimeError("Unable to read frame, writer is too fast.")
+
+    def close(self):
+        """Close the shared memory, the creating process unlinks it."""
+        del self.header
+        del self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def grab_loop(
+    device_class, config, name, interval, slots, pipe, stop_event, log_queue, log_level
+):
+    """Main function of the camera process: create the device and
+    publish a frame every interval until stop_event is set.
+
+    Args:
+        device_class (class): camera class, e.g. BaslerCamera.
+        config (dict): device configuration.
+        name (str): device name.
+        interval (float): [s] time step of the grab loop.
+        slots (int): number of frames in the ring buffer.
+        pipe (multiprocessing.connection.Connection): connection used
+            for the setup of the ring buffer.
+        stop_event (multiprocessing.Event): event to stop the loop.
+        log_queue (multiprocessing.Queue): queue to forward logging to
+            the main process.
+        log_level (int): logging level.
+    """
+    root_logger = logging.getLogger()
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root_logger.setLevel(log_level)
+    try:
+        device = device_class(config, name)
+        grab = getattr(device, "grab", device.sample)  # raw frames if available
+        frame = grab()
+    except Exception as e:
+        logger.exception(f"Could not initialize {name} in camera process.")
+        pipe.send(None)
+        return
+    # simple attributes are copied to the device object in the main process
+    info = {
+        key: value
+        for key, value in vars(device).items()
+        if isinstance(value, (str, int, float, bool, list, dict, tuple))
+    }
+    pipe.send((frame.shape, frame.dtype.str, info))
+    ring = FrameRing(frame.shape, frame.dtype, slots, pipe.recv())
+    ring.publish(frame, time.monotonic_ns())
+    pipe.send(True)  # first frame is available
+    logger.info(f"{name}: grab loop started in process {multiprocessing.current_process().pid}")
+    deadline = time.monotonic()
+    while not stop_event.is_set():
+        deadline += interval
+        try:
+            ring.publish(grab(), time.monotonic_ns())
+        except Exception as e:
+            logger.exception(f"Could not grab frame of {name}.")
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            stop_event.wait(remaining)
+        else:
+            deadline = time.monotonic()
+    ring.close()
+    del device
+    logger.info(f"{name}: grab loop stopped")
+
+
+class CameraProcess:
+    """Runs the grab loop of a camera in a separate process. The device
+    object is created in the new process, the latest frame is read from
+    shared memory using sample()."""
+
+    def __init__(self, device_class, config, name, interval, slots=4, timeout=60):
+        """Start the camera process and wait until the first frame was
+        grabbed.
+
+        Args:
+            device_class (class): camera class, e.g. BaslerCamera.
+            config (dict): device configuration.
+            name (str): device name.
+            interval (float): [s] time step of the grab loop.
+            slots (int, optional): number of frames in the ring buffer.
+                Defaults to 4.
+            timeout (float, optional): [s] timeout for the
+                initialization. Defaults to 60.
+        """
+        logger.info(f"Starting camera process for {name}")
+        self.name = name
+        self.ring = None
+        context = multiprocessing.get_context("spawn")
+        self._stop_event = context.Event()
+        self._log_queue = context.Queue()
+        self._pipe, child_pipe = context.Pipe()
+        self.process = context.Process(
+            target=grab_loop,
+            args=(
+                device_class,
+                config,
+                name,
+                interval,
+                slots,
+                child_pipe,
+                self._stop_event,
+                self._log_queue,
+                logging.getLogger().getEffectiveLevel(),
+            ),
+            name=f"{name}-grab-loop",
+            daemon=True,
+        )
+        self.process.start()
+        self._log_thread = threading.Thread(target=self._forward_logs, daemon=True)
+        self._log_thread.start()
+        message = None
+        deadline = time.monotonic() + timeout
+        while self.process.is_alive() and time.monotonic() < deadline:
+            if self._pipe.poll(0.1):
+                message = self._pipe.recv()
+                break
+        if message is None:
+            self.stop()
+            raise RuntimeError(f"Initialization of {name} in camera process failed.")
+        shape, dtype, self.info = message
+        self.ring = FrameRing(shape, dtype, slots)
+        self._pipe.send(self.ring.name)
+        if not self._pipe.poll(timeout):
+            self.stop()
+            raise RuntimeError(f"Initialization of {name} in camera process failed.")
+        self._pipe.recv()
+
+    def _forward_logs(self):
+        """Pass log records of the camera process to the loggers of the
+        main process."""
+        while True:
+            record = self._log_queue.get()
+            if record is None:
+                break
+            logging.getLogger(record.name).handle(record)
+
+    def sample(self):
+        """Read the latest frame.
+
+        Returns:
+            numpy.array: frame.
+        """
+        if self.ring is None or not self.process.is_alive():
+            raise RuntimeError(f"Camera process of {self.name} terminated.")
+        frame = self.ring.read()
+        if frame is None:
+            raise RuntimeError(f"No frame of {self.name} available yet.")
+        return frame[2]
+
+    def stop(self, timeout=5):
+        """Stop the grab loop and release the shared memory.
+
+        Args:
+            timeout (float, optional): [s] timeout for the process to
+                finish before it's terminated. Defaults to 5.
+        """
+        if self._stop_event.is_set():
+            return
+        logger.info(f"Stopping camera process for {self.name}")
+        self._stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning(f"Terminating camera process of {self.name}.")
+            self.process.terminate()
+        self._log_queue.put(None)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -5,6 +5,8 @@ import numpy as np
 from serial import Serial, SerialException
 import yaml
 
+from ..archive import load_template
+from ..writer import write
 
 logger = logging.getLogger(__name__)
 
@@ -213,8 +215,8 @@ class Daq6510:
         cmds.append("DISP:LIGH:STAT ON50\n")
         cmds.append('DISP:USER1:TEXT "ready to start ..."\n')
 
-        for cmd in cmds:
-            self.serial.write(cmd.encode())
+        self.configuration_commands = cmds
+        self.configure()
 
         # container for measurement data, allocation of channel_id and name
         self.meas_data = {}
@@ -256,11 +258,15 @@ class Daq6510:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,"
-        header = "time_abs,time_rel,"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,"
+        header = "time_abs,time_rel,seq,"
         for sensor in self.meas_data:
             units += f"{self.unit[sensor].replace('°', 'DEG ')},"
             header += f"{sensor},"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
         units += "\n"
         header += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
@@ -274,8 +280,7 @@ class Daq6510:
         Args:
             directory (str, optional): Output directory. Defaults to "./".
         """
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -318,28 +323,34 @@ class Daq6510:
         with open(f"{directory}/{self.name}.archive.yaml", "w", encoding="utf-8") as f:
             yaml.safe_dump(nomad_dict, f, sort_keys=False)
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},"
         for sensor in self.meas_data:
             self.meas_data[sensor].append(sampling[sensor])
+        if self.storage is not None:
+            values = [sampling[sensor] for sensor in self.meas_data]
+            self.storage.append(tick, values, timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},"
+        for sensor in self.meas_data:
             line += f"{sampling[sensor]},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
         line += "\n"
-        with open(self.filename, "a") as f:
-            f.write(line)
+        write(self.filename, line)
 
     @property
     def device_id(self):
@@ -367,6 +378,20 @@ class Daq6510:
         cmd = f'DISP:USER1:TEXT "{message}"\n'
         self.serial.write(cmd.encode())
 
+    def configure(self):
+        """Send the channel configuration to the device."""
+        for cmd in self.configuration_commands:
+            self.serial.write(cmd.encode())
+
+    def reconnect(self):
+        """Reopen the serial interface and configure the device again.
+        This is called by the circuit breaker if the device failed."""
+        if type(self.serial) != SerialMock:
+            self.serial.close()
+        self.serial = Serial(**self.config["serial-interface"])
+        self.reset()
+        self.configure()
+
     def reset(self):
         """Reset device to factory default."""
         logger.info(f"{self.name} - resetting device")
@@ -7,6 +7,10 @@ import yaml
 import socket
 import json
 
+from ..aio import request
+from ..archive import load_template
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 
@@ -49,6 +53,7 @@ class Eurotherm:
             self.vifconIP      = config["tcp-interface"]["IP"]
             self.vifconPort    = config["tcp-interface"]["Port"]
             self.meas_data = {"IWT": [], "SWT": [], "Operating point": []}
+            self.asynchronous = True  # supports asyncio I/O engine
             try:
                 self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 self.s.connect((self.vifconIP, self.vifconPort))
@@ -60,6 +65,19 @@ class Eurotherm:
 
         
 
+    def reconnect(self):
+        """Reopen the serial interface or tcp connection. This is called
+        by the circuit breaker if the device failed."""
+        if self.conectionType == "serial":
+            if type(self.serial) != SerialMock:
+                self.serial.close()
+            self.serial = Serial(**self.config["serial-interface"])
+        elif self.conectionType == "tcp":
+            self.s.close()
+            self.s = socket.create_connection((self.vifconIP, self.vifconPort), 5)
+            self.s.settimeout(None)
+            logger.info(f"{self.name} connected to VIFCON")
+
     def sample(self):
         """Read sampling form device.
 
@@ -82,46 +100,84 @@ class Eurotherm:
             try:
                 self.s.send(bytes(self.name, 'UTF-8')) # send trigger
                 received = self.s.recv(1024)
-                received = received.decode("utf-8")
-                data = json.loads(received)
-                IWT = data["IWT"]
-                SWT = data["SWT"]
-                op  = data["IWOp"]
             except Exception as e:
-                logger.exception(f"Could not sample {self.name}.")
-                IWT = np.nan
-                SWT = np.nan
-                op  = np.nan
-            return {"IWT": IWT, "SWT": SWT, "Operating point": op}
+                received = e
+            return self.convert_sampling(received)
+
+    async def sample_async(self, timeout):
+        """Asynchronous version of sample() used by the asyncio I/O
+        engine (tcp connection only).
+
+        Args:
+            timeout (float): [s] timeout for the response.
+
+        Returns:
+            dict: {sensor name: measurement value}
+        """
+        try:
+            received = await request(self.s, bytes(self.name, 'UTF-8'), 1024, timeout)
+        except Exception as e:
+            received = e
+        return self.convert_sampling(received)
+
+    def convert_sampling(self, received):
+        """Decode the JSON response of VIFCON (tcp connection).
+
+        Args:
+            received (bytes/Exception): response or exception raised
+                during the request.
+
+        Returns:
+            dict: {sensor name: measurement value}
+        """
+        try:
+            if isinstance(received, Exception):
+                raise received
+            data = json.loads(received.decode("utf-8"))
+            IWT = data["IWT"]
+            SWT = data["SWT"]
+            op  = data["IWOp"]
+        except Exception as e:
+            logger.exception(f"Could not sample {self.name}.")
+            IWT = np.nan
+            SWT = np.nan
+            op  = np.nan
+        return {"IWT": IWT, "SWT": SWT, "Operating point": op}
         
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
             
         self.meas_data["Operating point"].append(sampling["Operating point"])
         if self.conectionType == "serial":
             self.meas_data["Temperature"].append(sampling["Temperature"])
-            line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{sampling['Temperature']},{sampling['Operating point']},\n"
+            values = [sampling["Temperature"], sampling["Operating point"]]
+            line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{sampling['Temperature']},{sampling['Operating point']},"
         elif self.conectionType == "tcp":
             self.meas_data["IWT"].append(sampling["IWT"])
             self.meas_data["SWT"].append(sampling["SWT"])
-            line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{sampling['IWT']},{sampling['SWT']},{sampling['Operating point']},\n"
-        
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+            values = [sampling["IWT"], sampling["SWT"], sampling["Operating point"]]
+            line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{sampling['IWT']},{sampling['SWT']},{sampling['Operating point']},"
+        if self.storage is not None:
+            self.storage.append(tick, values, timing)
+            return
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
+        line += "\n"
+        write(self.filename, line)
 
     def init_output(self, directory="./"):
         """Initialize the csv output file.
@@ -130,14 +186,19 @@ class Eurotherm:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
+        self.storage = None  # binary storage backend, set by acquisition
         
         if self.conectionType == "serial":
-            units = "# datetime,s,DEG C,-,\n"
-            header = "time_abs,time_rel,Temperature,Operating point,\n"
+            units = "# datetime,s,-,DEG C,-,"
+            header = "time_abs,time_rel,seq,Temperature,Operating point,"
         elif self.conectionType == "tcp":
-            units = "# datetime,s,DEG C,DEG C,-,\n"
-            header = "time_abs,time_rel,IWT,SWT,Operating point,\n"
-            
+            units = "# datetime,s,-,DEG C,DEG C,-,"
+            header = "time_abs,time_rel,seq,IWT,SWT,Operating point,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
+        units += "\n"
+        header += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
             f.write(units)
             f.write(header)
@@ -149,8 +210,7 @@ class Eurotherm:
         Args:
             directory (str, optional): Output directory. Defaults to "./".
         """
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -12,6 +12,10 @@ import subprocess
 import traceback
 import yaml
 
+from ..aio import http_get_json
+from ..archive import load_template
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 # required for camera
@@ -71,6 +75,7 @@ class IfmFlowmeter:
             self.meas_data["Temperature"].update({name: []})
             self.meas_data["Flow"].update({name: []})
         self.last_sampling = {"Temperature": {}, "Flow": {}}
+        self.asynchronous = True  # supports asyncio I/O engine
         if "flow-balance" in config:
             self.inflow_sensors = config["flow-balance"]["inflow"]
             self.outflow_sensors = config["flow-balance"]["outflow"]
@@ -81,18 +86,63 @@ class IfmFlowmeter:
     def sample(self):
         """Read sampling form device and convert values to readable format.
 
+        Returns:
+            dict: {sensor name: measurement value}
+        """
+        responses = {}
+        for port in self.ports:
+            try:
+                r = requests.get(f"http://{self.ip}{self.get_path(port)}")
+                responses.update({port: r.json()})
+            except Exception as e:
+                responses.update({port: e})
+        return self.convert_sampling(responses)
+
+    async def sample_async(self, timeout):
+        """Asynchronous version of sample() used by the asyncio I/O
+        engine, all ports are requested concurrently.
+
+        Args:
+            timeout (float): [s] timeout for each request.
+
+        Returns:
+            dict: {sensor name: measurement value}
+        """
+        responses = await asyncio.gather(
+            *[http_get_json(self.ip, self.get_path(port), timeout) for port in self.ports],
+            return_exceptions=True,
+        )
+        return self.convert_sampling(dict(zip(self.ports, responses)))
+
+    def get_path(self, port):
+        """Get the path of the process data of a port on the IO-Link
+        master.
+
+        Args:
+            port (int): port number.
+
+        Returns:
+            str: path of the request.
+        """
+        return f"/iolinkmaster/port[{port}]/iolinkdevice/pdin/getdata"
+
+    def convert_sampling(self, responses):
+        """Convert the responses of the IO-Link master to readable format.
+
+        Args:
+            responses (dict): {port: decoded JSON response or exception}
+
         Returns:
             dict: {sensor name: measurement value}
         """
         sampling = {"Temperature": {}, "Flow": {}}
         for port in self.ports:
+            name = self.ports[port]["name"]
+            sensor_type = self.ports[port]["type"]
             try:
-                name = self.ports[port]["name"]
-                sensor_type = self.ports[port]["type"]
-                r = requests.get(
-                    f"http://{self.ip}/iolinkmaster/port[{port}]/iolinkdevice/pdin/getdata"
-                )
-                data = r.json()
+                data = responses[port]
+                if isinstance(data, Exception):
+                    raise data
                 data_hex = data["data"]["value"]
                 l = len(data_hex)
                 if sensor_type == "SM-8020":
@@ -119,33 +169,44 @@ class IfmFlowmeter:
         self.last_sampling = deepcopy(sampling)
         return sampling
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},"
         for sensor in self.meas_data["Flow"]:
             self.meas_data["Flow"][sensor].append(sampling["Flow"][sensor])
-            line += f"{sampling['Flow'][sensor]},"
         for sensor in self.meas_data["Temperature"]:
             self.meas_data["Temperature"][sensor].append(
                 sampling["Temperature"][sensor]
             )
+        if self.storage is not None:
+            values = [sampling["Flow"][sensor] for sensor in self.meas_data["Flow"]]
+            values += [
+                sampling["Temperature"][sensor]
+                for sensor in self.meas_data["Temperature"]
+            ]
+            self.storage.append(tick, values, timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},"
+        for sensor in self.meas_data["Flow"]:
+            line += f"{sampling['Flow'][sensor]},"
+        for sensor in self.meas_data["Temperature"]:
             line += f"{sampling['Temperature'][sensor]},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
         line += "\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        write(self.filename, line)
 
     def init_output(self, directory="./"):
         """Initialize the csv output file.
@@ -154,14 +215,18 @@ class IfmFlowmeter:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,"
-        header = "time_abs,time_rel,"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,"
+        header = "time_abs,time_rel,seq,"
         for sensor in self.meas_data["Flow"]:
             header += f"{sensor}-flow,"
             units += "l/min,"
         for sensor in self.meas_data["Temperature"]:
             header += f"{sensor}-temperature,"
             units += "DEG C,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
         units += "\n"
         header += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
@@ -175,8 +240,7 @@ class IfmFlowmeter:
         Args:
             directory (str, optional): Output directory. Defaults to "./".
         """
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
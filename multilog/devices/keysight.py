@@ -5,6 +5,9 @@ import numpy as np
 import usbtmc
 import yaml
 
+from ..archive import load_template
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 
@@ -133,8 +136,14 @@ class Keysight:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,V,V,V,V,V,V,V,V,Hz,Hz,Hz,Hz,V,Hz,\n"
-        header = "time_abs,time_rel,VRMS AC Ch.1,VRMS AC Ch.2,VRMS AC Ch.3,VRMS AC Ch.4,VRMS DC Ch.1,VRMS DC Ch.2,VRMS DC Ch.3,VRMS DC Ch.4,f Ch.1,f Ch.2,f Ch.3,f Ch.4,Wave-Generator V,Wave-Generator f,\n"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,V,V,V,V,V,V,V,V,Hz,Hz,Hz,Hz,V,Hz,"
+        header = "time_abs,time_rel,seq,VRMS AC Ch.1,VRMS AC Ch.2,VRMS AC Ch.3,VRMS AC Ch.4,VRMS DC Ch.1,VRMS DC Ch.2,VRMS DC Ch.3,VRMS DC Ch.4,f Ch.1,f Ch.2,f Ch.3,f Ch.4,Wave-Generator V,Wave-Generator f,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
+        units += "\n"
+        header += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
             f.write(units)
             f.write(header)
@@ -146,8 +155,7 @@ class Keysight:
         Args:
             directory (str, optional): Output directory. Defaults to "./".
         """
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -189,20 +197,20 @@ class Keysight:
         with open(f"{directory}/{self.name}.archive.yaml", "w", encoding="utf-8") as f:
             yaml.safe_dump(nomad_dict, f, sort_keys=False)
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (float): temperature, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
         self.meas_data["VRMS AC Ch.1"].append(sampling["VRMS AC Ch.1"])
         self.meas_data["VRMS AC Ch.2"].append(sampling["VRMS AC Ch.2"])
@@ -218,6 +226,12 @@ class Keysight:
         self.meas_data["Frequency Ch.4"].append(sampling["Frequency Ch.4"])
         self.meas_data["WaveGen V"].append(sampling["WaveGen V"])
         self.meas_data["WaveGen f"].append(sampling["WaveGen f"])
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{sampling['VRMS AC Ch.1']},{sampling['VRMS AC Ch.2']},{sampling['VRMS AC Ch.3']},{sampling['VRMS AC Ch.4']},{sampling['VRMS DC Ch.1']},{sampling['VRMS DC Ch.2']},{sampling['VRMS DC Ch.3']},{sampling['VRMS DC Ch.4']},{sampling['Frequency Ch.1']},{sampling['Frequency Ch.2']},{sampling['Frequency Ch.3']},{sampling['Frequency Ch.4']},{sampling['WaveGen V']},{sampling['WaveGen f']},\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        if self.storage is not None:
+            values = [sampling[channel] for channel in self.meas_data]
+            self.storage.append(tick, values, timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{sampling['VRMS AC Ch.1']},{sampling['VRMS AC Ch.2']},{sampling['VRMS AC Ch.3']},{sampling['VRMS AC Ch.4']},{sampling['VRMS DC Ch.1']},{sampling['VRMS DC Ch.2']},{sampling['VRMS DC Ch.3']},{sampling['VRMS DC Ch.4']},{sampling['Frequency Ch.1']},{sampling['Frequency Ch.2']},{sampling['Frequency Ch.3']},{sampling['Frequency Ch.4']},{sampling['WaveGen V']},{sampling['WaveGen f']},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
+        line += "\n"
+        write(self.filename, line)
@@ -1,12 +1,16 @@
 import datetime
+import io
 import logging
 import matplotlib.pyplot as plt
-import multiprocessing
 import numpy as np
 import os
 import shutil
 import traceback
 
+from .camera_process import CameraProcess
+from .render_pool import RenderPool
+from ..archive import template_path
+from ..writer import COMPRESSION, open_text, write
 
 logger = logging.getLogger(__name__)
 try:
@@ -35,6 +39,21 @@ class OptrisIP640:
         self.config = config
         logger.info(f"Initializing OptrisIP640 device '{name}'")
         self.name = name
+        self.camera_process = None
+        self.meas_data = []
+        self.image_counter = 1
+        self.raw_image = None  # of the last sampling
+        if config.get("separate-process", False):
+            # grab in separate process, the device is set up there
+            self.camera_process = CameraProcess(
+                OptrisIP640,
+                {**config, "separate-process": False},
+                name,
+                max(config.get("grab-interval", 0) / 1000, 1 / config["framerate"]),
+            )
+            for key, value in self.camera_process.info.items():
+                self.__dict__.setdefault(key, value)
+            return
         self.emissivity = config["emissivity"]
         logger.info(f"{self.name} - emissivity {self.emissivity}")
         self.transmissivity = config["transmissivity"]
@@ -93,17 +112,27 @@ class OptrisIP640:
             self.emissivity, self.transmissivity, self.t_ambient
         )
         self.w, self.h = optris.get_thermal_image_size()
-        self.meas_data = []
-        self.image_counter = 1
+
+    def grab(self):
+        """Read the raw image from the device, used by the camera process.
+
+        Returns:
+            numpy.array: raw IR image (uint16, temperature = raw / 10 - 100)
+        """
+        return optris.get_thermal_image(self.w, self.h)
 
     def sample(self):
-        """Read image form device.
+        """Read image form device. The raw image is kept in raw_image
+        for the frame store.
 
         Returns:
             numpy.array: IR image (2D temperature filed)
         """
-        raw_image = optris.get_thermal_image(self.w, self.h)
-        thermal_image = (raw_image - 1000.0) / 10.0  # convert to temperature
+        if self.camera_process is not None:
+            self.raw_image = self.camera_process.sample()
+        else:
+            self.raw_image = self.grab()
+        thermal_image = (self.raw_image - 1000.0) / 10.0  # convert to temperature
         return thermal_image
 
     @staticmethod
@@ -114,7 +143,10 @@ class OptrisIP640:
 
         Args:
             sampling (numpy array): IR image as returned from sample()
-            filename (str): filepath of plot
+            filename (str): filepath of plot, None to return the PNG data.
+
+        Returns:
+            bytes: PNG data if filename is None.
         """
         fig, ax = plt.subplots()
         ax.axis("off")
@@ -123,6 +155,11 @@ class OptrisIP640:
         cax = divider.append_axes("right", size="5%", pad=0.05)
         fig.colorbar(line, cax=cax)
         fig.tight_layout()
+        if filename is None:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png")
+            plt.close(fig)
+            return buffer.getvalue()
         fig.savefig(filename)
         plt.close(fig)
 
@@ -135,9 +172,45 @@ class OptrisIP640:
         self.base_directory = directory
         self.directory = f"{directory}/{self.name}"
         os.makedirs(self.directory)
+        self.frame_store = None
+        if self.config.get("frame-store", "csv") != "csv":
+            from ..storage import FrameStore
+
+            # raw values of the camera, temperature = raw / 10 - 100
+            self.frame_store = FrameStore(
+                self.directory,
+                (self.h, self.w),
+                self.config["frame-store"],
+                "uint16",
+                scale=0.1,
+                offset=-100,
+                compression=self.config.get("compression", 0),
+            )
+        self.render_pool = None
+        if self.config.get("render", "fast") != "off":
+            self.render_pool = RenderPool(
+                self.name,
+                self.config.get("render-workers", 1),
+                self.config.get("render-queue", 4),
+                self.config.get("render-policy", "drop"),
+            )
+        self.image_container = None
+        units = "# datetime,s,-,filename,"
+        header = "time_abs,time_rel,seq,img-name,"
+        if self.config.get("image-container", False) and self.render_pool is not None:
+            from ..storage import ImageContainer
+
+            self.image_container = ImageContainer(
+                self.directory, max_frames=self.config.get("container-frames", 1000)
+            )
+            units += "filename,bytes,bytes,"
+            header += "container,offset,size,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
         with open(f"{self.directory}/_images.csv", "w", encoding="utf-8") as f:
-            f.write("# datetime,s,filename,\n")
-            f.write("time_abs,time_rel,img-name,\n")
+            f.write(f"{units}\n")
+            f.write(f"{header}\n")
         self.write_nomad_file(directory)
 
     def write_nomad_file(self, directory="./"):
@@ -147,7 +220,7 @@ class OptrisIP640:
             directory (str, optional): Output directory. Defaults to "./".
         """
         shutil.copy(
-            "./multilog/nomad/archive_template_IR-Camera.yml",
+            template_path("archive_template_IR-Camera.yml"),
             f"{directory}/{self.name}.archive.yaml",
         )
         with open(f"{self.base_directory}/{self.name}.archive.yaml", "a") as f:
@@ -158,53 +231,94 @@ class OptrisIP640:
             f.write(f"  extended_temperature_range: {self.config['extended-T-range']}\n")
             if "comment" in self.config:
                 f.write(f"  comment: {self.config['comment']}\n")
-            f.write(f"  ir_images_list:\n")
+        # ir_images_list is generated from _images.csv at the end
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to files:
-        - numpy array with temperature distribution
+        - numpy array with temperature distribution (csv file, compressed
+          if stream-compression is configured, or frame container if
+          frame-store is configured)
         - png file with 2D IR image
         - csv with metadata
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (numpy.array): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
         self.meas_data = sampling
         img_name = f"img_{self.image_counter:06}"
-        np.savetxt(f"{self.directory}/{img_name}.csv", sampling, "%.2f")
-        # plot in separate process because matplotlib is not threadsave
-        multiprocessing.Process(
-            target=self.plot_to_file,
-            args=(sampling, f"{self.directory}/{img_name}.png"),
-        ).start()
-        # self.plot_to_file(sampling, f"{self.directory}/{img_name}.png")
-        with open(f"{self.directory}/_images.csv", "a", encoding="utf-8") as f:
-            f.write(
-                f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{img_name},\n"
-            )
-        with open(f"{self.base_directory}/{self.name}.archive.yaml", "a") as f:
-            f.write(f"  - name: {img_name}\n")
-            f.write(f"    image: {self.name}/{img_name}.png\n")
-            f.write(f"    heat_map: {self.name}/{img_name}.csv\n")
-            f.write(f"    timestamp_rel: {time_rel}\n")
-            f.write(
-                f"    timestamp_abs: {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')}\n"
-            )
-
+        if self.frame_store is not None:
+            self.frame_store.append(self.raw_image, tick)
+        elif self.config.get("stream-compression") is not None:
+            with open_text(
+                f"{self.directory}/{img_name}.csv{COMPRESSION[self.config['stream-compression']]}",
+                "w",
+                self.config.get("stream-compression-level"),
+            ) as f:
+                np.savetxt(f, sampling, "%.2f")
+        else:
+            np.savetxt(f"{self.directory}/{img_name}.csv", sampling, "%.2f")
+        # plot in worker processes, matplotlib is not threadsave
+        renderer = self.plot_to_file if self.config.get("render") == "matplotlib" else None
+        if self.image_container is not None:
+            # the entry is written once the preview is in the container,
+            # the entries are written in the order of the samplings
+            if not self.render_pool.submit(
+                sampling,
+                None,
+                renderer,
+                callback=lambda data: self.write_entry(
+                    img_name,
+                    tick,
+                    timing,
+                    self.image_container.append(f"{img_name}.png", data),
+                ),
+            ):
+                self.render_pool.call_in_order(
+                    lambda location: self.write_entry(img_name, tick, timing, location),
+                    ("", "", ""),
+                )
+        else:
+            if self.render_pool is not None:
+                self.render_pool.submit(
+                    sampling, f"{self.directory}/{img_name}.png", renderer
+                )
+            self.write_entry(img_name, tick, timing)
         self.image_counter += 1
 
+    def write_entry(self, img_name, tick, timing, location=None):
+        """Write the entry of an image to _images.csv.
+
+        Args:
+            img_name (str): image name.
+            tick (Tick): timestamp of the sampling step.
+            timing (dict): request / response time or None.
+            location (tuple, optional): (container, offset, size) of the
+                preview if image-container is configured. Defaults to
+                None.
+        """
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{img_name},"
+        if location is not None:
+            line += f"{location[0]},{location[1]},{location[2]},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
+        line += "\n"
+        write(f"{self.directory}/_images.csv", line)
+
     def __del__(self):
         """Terminate IR camera communication and remove xml."""
         logger.debug(f"Deleting IR camera {self}")
+        if getattr(self, "camera_process", None) is not None:
+            self.camera_process.stop()
+            return
         optris.terminate()
         os.remove(self.xml_file)
         logger.debug(f"Terminated optris and removed xml.")
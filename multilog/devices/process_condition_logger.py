@@ -4,6 +4,8 @@ import logging
 import subprocess
 import yaml
 
+from ..archive import load_template
+from ..writer import write
 
 logger = logging.getLogger(__name__)
 
@@ -47,11 +49,14 @@ class ProcessConditionLogger:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        header = "time_abs,time_rel,"
-        units = "# datetime,s,"
+        header = "time_abs,time_rel,seq,"
+        units = "# datetime,s,-,"
         for condition in self.meas_data:
             header += f"{condition},"
             units += f"{self.condition_units[condition]},"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
         header += "\n"
         units += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
@@ -89,8 +94,7 @@ class ProcessConditionLogger:
         Args:
             directory (str, optional): Output directory. Defaults to "./".
         """
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -143,7 +147,7 @@ class ProcessConditionLogger:
         # meas_data is updated by the widget if changes are made. No real sampling required.
         return self.meas_data
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write sampling data to file. This function creates to files:
         - A csv file with all values for each timestep (follwoing the
         standard sampling procedure)
@@ -152,29 +156,30 @@ class ProcessConditionLogger:
         write it to their labbook)
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},"
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},"
         for condition in sampling:
             line += f"{sampling[condition]},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
         line += "\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        write(self.filename, line)
 
-        if self.meas_data != self.last_meas_data and time_rel > 1:
-            with open(self.protocol_filename, "a", encoding="utf-8") as f:
-                for condition in self.meas_data:
-                    if self.meas_data[condition] != self.last_meas_data[condition]:
-                        f.write(
-                            f"- {time_abs.strftime('%d.%m.%Y, %H:%M:%S')}, {time_rel:.1f} s, {condition}: {self.meas_data[condition]} {self.condition_units[condition]}\n"
-                        )
+        if self.meas_data != self.last_meas_data and tick.time_rel > 1:
+            for condition in self.meas_data:
+                if self.meas_data[condition] != self.last_meas_data[condition]:
+                    write(
+                        self.protocol_filename,
+                        f"- {tick.time_abs.strftime('%d.%m.%Y, %H:%M:%S')}, {tick.time_rel:.1f} s, {condition}: {self.meas_data[condition]} {self.condition_units[condition]}\n",
+                    )
             self.last_meas_data = deepcopy(self.meas_data)
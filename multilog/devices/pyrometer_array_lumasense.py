@@ -2,9 +2,13 @@ from copy import deepcopy
 import datetime
 import logging
 import numpy as np
-from serial import Serial, SerialException
+from serial import SerialException
 import yaml
 
+from .serial_bus import SerialBus
+from ..archive import load_template
+from ..writer import write
+
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +19,7 @@ class SerialMock:
     def write(self, _):
         pass
 
-    def readline(self):
+    def read_until(self, _):
         return "".encode()
 
 
@@ -35,9 +39,12 @@ class PyrometerArrayLumasense:
         self.device_id = config["device-id"]
         self.name = name
         try:
-            self.serial = Serial(**config["serial-interface"])
+            # the port may be shared with other devices on the RS485 line
+            self.bus = SerialBus.get(config["serial-interface"])
+            self.serial = self.bus.serial
         except SerialException as e:
             logger.exception(f"Connection to {self.name} not possible.")
+            self.bus = None
             self.serial = SerialMock()
         self.t90_dict = config["t90-dict"]
         self.meas_data = {}
@@ -59,20 +66,39 @@ class PyrometerArrayLumasense:
                 self.set_emissivity(head_number, config["sensors"][sensor]["t90"])
         self.latestSample = np.nan
 
-    def _get_ok(self):
-        """Check if command was accepted."""
-        assert self.serial.readline().decode().strip() == "ok"
+    def reconnect(self):
+        """Connect to the serial bus (or reopen its port) and configure
+        the device again. This is called by the circuit breaker if the
+        device failed."""
+        if self.bus is None:
+            self.bus = SerialBus.get(self.config["serial-interface"])
+        else:
+            self.bus.reopen()
+        self.serial = self.bus.serial
+        for sensor in self.sensors:
+            self.set_emissivity(self.head_numbering[sensor], self.emissivities[sensor])
+
+    def _request(self, cmd):
+        """Send command and read the response (terminated by \\r)."""
+        if self.bus is None:
+            self.serial.write(cmd.encode())
+            return self.serial.read_until(b"\r").decode().strip()
+        return self.bus.request(cmd.encode()).decode().strip()
+
+    def _get_ok(self, cmd):
+        """Send command and check if it was accepted."""
+        assert self._request(cmd) == "ok"
 
-    def _get_float(self):
-        """Read floatingpoint value."""
-        string_val = self.serial.readline().decode().strip()
+    @staticmethod
+    def _to_float(string_val):
+        """Convert response into floatingpoint value."""
+        string_val = string_val.strip()
         return float(f"{string_val[:-1]}.{string_val[-1:]}")
 
     def get_heat_id(self, head_number):
         """Get the id of a certain head."""
         cmd = f"{self.device_id}A{head_number}sn\r"
-        self.serial.write(cmd.encode())
-        return self.serial.readline().decode().strip()
+        return self._request(cmd)
 
     def set_emissivity(self, head_number, emissivity):
         """Set emissivity for a certain head."""
@@ -82,32 +108,41 @@ class PyrometerArrayLumasense:
         cmd = f"{self.device_id}A{head_number}em{emissivity*100:05.1f}\r".replace(
             ".", ""
         )
-        self.serial.write(cmd.encode())
-        self._get_ok()
+        self._get_ok(cmd)
 
     def set_t90(self, head_number, t90):
         """Set t90 for a certain head."""
         logger.info(f"{self.name} - setting t90 {t90} for heat {head_number}")
         cmd = f"{self.device_id}A{head_number}ez{self.t90_dict[t90]}\r"
-        self.serial.write(cmd.encode())
-        self._get_ok()
+        self._get_ok(cmd)
 
     def read_sensor(self, head_number):
         """Read temperature of a certain head."""
         cmd = f"{self.device_id}A{head_number}ms\r"
-        self.serial.write(cmd.encode())
-        return self._get_float()
+        return self._to_float(self._request(cmd))
 
     def sample(self):
-        """Read temperature form all heads.
+        """Read temperature form all heads. On a serial bus, the
+        requests of all heads are submitted at once.
 
         Returns:
             dict: {head name: temperature}.
         """
+        if self.bus is not None:
+            responses = {
+                sensor: self.bus.submit(
+                    f"{self.device_id}A{self.head_numbering[sensor]}ms\r".encode()
+                )
+                for sensor in self.head_numbering
+            }
         sampling = {}
         for sensor in self.head_numbering:
             try:
-                sampling.update({sensor: self.read_sensor(self.head_numbering[sensor])})
+                if self.bus is not None:
+                    val = self._to_float(responses[sensor].result().decode())
+                else:
+                    val = self.read_sensor(self.head_numbering[sensor])
+                sampling.update({sensor: val})
             except Exception as e:
                 logger.exception(
                     f"Could not sample PyrometerArrayLumasense heat '{sensor}'."
@@ -131,11 +166,15 @@ class PyrometerArrayLumasense:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        header = "time_abs,time_rel,"
-        units = "# datetime,s,"
+        self.storage = None  # binary storage backend, set by acquisition
+        header = "time_abs,time_rel,seq,"
+        units = "# datetime,s,-,"
         for sensor in self.meas_data:
             header += f"{sensor},"
             units += "DEG C,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
         header += "\n"
         units += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
@@ -149,8 +188,7 @@ class PyrometerArrayLumasense:
         Args:
             directory (str, optional): Output directory. Defaults to "./".
         """
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -196,25 +234,30 @@ class PyrometerArrayLumasense:
         with open(f"{directory}/{self.name}.archive.yaml", "w", encoding="utf-8") as f:
             yaml.safe_dump(nomad_dict, f, sort_keys=False)
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): measurement data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},"
         for sensor in sampling:
             self.meas_data[sensor].append(sampling[sensor])
+        if self.storage is not None:
+            self.storage.append(tick, list(sampling.values()), timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},"
+        for sensor in sampling:
             line += f"{sampling[sensor]},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
         line += "\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        write(self.filename, line)
@@ -3,10 +3,12 @@ import datetime
 import logging
 import numpy as np
 import minimalmodbus
-from serial import Serial, SerialException
-import serial
+from serial import SerialException
 import yaml
 
+from .serial_bus import SerialBus
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,13 +44,10 @@ class PyrometerDias:
             self.meas_data = []
             
             try:
-                self.instrument = minimalmodbus.Instrument(self.config['serial-interface']['port'], 1)
-                parity = {'E': serial.PARITY_EVEN, 'N': serial.PARITY_NONE}
-                self.instrument.serial.parity   = parity[self.config['serial-interface']['parity']]
-                self.instrument.serial.baudrate = self.config['serial-interface']['baudrate']
-                self.instrument.serial.bytesize = self.config['serial-interface']['bytesize']
-                self.instrument.serial.stopbits = self.config['serial-interface']['stopbits']
-                self.instrument.serial.timeout  = self.config['serial-interface']['timeout']
+                # the port may be shared with other devices on the RS485 line,
+                # all modbus requests are executed by the bus thread
+                self.bus = SerialBus.get(self.config['serial-interface'])
+                self.instrument = minimalmodbus.Instrument(self.bus.serial, 1)
 
                 self.write_e(self.emissivity)
                 self.write_t(self.transmissivity)
@@ -59,12 +58,25 @@ class PyrometerDias:
                 
 
 
+    def reconnect(self):
+        """Connect to the serial bus (or reopen its port) and write
+        emissivity and transmissivity again. This is called by the
+        circuit breaker if the device failed."""
+        if not hasattr(self, "bus"):
+            self.bus = SerialBus.get(self.config['serial-interface'])
+        else:
+            self.bus.reopen()
+        self.instrument = minimalmodbus.Instrument(self.bus.serial, 1)
+        self.serial = self.bus.serial
+        self.bus.call(self.instrument.write_register, 258, self.emissivity*100, 1).result()
+        self.bus.call(self.instrument.write_register, 261, self.transmissivity*100, 1).result()
+
     def write_e(self, e):
         #print('Sende den Emissionsgrad an das Pyrometer')
         try:
             if e*100 > 100 or e*100 < 1:
                 logger.error(f"{self.name}: new emiemission value out of bound.")
-            self.instrument.write_register(258, e*100, 1)
+            self.bus.call(self.instrument.write_register, 258, e*100, 1).result()
         except SerialException as e:
             logger.exception(f"{self.name}: changing of emission not possible.")
 
@@ -73,24 +85,24 @@ class PyrometerDias:
         try:
             if t*100 > 100 or t*100 < 50:
                 logger.error(f"{self.name}: new transmisson value out of bound.")
-            self.instrument.write_register(261, t*100, 1)
+            self.bus.call(self.instrument.write_register, 261, t*100, 1).result()
         except SerialException as e:
             logger.exception(f"{self.name}: changing of transmission not possible.")
             
 
     def read_e(self):
         #print('Hole den Emissionsgrad vom Pyrometer')
-        e = self.instrument.read_register(258, 3)
+        e = self.bus.call(self.instrument.read_register, 258, 3).result()
         return e
 
     def read_t(self):
         #print('Hole den Transmissionsgrad vom Pyrometer')
-        t = self.instrument.read_register(261, 1)
+        t = self.bus.call(self.instrument.read_register, 261, 1).result()
         return t
 
     def read_T(self):
         #print('Hole die Temperatur vom Pyrometer')
-        MessT = self.instrument.read_register(257, 0)
+        MessT = self.bus.call(self.instrument.read_register, 257, 0).result()
         T = (MessT - 4370)/16
         return T
     
@@ -127,29 +139,40 @@ class PyrometerDias:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,DEG C,\n"
-        header = "time_abs,time_rel,Temperature,\n"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,DEG C,"
+        header = "time_abs,time_rel,seq,Temperature,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
+        units += "\n"
+        header += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
             f.write(units)
             f.write(header)
         #self.write_nomad_file(directory)
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (float): temperature, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
         self.meas_data.append(sampling)
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{sampling},\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        if self.storage is not None:
+            self.storage.append(tick, [sampling], timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{sampling},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
+        line += "\n"
+        write(self.filename, line)
@@ -2,9 +2,13 @@ from copy import deepcopy
 import datetime
 import logging
 import numpy as np
-from serial import Serial, SerialException
+from serial import SerialException
 import yaml
 
+from .serial_bus import SerialBus
+from ..archive import load_template
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,7 +18,7 @@ class SerialMock:
     def write(self, _):
         pass
 
-    def readline(self):
+    def read_until(self, _):
         return "".encode()
 
 
@@ -40,9 +44,12 @@ class PyrometerLumasense:
             self.meas_data = []
             
             try:
-                self.serial = Serial(**config["serial-interface"])
+                # the port may be shared with other devices on the RS485 line
+                self.bus = SerialBus.get(config["serial-interface"])
+                self.serial = self.bus.serial
             except SerialException as e:
                 logger.exception(f"Connection to {self.name} not possible.")
+                self.bus = None
                 self.serial = SerialMock()
             if type(self.serial) != SerialMock:
                 self.set_emissivity(config["emissivity"])
@@ -60,21 +67,40 @@ class PyrometerLumasense:
                 logger.info(f"{self.name} connected to VIFCON")
         """
 
-    def _get_ok(self):
-        """Check if command was accepted."""
-        assert self.serial.readline().decode().strip() == "ok"
+    def reconnect(self):
+        """Connect to the serial bus (or reopen its port) and configure
+        the device again. This is called by the circuit breaker if the
+        device failed."""
+        if self.bus is None:
+            self.bus = SerialBus.get(self.config["serial-interface"])
+        else:
+            self.bus.reopen()
+        self.serial = self.bus.serial
+        self.set_emissivity(self.config["emissivity"])
+        self.set_transmissivity(self.config["transmissivity"])
+        self.set_t90(self.config["t90"])
+
+    def _request(self, cmd):
+        """Send command and read the response (terminated by \\r)."""
+        if self.bus is None:
+            self.serial.write(cmd.encode())
+            return self.serial.read_until(b"\r").decode().strip()
+        return self.bus.request(cmd.encode()).decode().strip()
 
-    def _get_float(self):
-        """Read floatingpoint value."""
-        string_val = self.serial.readline().decode().strip()
+    def _get_ok(self, cmd):
+        """Send command and check if it was accepted."""
+        assert self._request(cmd) == "ok"
+
+    def _get_float(self, cmd):
+        """Send command and read floatingpoint value."""
+        string_val = self._request(cmd)
         return float(f"{string_val[:-1]}.{string_val[-1:]}")
 
     @property
     def focus(self):
         """Get focuspoint."""
         cmd = f"{self.device_id}df\r"
-        self.serial.write(cmd.encode())
-        return self.serial.readline().decode().strip()
+        return self._request(cmd)
 
     @property
     def intrument_id(self):
@@ -82,8 +108,7 @@ class PyrometerLumasense:
         if type(self.serial) == SerialMock:
             return -1
         cmd = f"{self.device_id}na\r"
-        self.serial.write(cmd.encode())
-        return self.serial.readline().decode().strip()
+        return self._request(cmd)
 
     @property
     def emissivity(self):
@@ -91,8 +116,7 @@ class PyrometerLumasense:
         if type(self.serial) == SerialMock:
             return -1
         cmd = f"{self.device_id}em\r"
-        self.serial.write(cmd.encode())
-        return self._get_float()
+        return self._get_float(cmd)
 
     @property
     def transmissivity(self):
@@ -100,8 +124,7 @@ class PyrometerLumasense:
         if type(self.serial) == SerialMock:
             return -1
         cmd = f"{self.device_id}et\r"
-        self.serial.write(cmd.encode())
-        return self._get_float()
+        return self._get_float(cmd)
 
     @property
     def t90(self):
@@ -109,8 +132,7 @@ class PyrometerLumasense:
         if type(self.serial) == SerialMock:
             return -1
         cmd = f"{self.device_id}ez\r"
-        self.serial.write(cmd.encode())
-        idx = int(self.serial.readline().decode().strip())
+        idx = int(self._request(cmd))
         t90_dict_inverted = {v: k for k, v in self.t90_dict.items()}
         return t90_dict_inverted[idx]
 
@@ -118,24 +140,21 @@ class PyrometerLumasense:
         """Set emissivity and check if it was accepted."""
         logger.info(f"{self.name} - setting emissivity {emissivity}")
         cmd = f"{self.device_id}em{emissivity*100:05.1f}\r".replace(".", "")
-        self.serial.write(cmd.encode())
-        self._get_ok()
+        self._get_ok(cmd)
         assert self.emissivity == emissivity * 100
 
     def set_transmissivity(self, transmissivity):
         """Set transmissivity and check if it was accepted."""
         logger.info(f"{self.name} - setting transmissivity {transmissivity}")
         cmd = f"{self.device_id}et{transmissivity*100:05.1f}\r".replace(".", "")
-        self.serial.write(cmd.encode())
-        self._get_ok()
+        self._get_ok(cmd)
         assert self.transmissivity == transmissivity * 100
 
     def set_t90(self, t90):
         """Set t90 and check if it was accepted."""
         logger.info(f"{self.name} - setting t90 {t90}")
         cmd = f"{self.device_id}ez{self.t90_dict[t90]}\r"
-        self.serial.write(cmd.encode())
-        self._get_ok()
+        self._get_ok(cmd)
         assert self.t90 == t90
 
     def sample(self):
@@ -147,8 +166,7 @@ class PyrometerLumasense:
         
         try:
             cmd = f"{self.device_id}ms\r"
-            self.serial.write(cmd.encode())
-            val = self._get_float()
+            val = self._get_float(cmd)
         except Exception as e:
             logger.exception(f"Could not sample PyrometerLumasense.")
             val = np.nan
@@ -169,8 +187,14 @@ class PyrometerLumasense:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,DEG C,\n"
-        header = "time_abs,time_rel,Temperature,\n"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,DEG C,"
+        header = "time_abs,time_rel,seq,Temperature,"
+        if self.config.get("timing-columns", False):
+            units += "ns,ns,"
+            header += "time_request,time_response,"
+        units += "\n"
+        header += "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
             f.write(units)
             f.write(header)
@@ -182,8 +206,7 @@ class PyrometerLumasense:
         Args:
             directory (str, optional): Output directory. Defaults to "./".
         """
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -228,22 +251,27 @@ class PyrometerLumasense:
         with open(f"{directory}/{self.name}.archive.yaml", "w", encoding="utf-8") as f:
             yaml.safe_dump(nomad_dict, f, sort_keys=False)
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (float): temperature, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
         self.meas_data.append(sampling)
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{sampling},\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        if self.storage is not None:
+            self.storage.append(tick, [sampling], timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{sampling},"
+        if timing is not None:
+            line += f"{timing['request']},{timing['response']},"
+        line += "\n"
+        write(self.filename, line)
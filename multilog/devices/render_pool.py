@@ -0,0 +1,377 @@
+"""This module is used to write the images of the cameras in a pool of
+long-lived workers, so that encoding doesn't delay the sampling. The
+previews of the IR camera are rendered in worker processes; the fast
+path colors the frame with a precomputed colormap, adds a colorbar
+strip with minimum and maximum and encodes the PNG directly with NumPy
+and zlib, without matplotlib."""
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# 3x5 pixel font for the colorbar labels
+FONT = {
+    "0": "111101101101111",
+    "1": "010110010010111",
+    "2": "111001111100111",
+    "3": "111001111001111",
+    "4": "101101111001001",
+    "5": "111100111001111",
+    "6": "111100111101111",
+    "7": "111001001001001",
+    "8": "111101111101111",
+    "9": "111101111001111",
+    ".": "000000000000010",
+    "-": "000000111000000",
+    " ": "000000000000000",
+}
+
+
+def colormap_lut(name="turbo"):
+    """Get a lookup table of a matplotlib colormap. It's computed once
+    in the main process and passed to the workers.
+
+    Args:
+        name (str, optional): colormap name. Defaults to "turbo".
+
+    Returns:
+        numpy.array: (256, 3) uint8 RGB values.
+    """
+    from matplotlib import colormaps
+
+    return (colormaps[name](np.linspace(0, 1, 256))[:, :3] * 255).round().astype(np.uint8)
+
+
+def draw_text(image, text, x, y, scale=2):
+    """Draw text in black into an RGB image.
+
+    Args:
+        image (numpy.array): (h, w, 3) uint8 image, modified in place.
+        text (str): digits, ".", "-" and " ".
+        x (int): left position.
+        y (int): top position.
+        scale (int, optional): pixel size of the font. Defaults to 2.
+    """
+    for char in text:
+        glyph = np.array([int(bit) for bit in FONT.get(char, FONT[" "])], bool)
+        glyph = glyph.reshape(5, 3).repeat(scale, 0).repeat(scale, 1)
+        region = image[y : y + glyph.shape[0], x : x + glyph.shape[1]]
+        region[glyph[: region.shape[0], : region.shape[1]]] = 0
+        x += 4 * scale
+
+
+def render(frame, lut, vmin=None, vmax=None):
+    """Color a frame and add a colorbar strip.
+
+    Args:
+        frame (numpy.array): 2D data, e.g. temperature distribution.
+        lut (numpy.array): (256, 3) uint8 colormap.
+        vmin (float, optional): lower limit. Defaults to frame minimum.
+        vmax (float, optional): upper limit. Defaults to frame maximum.
+
+    Returns:
+        numpy.array: (h, w, 3) uint8 RGB image.
+    """
+    if vmin is None:
+        vmin = float(np.nanmin(frame))
+    if vmax is None:
+        vmax = float(np.nanmax(frame))
+    span = vmax - vmin if vmax > vmin else 1
+    index = np.clip((frame - vmin) * (255 / span), 0, 255)
+    index = np.nan_to_num(index).astype(np.uint8)
+    h, w = frame.shape
+    strip = max(w // 20, 8)
+    labels = 4 * 2 * 8  # up to 8 characters
+    image = np.full((h, w + strip * 2 + labels, 3), 255, np.uint8)
+    image[:, :w] = lut[index]
+    colorbar = np.linspace(255, 0, h).astype(np.uint8)
+    image[:, w + strip // 2 : w + strip // 2 + strip] = lut[colorbar][:, None, :]
+    draw_text(image, f"{vmax:.1f}", w + strip * 2, 2)
+    draw_text(image, f"{vmin:.1f}", w + strip * 2, h - 12)
+    return image
+
+
+def encode_png(image, compression=1):
+    """Encode an RGB image as PNG.
+
+    Args:
+        image (numpy.array): (h, w, 3) uint8 image.
+        compression (int, optional): zlib level. Defaults to 1.
+
+    Returns:
+        bytes: PNG file content.
+    """
+
+    def chunk(kind, data):
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    h, w, _ = image.shape
+    raw = np.zeros((h, w * 3 + 1), np.uint8)  # filter type 0 for each row
+    raw[:, 1:] = image.reshape(h, w * 3)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), compression))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_png(frame, lut, compression=1):
+    """Render a frame as PNG (fast path).
+
+    Args:
+        frame (numpy.array): 2D data.
+        lut (numpy.array): (256, 3) uint8 colormap.
+        compression (int, optional): zlib level. Defaults to 1.
+
+    Returns:
+        bytes: PNG file content.
+    """
+    return encode_png(render(frame, lut), compression)
+
+
+def render_to_file(frame, filename, lut, compression=1):
+    """Render a frame and write the PNG file (fast path).
+
+    Args:
+        frame (numpy.array): 2D data.
+        filename (str): file path.
+        lut (numpy.array): (256, 3) uint8 colormap.
+        compression (int, optional): zlib level. Defaults to 1.
+    """
+    with open(filename, "wb") as f:
+        f.write(render_png(frame, lut, compression))
+
+
+def warm_up():
+    """Called once by each worker after the start."""
+    return None
+
+
+def call_timed(function, *args):
+    """Call a function in a worker.
+
+    Returns:
+        tuple: (time it took in s, result of the function)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+class ImagePool:
+    """Pool of long-lived workers (threads or processes) writing the
+    images of a camera, so that encoding doesn't delay the sampling. At
+    most max_pending frames are waiting or being processed; if the pool
+    is full, new frames are dropped (policy "drop") or the caller waits
+    for a free slot (policy "wait"). The callbacks are called in the
+    order the frames were submitted, although the workers may finish in
+    a different order. Processing time and queue depth are logged at
+    close()."""
+
+    def __init__(
+        self, name, workers=1, max_pending=4, policy="drop", processes=False
+    ):
+        """Start the workers.
+
+        Args:
+            name (str): device name (for logging).
+            workers (int, optional): number of workers. Defaults to 1.
+            max_pending (int, optional): maximum number of frames
+                waiting or being processed. Defaults to 4.
+            policy (str, optional): "drop" or "wait". Defaults to "drop".
+            processes (bool, optional): use processes instead of threads
+                (the frames are copied to the worker). Defaults to False.
+        """
+        if policy not in ["drop", "wait"]:
+            raise ValueError(f"Unknown policy '{policy}'. Use 'drop' or 'wait'.")
+        self.name = name
+        self.policy = policy
+        self.max_pending = max_pending
+        self.slots = threading.BoundedSemaphore(max_pending)
+        if processes:
+            self.executor = ProcessPoolExecutor(
+                workers, multiprocessing.get_context("spawn")
+            )
+            # start the workers and import this module before the first frame
+            wait([self.executor.submit(warm_up) for _ in range(workers)], 30)
+        else:
+            self.executor = ThreadPoolExecutor(workers, f"{name} ImagePool")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.depth_sum = 0
+        self.depth_max = 0
+        self.submitted = 0
+        self.done = 0
+        self.dropped = 0
+        self.failed = 0
+        self.time_sum = 0
+        self.time_max = 0
+        self.order_lock = threading.Lock()  # for the ordered callbacks
+        self.submit_index = 0  # index of the next submitted frame
+        self.callback_index = 0  # index of the next callback
+        self.finished = {}  # index: (callback, result)
+
+    def submit(self, function, *args, callback=None):
+        """Queue a frame.
+
+        Args:
+            function (func): function processing the frame, it must be
+                picklable for processes.
+            args: arguments of the function, e.g., frame and filename.
+            callback (func, optional): called with the result of the
+                function once it and the frames submitted before are
+                finished (in a thread of the pool, not for dropped or
+                failed frames). Defaults to None.
+
+        Returns:
+            bool: False if the frame was dropped.
+        """
+        if not self.slots.acquire(blocking=self.policy == "wait"):
+            with self.lock:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    logger.warning(
+                        f"{self.name}: image writing falls behind, {self.dropped} frames dropped"
+                    )
+            return False
+        with self.lock:
+            self.depth_sum += self.pending
+            self.depth_max = max(self.depth_max, self.pending)
+            self.pending += 1
+            self.submitted += 1
+        index = self._reserve()
+        try:
+            future = self.executor.submit(call_timed, function, *args)
+        except Exception:
+            self._finish(index, None, None)
+            self._release()
+            raise
+        future.add_done_callback(lambda future: self._done(future, index, callback))
+        return True
+
+    def call_in_order(self, callback, result=None):
+        """Call a function once the callbacks of all frames submitted
+        before are done, e.g., to write the entry of a dropped frame.
+
+        Args:
+            callback (func): function called with result.
+            result (optional): argument of the callback. Defaults to
+                None.
+        """
+        self._finish(self._reserve(), callback, result)
+
+    def _reserve(self):
+        """Get the index of a new callback."""
+        with self.order_lock:
+            self.submit_index += 1
+            return self.submit_index - 1
+
+    def _finish(self, index, callback, result):
+        """Call the callbacks that are due in order of their index."""
+        with self.order_lock:
+            self.finished.update({index: (callback, result)})
+            while self.callback_index in self.finished:
+                callback, result = self.finished.pop(self.callback_index)
+                self.callback_index += 1
+                if callback is None:
+                    continue
+                try:
+                    callback(result)
+                except Exception:
+                    logger.exception(f"{self.name}: error in image callback")
+
+    def _release(self):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def _done(self, future, index, callback=None):
+        """Update statistics, free the slot and pass the result to the
+        callback."""
+        try:
+            duration, result = future.result()
+        except Exception as e:
+            self._finish(index, None, None)
+            with self.lock:
+                self.failed += 1
+            logger.error(f"{self.name}: image writing failed: {e}")
+        else:
+            self._finish(index, callback, result)
+            with self.lock:
+                self.time_sum += duration
+                self.time_max = max(self.time_max, duration)
+                self.done += 1
+        finally:
+            self._release()
+
+    def close(self):
+        """Process the pending frames and stop the workers."""
+        self.executor.shutdown(wait=True)
+        mean = self.time_sum / self.done * 1000 if self.done else 0
+        depth = self.depth_sum / self.submitted if self.submitted else 0
+        logger.info(
+            f"{self.name}: {self.done} images written (mean {mean:.1f} ms, max {self.time_max * 1000:.1f} ms), "
+            f"queue depth mean {depth:.1f} max {self.depth_max} of {self.max_pending}, "
+            f"{self.dropped} dropped, {self.failed} failed"
+        )
+
+
+class RenderPool(ImagePool):
+    """Pool of long-lived worker processes rendering the previews of a
+    camera, with the fast path (render_to_file) by default."""
+
+    def __init__(self, name, workers=1, max_pending=4, policy="drop", compression=1):
+        """Start the worker processes.
+
+        Args:
+            name (str): device name (for logging).
+            workers (int, optional): number of processes. Defaults to 1.
+            max_pending (int, optional): maximum number of frames
+                waiting or being rendered. Defaults to 4.
+            policy (str, optional): "drop" or "wait". Defaults to "drop".
+            compression (int, optional): zlib level of the PNG files.
+                Defaults to 1.
+        """
+        super().__init__(name, workers, max_pending, policy, processes=True)
+        self.compression = compression
+        self.lut = colormap_lut("turbo")
+
+    def submit(self, frame, filename, function=None, callback=None):
+        """Queue a frame for rendering.
+
+        Args:
+            frame (numpy.array): 2D data.
+            filename (str): PNG file path, None to get the PNG data in
+                the callback.
+            function (func, optional): picklable function(frame,
+                filename) used instead of the fast path, e.g. a
+                matplotlib plot; it must return the PNG data if filename
+                is None. Defaults to None.
+            callback (func, optional): called with the result once the
+                frame is rendered. Defaults to None.
+
+        Returns:
+            bool: False if the frame was dropped.
+        """
+        if function is not None:
+            return super().submit(function, frame, filename, callback=callback)
+        if filename is None:
+            return super().submit(
+                render_png, frame, self.lut, self.compression, callback=callback
+            )
+        return super().submit(
+            render_to_file, frame, filename, self.lut, self.compression, callback=callback
+        )
@@ -0,0 +1,147 @@
+"""This module is used to share a serial port between several devices,
+e.g., multiple pyrometers on one RS485 line distinguished by their
+device-id. The port is opened once and all transactions are executed
+one after another by a thread owning the port, so that requests and
+responses of different devices don't interleave."""
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+from serial import Serial
+
+
+logger = logging.getLogger(__name__)
+
+
+class SerialBus(threading.Thread):
+    """Owner of a serial port shared by several devices. Transactions
+    are queued by the devices and executed in the bus thread; the next
+    one is started as soon as the previous response was received."""
+
+    _buses = {}  # port: SerialBus
+    _buses_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, config):
+        """Get the bus of a serial port, it's created if the port is not
+        open yet. Raises SerialException if the port can't be opened.
+
+        Args:
+            config (dict): configuration for pyserial's Serial class
+                (serial-interface section in config.yml).
+
+        Returns:
+            SerialBus
+        """
+        with cls._buses_lock:
+            port = config["port"]
+            if port not in cls._buses:
+                cls._buses.update({port: cls(config)})
+            elif cls._buses[port].config != config:
+                logger.warning(
+                    f"Different serial-interface configurations for {port}, using {cls._buses[port].config}."
+                )
+            return cls._buses[port]
+
+    def __init__(self, config):
+        """Open the serial port and start the bus thread.
+
+        Args:
+            config (dict): configuration for pyserial's Serial class.
+        """
+        super().__init__(name=f"SerialBus {config['port']}", daemon=True)
+        self.config = config
+        self.serial = Serial(**config)
+        self.lock = threading.Lock()  # held while the port is accessed
+        self.transactions = queue.Queue()
+        self.start()
+        logger.info(f"Opened serial bus {config['port']}")
+
+    def run(self):
+        """Execute the queued transactions."""
+        while True:
+            function, future = self.transactions.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function())
+            except Exception as e:
+                future.set_exception(e)
+
+    def call(self, function, *args, **kwargs):
+        """Queue a function that accesses the serial port, e.g., a
+        request of a Modbus library working on self.serial.
+
+        Args:
+            function (func): function executed in the bus thread.
+            args, kwargs: arguments of the function.
+
+        Returns:
+            concurrent.futures.Future: result of the function.
+        """
+        future = Future()
+        self.transactions.put((lambda: function(*args, **kwargs), future))
+        return future
+
+    def reopen(self):
+        """Close and reopen the serial port, e.g., after the USB-serial
+        adapter was disconnected. It's executed in the bus thread after
+        the queued transactions. Raises SerialException if the port
+        can't be opened.
+
+        Returns:
+            Serial: the reopened port.
+        """
+        return self.call(self._reopen).result()
+
+    def _reopen(self):
+        """Replace the serial port by a new one (in the bus thread)."""
+        with self.lock:
+            try:
+                self.serial.close()
+            except Exception as e:
+                logger.warning(f"Could not close serial bus {self.config['port']}: {e}")
+            self.serial = Serial(**self.config)
+        logger.info(f"Reopened serial bus {self.config['port']}")
+        return self.serial
+
+    def submit(self, message, terminator=b"\r"):
+        """Queue a request. Several requests can be submitted at once,
+        they are sent back-to-back without waiting for the caller.
+
+        Args:
+            message (bytes): request.
+            terminator (bytes, optional): end of the response. Defaults
+                to b"\\r".
+
+        Returns:
+            concurrent.futures.Future: response without terminator.
+        """
+        return self.call(self._transaction, message, terminator)
+
+    def request(self, message, terminator=b"\r"):
+        """Send a request and wait for the response.
+
+        Args:
+            message (bytes): request.
+            terminator (bytes, optional): end of the response. Defaults
+                to b"\\r".
+
+        Returns:
+            bytes: response without terminator.
+        """
+        return self.submit(message, terminator).result()
+
+    def _transaction(self, message, terminator):
+        """Write a request and read the response up to the terminator.
+        Late bytes of previous transactions that timed out are
+        discarded before."""
+        with self.lock:
+            self.serial.reset_input_buffer()
+            self.serial.write(message)
+            response = self.serial.read_until(terminator)
+        if not response.endswith(terminator):
+            raise TimeoutError(
+                f"No response to {message} on {self.config['port']} (received {response})."
+            )
+        return response[: -len(terminator)]
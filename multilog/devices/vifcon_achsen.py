@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import datetime
 import socket
@@ -7,6 +8,10 @@ from copy import deepcopy
 import time
 import numpy as np
 
+from ..aio import request
+from ..archive import load_template
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 class Vifcon_achsen:
@@ -79,6 +84,7 @@ class Vifcon_achsen:
                         time.sleep(sleepTime)
         except Exception as e:
             logger.exception(f"{self.name}: has no Axis definded.")
+        self.asynchronous = True  # supports asyncio I/O engine
             
                     
         # Build measData
@@ -94,32 +100,59 @@ class Vifcon_achsen:
 
     def sample(self):
         # send trigger
+        received = []
+        for i, axis in enumerate(self.hub + self.rot + self.pi):
+            try:
+                self.connectionList[i].send(bytes(f"{axis}", 'UTF-8'))
+                received.append(self.connectionList[i].recv(1024))
+            except Exception as e:
+                received.append(e)
+        return self.convert_sampling(received)
+
+    async def sample_async(self, timeout):
+        """Asynchronous version of sample() used by the asyncio I/O
+        engine, all axes are requested concurrently.
+
+        Args:
+            timeout (float): [s] timeout for the responses.
+        """
+
+        async def request_axis(i, axis):
+            return await request(self.connectionList[i], bytes(f"{axis}", 'UTF-8'), 1024, timeout)
+
+        received = await asyncio.gather(
+            *[request_axis(i, axis) for i, axis in enumerate(self.hub + self.rot + self.pi)],
+            return_exceptions=True,
+        )
+        return self.convert_sampling(received)
+
+    def convert_sampling(self, received):
+        """Decode the JSON responses of VIFCON.
+
+        Args:
+            received (list): response (bytes) or exception raised during
+                the request for each axis (in order hub, rot, pi).
+        """
         i = 0
         jsonList = []
         
         for axis in self.hub:
             try:
-                self.connectionList[i].send(bytes(f"{axis}", 'UTF-8'))
-                received = self.connectionList[i].recv(1024)
-                jsonList.append(json.loads(received.decode("utf-8")))
+                jsonList.append(self.decode(received[i]))
             except Exception as e:
                 logger.exception(f"Could not sample {self.name}.")
                 jsonList.append({"IWs": np.nan, "IWv": np.nan, "SWv": np.nan, "SWs": np.nan, "oGs": np.nan, "uGs": np.nan})
             i=i+1
         for axis in self.rot:
             try:
-                self.connectionList[i].send(bytes(f"{axis}", 'UTF-8'))
-                received = self.connectionList[i].recv(1024)
-                jsonList.append(json.loads(received.decode("utf-8")))
+                jsonList.append(self.decode(received[i]))
             except Exception as e:
                 logger.exception(f"Could not sample {self.name}.")
                 jsonList.append({"IWv": np.nan, "IWw": np.nan, "SWv": np.nan})
             i=i+1
         for axis in self.pi:
             try:
-                self.connectionList[i].send(bytes(f"{axis}", 'UTF-8'))
-                received = self.connectionList[i].recv(1024)
-                jsonList.append(json.loads(received.decode("utf-8")))
+                jsonList.append(self.decode(received[i]))
             except Exception as e:
                 logger.exception(f"Could not sample {self.name}.")
                 jsonList.append({"IWs": np.nan, "IWv": np.nan})
@@ -142,58 +175,57 @@ class Vifcon_achsen:
             i = i + 1
         return data
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def decode(self, received):
+        """Decode the JSON response of one axis.
+
+        Args:
+            received (bytes/Exception): response or exception raised
+                during the request.
+        """
+        if isinstance(received, Exception):
+            raise received
+        return json.loads(received.decode("utf-8"))
+
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
 
-        line = f"""{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel}"""
+        values = []
         for axis in self.hub:
-            self.meas_data[f"{axis}"]["IWs"].append(sampling[f"{axis}"]["IWs"])
-            self.meas_data[f"{axis}"]["SWs"].append(sampling[f"{axis}"]["SWs"])
-            self.meas_data[f"{axis}"]["oGs"].append(sampling[f"{axis}"]["oGs"])
-            self.meas_data[f"{axis}"]["uGs"].append(sampling[f"{axis}"]["uGs"])
-            self.meas_data[f"{axis}"]["IWv"].append(sampling[f"{axis}"]["IWv"])
-            self.meas_data[f"{axis}"]["SWv"].append(sampling[f"{axis}"]["SWv"])
-            
-            line = line + ',' + str(sampling[f"{axis}"]["IWs"])
-            line = line + ',' + str(sampling[f"{axis}"]["SWs"])
-            line = line + ',' + str(sampling[f"{axis}"]["oGs"])
-            line = line + ',' + str(sampling[f"{axis}"]["uGs"])
-            line = line + ',' + str(sampling[f"{axis}"]["IWv"])
-            line = line + ',' + str(sampling[f"{axis}"]["SWv"])
-            
+            for key in ["IWs", "SWs", "oGs", "uGs", "IWv", "SWv"]:
+                self.meas_data[f"{axis}"][key].append(sampling[f"{axis}"][key])
+                values.append(sampling[f"{axis}"][key])
         for axis in self.rot:
-            self.meas_data[f"{axis}"]["IWw"].append(sampling[f"{axis}"]["IWw"])
-            self.meas_data[f"{axis}"]["IWv"].append(sampling[f"{axis}"]["IWv"])
-            self.meas_data[f"{axis}"]["SWv"].append(sampling[f"{axis}"]["SWv"])
-
-            line = line + ',' + str(sampling[f"{axis}"]["IWw"])
-            line = line + ',' + str(sampling[f"{axis}"]["IWv"])
-            line = line + ',' + str(sampling[f"{axis}"]["SWv"])
-        
+            for key in ["IWw", "IWv", "SWv"]:
+                self.meas_data[f"{axis}"][key].append(sampling[f"{axis}"][key])
+                values.append(sampling[f"{axis}"][key])
         for axis in self.pi:
-            self.meas_data[f"{axis}"]["IWs"].append(sampling[f"{axis}"]["IWs"])
-            self.meas_data[f"{axis}"]["IWv"].append(sampling[f"{axis}"]["IWv"])
-
-            line = line + ',' + str(sampling[f"{axis}"]["IWs"])
-            line = line + ',' + str(sampling[f"{axis}"]["IWv"])
-
+            for key in ["IWs", "IWv"]:
+                self.meas_data[f"{axis}"][key].append(sampling[f"{axis}"][key])
+                values.append(sampling[f"{axis}"][key])
+        if self.storage is not None:
+            self.storage.append(tick, values, timing)
+            return
+        line = f"""{tick.timestamp},{tick.time_rel},{tick.seq}"""
+        for value in values:
+            line = line + ',' + str(value)
+        if timing is not None:
+            line = line + f",{timing['request']},{timing['response']}"
         line = line + ("\n")
 
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        write(self.filename, line)
 
     def init_output(self, directory="./"):
         """Initialize the csv output file.
@@ -202,8 +234,9 @@ class Vifcon_achsen:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,mm"
-        header = "time_abs,time_rel"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,mm"
+        header = "time_abs,time_rel,seq"
 
         for axis in self.hub:
             units = units + ",mm,mm,mm,mm,mm/min,mm/min"
@@ -217,6 +250,9 @@ class Vifcon_achsen:
             units = units + ",mm,mm/min"
             header = header + f",{axis}IWs,{axis}IWv"
             
+        if self.config.get("timing-columns", False):
+            units = units + ",ns,ns"
+            header = header + ",time_request,time_response"
         units  = units  + "\n"
         header = header + "\n"
         
@@ -232,8 +268,7 @@ class Vifcon_achsen:
         # Args:
         #    directory (str, optional): Output directory. Defaults to "./".
 
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -7,6 +7,10 @@ import yaml
 from copy import deepcopy
 import numpy as np
 
+from ..aio import request
+from ..archive import load_template
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 class Vifcon_gase:
@@ -32,16 +36,51 @@ class Vifcon_gase:
             logger.info(f"{self.name} connected to VIFCON")
         except Exception as e:
             logger.exception(f"Connection to {self.name} not possible.")
+        self.asynchronous = True  # supports asyncio I/O engine
 
         self.meas_data = {"MFC24": [], "MFC25": [], "MFC26": [], "MFC27": [], "DM21": [], "PP21": [], "PP22": [], "PP22I": []}
 
+    def reconnect(self):
+        """Reconnect to VIFCON. This is called by the circuit breaker if
+        the device failed."""
+        self.s.close()
+        self.s = socket.create_connection((self.vifconIP, self.vifconPort), 5)
+        self.s.settimeout(None)
+        logger.info(f"{self.name} connected to VIFCON")
+
     def sample(self):
         # send trigger
         try:
             self.s.send(bytes(self.name, 'UTF-8'))
             received = self.s.recv(2048)
-            received = received.decode("utf-8")
-            data = json.loads(received)
+        except Exception as e:
+            received = e
+        return self.convert_sampling(received)
+
+    async def sample_async(self, timeout):
+        """Asynchronous version of sample() used by the asyncio I/O
+        engine.
+
+        Args:
+            timeout (float): [s] timeout for the response.
+        """
+        try:
+            received = await request(self.s, bytes(self.name, 'UTF-8'), 2048, timeout)
+        except Exception as e:
+            received = e
+        return self.convert_sampling(received)
+
+    def convert_sampling(self, received):
+        """Decode the JSON response of VIFCON.
+
+        Args:
+            received (bytes/Exception): response or exception raised
+                during the request.
+        """
+        try:
+            if isinstance(received, Exception):
+                raise received
+            data = json.loads(received.decode("utf-8"))
         except Exception as e:
             logger.exception(f"Could not sample {self.name}.")
             data = {"MFC24": np.nan, "MFC25": np.nan, "MFC26": np.nan, "MFC27": np.nan, "DM21": np.nan, "PP21": np.nan, "PP22": np.nan, "PP22I": np.nan}
@@ -53,20 +92,20 @@ class Vifcon_gase:
 
         return data
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
         # Format pressure data as scientific notation
         dm21Formated = "{:.2E}".format(sampling["DM21"])
@@ -81,9 +120,15 @@ class Vifcon_gase:
         self.meas_data["PP21"].append(pp21Formated)
         self.meas_data["PP22"].append(pp22Formated)
         self.meas_data["PP22I"].append(sampling["PP22I"])
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{sampling['MFC24']},{sampling['MFC25']},{sampling['MFC26']},{sampling['MFC27']},{dm21Formated},{pp21Formated},{pp22Formated},{sampling['PP22I']},\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        if self.storage is not None:
+            values = [sampling[sensor] for sensor in self.meas_data]
+            self.storage.append(tick, values, timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{sampling['MFC24']},{sampling['MFC25']},{sampling['MFC26']},{sampling['MFC27']},{dm21Formated},{pp21Formated},{pp22Formated},{sampling['PP22I']},"
+        if timing is not None:
+            line = line + f"{timing['request']},{timing['response']},"
+        line = line + "\n"
+        write(self.filename, line)
 
     def init_output(self, directory="./"):
         """Initialize the csv output file.
@@ -92,8 +137,14 @@ class Vifcon_gase:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,ml/min,ml/min,ml/min,ml/min,mbar,mbar,mbar,%\n"
-        header = "time_abs,time_rel,MFC24,MFC25,MFC26,MFC27,DM21,PP21,PP22,PP22I\n"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,ml/min,ml/min,ml/min,ml/min,mbar,mbar,mbar,%"
+        header = "time_abs,time_rel,seq,MFC24,MFC25,MFC26,MFC27,DM21,PP21,PP22,PP22I"
+        if self.config.get("timing-columns", False):
+            units = units + ",ns,ns"
+            header = header + ",time_request,time_response"
+        units = units + "\n"
+        header = header + "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
             f.write(units)
             f.write(header)
@@ -106,8 +157,7 @@ class Vifcon_gase:
         # Args:
         #    directory (str, optional): Output directory. Defaults to "./".
 
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -6,6 +6,10 @@ import yaml
 from copy import deepcopy
 import numpy as np
 
+from ..aio import request
+from ..archive import load_template
+from ..writer import write
+
 logger = logging.getLogger(__name__)
 
 class Vifcon_generator:
@@ -31,35 +35,70 @@ class Vifcon_generator:
             logger.info(f"{self.name} connected to VIFCON")
         except Exception as e:
             logger.exception(f"Connection to {self.name} not possible.")
+        self.asynchronous = True  # supports asyncio I/O engine
 
         self.meas_data = {"IWP": [], "IWU": [], "IWI": [], "IWf": [], "SWP": [], "SWU": [], "SWI": []}
 
+    def reconnect(self):
+        """Reconnect to VIFCON. This is called by the circuit breaker if
+        the device failed."""
+        self.s.close()
+        self.s = socket.create_connection((self.vifconIP, self.vifconPort), 5)
+        self.s.settimeout(None)
+        logger.info(f"{self.name} connected to VIFCON")
+
     def sample(self):
         # send trigger
         try:
             self.s.send(bytes(self.name, 'UTF-8'))
             received = self.s.recv(1024)
-            received = received.decode("utf-8")
-            data = json.loads(received)
+        except Exception as e:
+            received = e
+        return self.convert_sampling(received)
+
+    async def sample_async(self, timeout):
+        """Asynchronous version of sample() used by the asyncio I/O
+        engine.
+
+        Args:
+            timeout (float): [s] timeout for the response.
+        """
+        try:
+            received = await request(self.s, bytes(self.name, 'UTF-8'), 1024, timeout)
+        except Exception as e:
+            received = e
+        return self.convert_sampling(received)
+
+    def convert_sampling(self, received):
+        """Decode the JSON response of VIFCON.
+
+        Args:
+            received (bytes/Exception): response or exception raised
+                during the request.
+        """
+        try:
+            if isinstance(received, Exception):
+                raise received
+            data = json.loads(received.decode("utf-8"))
         except Exception as e:
             logger.exception(f"Could not sample {self.name}.")
             data = {"IWP": np.nan, "IWU": np.nan, "IWI": np.nan, "IWf": np.nan, "SWP": np.nan, "SWU": np.nan, "SWI": np.nan}
         return data
 
-    def save_measurement(self, time_abs, time_rel, sampling):
+    def save_measurement(self, tick, sampling, timing=None):
         """Write measurement data to file.
 
         Args:
-            time_abs (datetime): measurement timestamp.
-            time_rel (float): relative time of measurement.
+            tick (Tick): timestamp of the sampling step.
             sampling (dict): sampling data, as returned from sample()
+            timing (dict, optional): [ns] time of request and response
+                relative to the sampling step, written if timing-columns
+                is configured. Defaults to None.
         """
-        timediff = (
-            datetime.datetime.now(datetime.timezone.utc).astimezone() - time_abs
-        ).total_seconds()
+        timediff = tick.age()
         if timediff > 1:
             logger.warning(
-                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {time_abs.isoformat(timespec='milliseconds').replace('T', ' ')} - {time_rel}"
+                f"{self.name} save_measurement: time difference between event and saving of {timediff} seconds for samplint timestep {tick.timestamp} - {tick.time_rel}"
             )
         self.meas_data["IWP"].append(sampling["IWP"])
         self.meas_data["IWU"].append(sampling["IWU"])
@@ -69,9 +108,15 @@ class Vifcon_generator:
         self.meas_data["SWP"].append(sampling["SWP"])
         self.meas_data["SWU"].append(sampling["SWU"])
         self.meas_data["SWI"].append(sampling["SWI"])
-        line = f"{time_abs.isoformat(timespec='milliseconds').replace('T', ' ')},{time_rel},{sampling['IWP']},{sampling['IWU']},{sampling['IWI']},{sampling['IWf']},{sampling['SWP']},{sampling['SWU']},{sampling['SWI']}\n"
-        with open(self.filename, "a", encoding="utf-8") as f:
-            f.write(line)
+        if self.storage is not None:
+            values = [sampling[key] for key in ["IWP", "IWU", "IWI", "IWf", "SWP", "SWU", "SWI"]]
+            self.storage.append(tick, values, timing)
+            return
+        line = f"{tick.timestamp},{tick.time_rel},{tick.seq},{sampling['IWP']},{sampling['IWU']},{sampling['IWI']},{sampling['IWf']},{sampling['SWP']},{sampling['SWU']},{sampling['SWI']}"
+        if timing is not None:
+            line = line + f",{timing['request']},{timing['response']}"
+        line = line + "\n"
+        write(self.filename, line)
 
     def init_output(self, directory="./"):
         """Initialize the csv output file.
@@ -80,8 +125,14 @@ class Vifcon_generator:
             directory (str, optional): Output directory. Defaults to "./".
         """
         self.filename = f"{directory}/{self.name}.csv"
-        units = "# datetime,s,W,V,A,Hz,W,V,A\n"
-        header = "time_abs,time_rel,IWP,IWU,IWI,IWf,SWP,SWU,SWI\n"
+        self.storage = None  # binary storage backend, set by acquisition
+        units = "# datetime,s,-,W,V,A,Hz,W,V,A"
+        header = "time_abs,time_rel,seq,IWP,IWU,IWI,IWf,SWP,SWU,SWI"
+        if self.config.get("timing-columns", False):
+            units = units + ",ns,ns"
+            header = header + ",time_request,time_response"
+        units = units + "\n"
+        header = header + "\n"
         with open(self.filename, "w", encoding="utf-8") as f:
             f.write(units)
             f.write(header)
@@ -94,8 +145,7 @@ class Vifcon_generator:
         # Args:
         #    directory (str, optional): Output directory. Defaults to "./".
 
-        with open("./multilog/nomad/archive_template_sensor.yml") as f:
-            nomad_template = yaml.safe_load(f)
+        nomad_template = load_template("archive_template_sensor.yml")
         definitions = nomad_template.pop("definitions")
         data = nomad_template.pop("data")
         sensor_schema_template = nomad_template.pop("sensor_schema_template")
@@ -0,0 +1,168 @@
+"""This module contains the circuit breaker used to monitor the health of
+the devices. If a device fails repeatedly, it isn't sampled anymore (so
+that the sampler doesn't wait for timeouts on every step) and the
+connection is re-established in the background."""
+import logging
+import math
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_valid(sampling):
+    """Check if a sampling contains at least one value that is not NaN.
+
+    Args:
+        sampling: sampling as returned by the device's sample function.
+
+    Returns:
+        bool
+    """
+    if isinstance(sampling, float):
+        return not math.isnan(sampling)
+    if isinstance(sampling, dict):
+        sampling = list(sampling.values())
+    if isinstance(sampling, (list, tuple)):
+        return len(sampling) == 0 or any(is_valid(value) for value in sampling)
+    return True
+
+
+def nan_like(sampling):
+    """Create a sampling of the same structure with all values NaN. It's
+    saved instead of a real sampling while the breaker is open, like the
+    samplings of a device without connection (SerialMock).
+
+    Args:
+        sampling: sampling as returned by the device's sample function.
+
+    Returns:
+        NaN sampling, None for samplings that can't be replaced (e.g.,
+            images).
+    """
+    if isinstance(sampling, dict):
+        return {key: nan_like(value) for key, value in sampling.items()}
+    if isinstance(sampling, (list, tuple)):
+        return type(sampling)(nan_like(value) for value in sampling)
+    if sampling is None or isinstance(sampling, (int, float, str)):
+        return math.nan
+    return None
+
+
+class CircuitBreaker:
+    """Health state machine of a device:
+    - healthy: the last sampling was successful.
+    - degraded: the last samplings failed, fewer than threshold.
+    - open: threshold consecutive samplings failed, the device isn't
+      sampled. After the reconnect interval, the device's reconnect
+      function (if available) is called in a background thread.
+    - half-open: the next sampling is used as a probe. If it succeeds,
+      the device is healthy again, otherwise the breaker opens again
+      with doubled reconnect interval.
+    """
+
+    HEALTHY = "healthy"
+    DEGRADED = "degraded"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, device, threshold=3, interval=1, max_interval=60):
+        """Create circuit breaker. Devices that fell back to SerialMock
+        during initialization start in state open.
+
+        Args:
+            name (str): device name.
+            device: device object.
+            threshold (int, optional): number of consecutive failed
+                samplings that open the breaker. Defaults to 3.
+            interval (float, optional): [s] initial reconnect interval.
+                Defaults to 1.
+            max_interval (float, optional): [s] maximum reconnect
+                interval. Defaults to 60.
+        """
+        self.name = name
+        self.device = device
+        self.threshold = threshold
+        self.initial_interval = interval
+        self.interval = interval
+        self.max_interval = max_interval
+        self.state = self.HEALTHY
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.timer = None
+        self.stopped = False
+        self.empty = None  # NaN sampling saved while the breaker is open
+        if hasattr(device, "reconnect") and (
+            type(getattr(device, "serial", None)).__name__ == "SerialMock"
+        ):
+            logger.warning(f"{name}: not connected, trying to reconnect in background.")
+            try:  # sampling with SerialMock gives the NaN sampling of the device
+                self.empty = nan_like(device.sample())
+            except Exception as e:
+                logger.warning(f"{name}: could not create NaN sampling.", exc_info=True)
+            with self.lock:
+                self._open()
+
+    def allow(self):
+        """Check if the device may be sampled.
+
+        Returns:
+            bool: False if the breaker is open.
+        """
+        return self.state != self.OPEN
+
+    def success(self):
+        """Record a successful sampling."""
+        with self.lock:
+            if self.state != self.HEALTHY:
+                logger.info(f"{self.name}: {self.state} -> {self.HEALTHY}")
+            self.state = self.HEALTHY
+            self.failures = 0
+            self.interval = self.initial_interval
+
+    def failure(self):
+        """Record a failed sampling."""
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self._open()
+            elif self.state != self.DEGRADED:
+                logger.warning(f"{self.name}: {self.state} -> {self.DEGRADED}")
+                self.state = self.DEGRADED
+
+    def _open(self):
+        """Open the breaker and schedule the reconnect (lock acquired)."""
+        if self.state != self.OPEN:
+            logger.warning(
+                f"{self.name}: {self.state} -> {self.OPEN} after {self.failures} failed samplings, retry in {self.interval} s"
+            )
+        self.state = self.OPEN
+        if self.stopped:
+            return
+        self.timer = threading.Timer(self.interval, self._reconnect)
+        self.timer.daemon = True
+        self.timer.start()
+        self.interval = min(2 * self.interval, self.max_interval)
+
+    def _reconnect(self):
+        """Reconnect the device (in the timer's thread) and let the next
+        sampling probe it."""
+        try:
+            if hasattr(self.device, "reconnect"):
+                logger.info(f"{self.name}: reconnecting")
+                self.device.reconnect()
+        except Exception as e:
+            logger.warning(f"{self.name}: reconnect failed ({e}), retry in {self.interval} s")
+            with self.lock:
+                self._open()
+            return
+        with self.lock:
+            logger.info(f"{self.name}: {self.state} -> {self.HALF_OPEN}")
+            self.state = self.HALF_OPEN
+
+    def stop(self):
+        """Cancel pending reconnects."""
+        with self.lock:
+            self.stopped = True
+            if self.timer is not None:
+                self.timer.cancel()
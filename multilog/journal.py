@@ -0,0 +1,171 @@
+"""This module contains the journal of the writer service. If it's
+enabled (setting journal: 1), each batch of lines is appended to a
+binary journal (journal.bin in the measurement directory) before it is
+written to the output file, and the journal is synced to disk once per
+batch. After a crash or power failure the output files may be truncated
+in the middle of a line; recover() replays the journal to rebuild them.
+Once a batch is written and synced to the output files, the journal is
+truncated (checkpoint()), so it only holds the batch in progress. The
+journal is removed when the recording is stopped normally."""
+import logging
+import os
+import struct
+import zlib
+
+from .archive import export
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MLJ1"
+RECORD = struct.Struct("<BHI")  # kind, file id, length of the payload
+CRC = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+FILE = 1  # payload: size of the file before the first batch + filename
+DATA = 2  # payload: lines appended to the file
+
+
+class Journal:
+    """Binary write-ahead log of the lines written to the output files.
+    It's truncated by checkpoint() after each synced batch, so it only
+    holds the batch in progress. Each record consists of kind, file id,
+    length, payload and CRC32, so that an incomplete record at the end
+    is detected."""
+
+    def __init__(self, filename):
+        """Create the journal file.
+
+        Args:
+            filename (str): file path, usually
+                <measurement directory>/journal.bin.
+        """
+        self.filename = filename
+        self.directory = os.path.dirname(filename)
+        self.file = open(filename, "wb")
+        self.file.write(MAGIC)
+        self.ids = {}  # filename: file id
+        self.records = 0
+        self.syncs = 0
+        self.checkpoints = 0
+
+    def record(self, kind, file_id, payload):
+        """Append a record (buffered until sync() is called).
+
+        Args:
+            kind (int): FILE or DATA.
+            file_id (int): id of the output file.
+            payload (bytes): record data.
+        """
+        header = RECORD.pack(kind, file_id, len(payload))
+        self.file.write(header + payload + CRC.pack(zlib.crc32(header + payload)))
+        self.records += 1
+
+    def append(self, filename, data):
+        """Append a batch of lines of an output file. It has to be
+        called before the lines are written to the file.
+
+        Args:
+            filename (str): file path.
+            data (bytes): lines as written to the file (encoded,
+                compressed).
+        """
+        if filename not in self.ids:
+            self.ids.update({filename: len(self.ids)})
+            size = os.path.getsize(filename) if os.path.exists(filename) else 0
+            name = os.path.relpath(filename, self.directory)
+            self.record(FILE, self.ids[filename], OFFSET.pack(size) + name.encode())
+        self.record(DATA, self.ids[filename], data)
+
+    def sync(self):
+        """Write the records to disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.syncs += 1
+
+    def checkpoint(self):
+        """Discard the records, it has to be called once the batches are
+        written and synced to the output files. The files are recorded
+        again with their current size on the next append()."""
+        self.file.seek(len(MAGIC))
+        self.file.truncate()
+        self.ids.clear()
+        self.checkpoints += 1
+
+    def close(self, remove=True):
+        """Close the journal.
+
+        Args:
+            remove (bool, optional): remove the journal file, the output
+                files are complete. Defaults to True.
+        """
+        self.sync()
+        self.file.close()
+        if remove:
+            os.remove(self.filename)
+        logger.info(
+            f"Journal: {self.records} records written with {self.syncs} syncs, "
+            f"{self.checkpoints} checkpoints"
+        )
+
+
+def read(filename):
+    """Read the records of a journal. Reading stops at the first
+    incomplete or corrupted record.
+
+    Args:
+        filename (str): journal file path.
+
+    Yields:
+        tuple: (kind, file id, payload)
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a multilog journal.")
+        while True:
+            header = f.read(RECORD.size)
+            if not header:
+                return
+            if len(header) < RECORD.size:
+                logger.warning(f"Incomplete record at the end of {filename}.")
+                return
+            kind, file_id, length = RECORD.unpack(header)
+            payload = f.read(length)
+            crc = f.read(CRC.size)
+            if (
+                len(payload) < length
+                or len(crc) < CRC.size
+                or CRC.unpack(crc)[0] != zlib.crc32(header + payload)
+            ):
+                logger.warning(f"Incomplete record at the end of {filename}.")
+                return
+            yield kind, file_id, payload
+
+
+def recover(directory):
+    """Rebuild the output files of a measurement from its journal after
+    a crash. The files are truncated to their size before the first
+    journaled batch and the batches are appended again. Afterwards the
+    image lists of the camera archives are generated.
+
+    Args:
+        directory (str): measurement directory containing journal.bin.
+
+    Returns:
+        list: rebuilt files.
+    """
+    files = {}  # file id: file object
+    try:
+        for kind, file_id, payload in read(f"{directory}/journal.bin"):
+            if kind == FILE:
+                filename = os.path.join(directory, payload[OFFSET.size :].decode())
+                mode = "r+b" if os.path.exists(filename) else "wb"
+                files.update({file_id: open(filename, mode)})
+                files[file_id].seek(OFFSET.unpack_from(payload)[0])
+                files[file_id].truncate()
+            elif kind == DATA:
+                files[file_id].write(payload)
+    finally:
+        for f in files.values():
+            f.close()
+    export(directory)
+    return [f.name for f in files.values()]
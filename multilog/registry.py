@@ -0,0 +1,153 @@
+"""This module contains the registry of the supported devices. The device
+type is defined by a pattern that must be contained in the device's name
+in the config file. The modules of driver and view are given as strings
+and only imported if a device of this type is configured, so that the
+dependencies of unused devices are not loaded."""
+import importlib
+
+
+# name pattern: {"device": driver class, "view": widget class, "camera": bool,
+# "health": bool (monitored by a circuit breaker, default True)}
+DEVICES = {
+    "DAQ-6510": {
+        "device": ".devices.daq6510.Daq6510",
+        "view": ".view.daq6510.Daq6510Widget",
+    },
+    "IFM-flowmeter": {
+        "device": ".devices.ifm_flowmeter.IfmFlowmeter",
+        "view": ".view.ifm_flowmeter.IfmFlowmeterWidget",
+    },
+    "Eurotherm": {
+        "device": ".devices.eurotherm.Eurotherm",
+        "view": ".view.eurotherm.EurothermWidget",
+    },
+    "Optris-IP-640": {
+        "device": ".devices.optris_ip640.OptrisIP640",
+        "view": ".view.optris_ip640.OptrisIP640Widget",
+        "camera": True,
+    },
+    "IGA-6-23": {
+        "device": ".devices.pyrometer_lumasense.PyrometerLumasense",
+        "view": ".view.pyrometer_lumasense.PyrometerLumasenseWidget",
+    },
+    "IGAR-6-adv": {
+        "device": ".devices.pyrometer_lumasense.PyrometerLumasense",
+        "view": ".view.pyrometer_lumasense.PyrometerLumasenseWidget",
+    },
+    "Series-600": {
+        "device": ".devices.pyrometer_array_lumasense.PyrometerArrayLumasense",
+        "view": ".view.pyrometer_array_lumasense.PyrometerArrayLumasenseWidget",
+    },
+    "Basler": {
+        "device": ".devices.basler_camera.BaslerCamera",
+        "view": ".view.basler_camera.BaslerCameraWidget",
+        "camera": True,
+    },
+    "Process-Condition-Logger": {
+        "device": ".devices.process_condition_logger.ProcessConditionLogger",
+        "view": ".view.process_condition_logger.ProcessConditionLoggerWidget",
+        "health": False,  # no connection, user input only
+    },
+    "Vifcon_achsen": {
+        "device": ".devices.vifcon_achsen.Vifcon_achsen",
+        "view": ".view.vifcon_achsen.Vifcon_achsenWidget",
+    },
+    "Vifcon_gase": {
+        "device": ".devices.vifcon_gase.Vifcon_gase",
+        "view": ".view.vifcon_gase.Vifcon_gaseWidget",
+    },
+    "Vifcon_generator": {
+        "device": ".devices.vifcon_generator.Vifcon_generator",
+        "view": ".view.vifcon_generator.Vifcon_generatorWidget",
+    },
+    "Dias": {
+        "device": ".devices.pyrometer_dias.PyrometerDias",
+        "view": ".view.pyrometer_dias.PyrometerDiasWidget",
+    },
+    "Keysight": {
+        "device": ".devices.keysight.Keysight",
+        "view": ".view.keysight.KeysightWidget",
+    },
+    #######################
+    # add new devices here!
+    #######################
+}
+
+
+def get_entry(device_name):
+    """Get the registry entry of a device. The first pattern contained in
+    the device name is used.
+
+    Args:
+        device_name (str): name of the device in the config file.
+
+    Returns:
+        dict: registry entry.
+    """
+    for pattern in DEVICES:
+        if pattern in device_name:
+            return DEVICES[pattern]
+    raise ValueError(f"unknown device {device_name} in config file.")
+
+
+def load(path):
+    """Import a module and get a class of it.
+
+    Args:
+        path (str): module and class name relative to the multilog
+            package, e.g. ".devices.daq6510.Daq6510".
+
+    Returns:
+        class
+    """
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module, __package__), name)
+
+
+def get_device_class(device_name):
+    """Import the driver of a device.
+
+    Args:
+        device_name (str): name of the device in the config file.
+
+    Returns:
+        class: device class, e.g. Daq6510.
+    """
+    return load(get_entry(device_name)["device"])
+
+
+def get_view_class(device_name):
+    """Import the widget of a device.
+
+    Args:
+        device_name (str): name of the device in the config file.
+
+    Returns:
+        class: widget class, e.g. Daq6510Widget.
+    """
+    return load(get_entry(device_name)["view"])
+
+
+def is_monitored(device_name):
+    """Check if the health of a device is monitored by a circuit
+    breaker, i.e., if it's connected to anything.
+
+    Args:
+        device_name (str): name of the device in the config file.
+
+    Returns:
+        bool
+    """
+    return get_entry(device_name).get("health", True)
+
+
+def is_camera(device_name):
+    """Check if a device is a camera (sampled with dt-camera).
+
+    Args:
+        device_name (str): name of the device in the config file.
+
+    Returns:
+        bool
+    """
+    return get_entry(device_name).get("camera", False)
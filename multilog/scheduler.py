@@ -0,0 +1,252 @@
+"""This module contains the scheduler that triggers the sampling steps of
+multilog. It runs in a separate thread and works with absolute deadlines
+on the monotonic clock (perf_counter_ns), so that the sampling grid
+doesn't drift or jitter if the GUI thread is busy."""
+import datetime
+import heapq
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Tick:
+    """Timestamp of a sampling step. The scheduler creates one
+    immutable tick per step of a job; it is shared by all devices
+    sampled in this step, so that the timestamp is formatted only once.
+
+    Attributes:
+        seq (int): sequence number, the tick is the seq-th step of its
+            job (anchor + phase + seq * dt). Skipped steps are counted.
+            Devices with the same time step (and a phase below it) get
+            the same sequence number in the same step, it's the key to
+            join their output files. For different time steps, seq
+            counts different steps; these are aligned by time_rel (as
+            in the combined table).
+        deadline (int): [ns] perf_counter_ns timestamp.
+        epoch_ns (int): [ns] absolute time since epoch.
+        time_abs (datetime): absolute time in local timezone.
+        time_rel (float): [s] time since start of the recording,
+            rounded to ms.
+        timestamp (str): time_abs as written to the output files.
+    """
+
+    __slots__ = ("seq", "deadline", "epoch_ns", "time_abs", "time_rel", "timestamp")
+
+    def __init__(self, seq, deadline, epoch_ns, time_abs, time_rel):
+        """Create tick.
+
+        Args:
+            seq (int): sequence number.
+            deadline (int): [ns] perf_counter_ns timestamp.
+            epoch_ns (int): [ns] absolute time since epoch.
+            time_abs (datetime): absolute time.
+            time_rel (float): [s] relative time.
+        """
+        object.__setattr__(self, "seq", seq)
+        object.__setattr__(self, "deadline", deadline)
+        object.__setattr__(self, "epoch_ns", epoch_ns)
+        object.__setattr__(self, "time_abs", time_abs)
+        object.__setattr__(self, "time_rel", time_rel)
+        object.__setattr__(
+            self,
+            "timestamp",
+            time_abs.isoformat(timespec="milliseconds").replace("T", " "),
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tick is immutable.")
+
+    def __repr__(self):
+        return f"Tick({self.seq}, {self.timestamp}, {self.time_rel})"
+
+    def age(self):
+        """Time since the tick, used to detect delayed saving.
+
+        Returns:
+            float: [s]
+        """
+        return (time.time_ns() - self.epoch_ns) / 1e9
+
+
+class Job:
+    """Periodic job of the scheduler."""
+
+    def __init__(self, name, dt, callback, phase=0):
+        """Create job.
+
+        Args:
+            name (str): name of the job, used for logging.
+            dt (int): time step in ms.
+            callback (func): function that is called with the Tick of
+                each step.
+            phase (int, optional): [ms] offset of the ticks with respect
+                to the scheduler's anchor. Defaults to 0.
+        """
+        self.name = name
+        self.dt = int(dt * 1e6)  # ns
+        self.phase = int(phase * 1e6)  # ns
+        self.callback = callback
+        self.tick = 0  # index of next tick
+        self.deadline = None  # ns, perf_counter_ns
+        self.skipped = 0
+        self.late = 0
+
+
+class Scheduler(threading.Thread):
+    """Deadline-based scheduler. All jobs are aligned to a common
+    monotonic anchor that is taken when the scheduler is started.
+    The n-th tick of a job is due at anchor + n * dt, independent of
+    how long previous ticks took. Timestamps are derived from the
+    anchor and a wall-clock timestamp taken at the same moment.
+
+    Available policies if a deadline was missed by more than one time
+    step:
+    - skip: missed ticks are dropped, sampling continues on the grid.
+    - catch-up: missed ticks are executed immediately one after another.
+    """
+
+    POLICIES = ["skip", "catch-up"]
+
+    def __init__(self, policy="skip", tolerance=5):
+        """Create scheduler. Jobs need to be added before start() is
+        called.
+
+        Args:
+            policy (str, optional): "skip" or "catch-up". Defaults to
+                "skip".
+            tolerance (int, optional): [ms] ticks executed later than
+                this are counted as late. Defaults to 5.
+        """
+        super().__init__(name="Scheduler", daemon=True)
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f"Unknown scheduler policy '{policy}'. Use one of {self.POLICIES}."
+            )
+        self.policy = policy
+        self.tolerance = int(tolerance * 1e6)  # ns
+        self.jobs = {}
+        self.anchor = None  # ns, perf_counter_ns
+        self.start_time = None  # datetime corresponding to anchor
+        self.start_ns = None  # ns since epoch corresponding to anchor
+        self._stop_event = threading.Event()
+
+    def add_job(self, name, dt, callback, phase=0):
+        """Add a periodic job.
+
+        Args:
+            name (str): unique name of the job.
+            dt (int): time step in ms.
+            callback (func): function that is called with the Tick of
+                each step. It is executed in the scheduler thread and
+                must return fast.
+            phase (int, optional): [ms] offset of the ticks with respect
+                to the start of the scheduler. Defaults to 0.
+        """
+        if self.is_alive():
+            raise RuntimeError("Jobs must be added before starting the scheduler.")
+        if name in self.jobs:
+            raise ValueError(f"Job {name} already exists.")
+        if dt <= 0 or phase < 0:
+            raise ValueError(f"Invalid time step {dt} ms / phase {phase} ms for job {name}.")
+        self.jobs.update({name: Job(name, dt, callback, phase)})
+
+    def set_phase(self, name, phase):
+        """Change the phase of a job before the scheduler is started.
+
+        Args:
+            name (str): name of the job.
+            phase (int): [ms] offset of the ticks with respect to the
+                start of the scheduler.
+        """
+        if self.is_alive():
+            raise RuntimeError("Phases must be set before starting the scheduler.")
+        if phase < 0:
+            raise ValueError(f"Invalid phase {phase} ms for job {name}.")
+        self.jobs[name].phase = int(phase * 1e6)
+
+    def start(self):
+        """Take the anchor timestamps and start the scheduler thread.
+        The first tick of every job is due immediately (plus its
+        phase)."""
+        self.start_time = datetime.datetime.now(datetime.timezone.utc).astimezone()
+        self.anchor = time.perf_counter_ns()
+        self.start_ns = (self.start_time - EPOCH) // datetime.timedelta(microseconds=1) * 1000
+        for job in self.jobs.values():
+            job.deadline = self.anchor + job.phase
+        logger.info(
+            f"Starting scheduler with policy '{self.policy}' at {self.start_time.isoformat(timespec='milliseconds')}"
+        )
+        super().start()
+
+    def stop(self, timeout=None):
+        """Stop the scheduler and wait for the thread to finish.
+
+        Args:
+            timeout (float, optional): [s] timeout for joining the
+                thread. Defaults to None.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        for job in self.jobs.values():
+            logger.info(
+                f"Scheduler job '{job.name}': {job.tick} ticks, {job.skipped} skipped, {job.late} late"
+            )
+
+    def timestamp(self, deadline, seq=0):
+        """Convert a deadline into absolute and relative time.
+
+        Args:
+            deadline (int): [ns] perf_counter_ns timestamp.
+            seq (int, optional): sequence number. Defaults to 0.
+
+        Returns:
+            Tick
+        """
+        if self.anchor is None:
+            raise RuntimeError("The scheduler is not started.")
+        elapsed = deadline - self.anchor
+        time_abs = self.start_time + datetime.timedelta(microseconds=elapsed // 1000)
+        time_rel = round(elapsed / 1e9, 3)
+        return Tick(seq, deadline, self.start_ns + elapsed, time_abs, time_rel)
+
+    def run(self):
+        """Main loop of the scheduler thread."""
+        queue = [(job.deadline, name) for name, job in self.jobs.items()]
+        heapq.heapify(queue)
+        while queue and not self._stop_event.is_set():
+            deadline, name = queue[0]
+            remaining = deadline - time.perf_counter_ns()
+            if remaining > 0:
+                # wake up for the next deadline or as soon as stop() is called
+                if self._stop_event.wait(remaining / 1e9):
+                    break
+                continue
+            job = self.jobs[name]
+            delay = -remaining
+            if delay >= job.dt and self.policy == "skip":
+                missed = delay // job.dt
+                job.skipped += missed
+                job.tick += missed
+                job.deadline += missed * job.dt
+                delay -= missed * job.dt
+                logger.warning(
+                    f"Scheduler job '{name}': skipped {missed} tick(s), deadline missed by {(-remaining) / 1e6:.1f} ms"
+                )
+            if delay > self.tolerance:
+                job.late += 1
+                logger.debug(
+                    f"Scheduler job '{name}': tick {job.tick} late by {delay / 1e6:.1f} ms"
+                )
+            try:
+                job.callback(self.timestamp(job.deadline, job.tick))
+            except Exception as e:
+                logger.exception(f"Error in scheduler job '{name}'")
+            job.tick += 1
+            job.deadline += job.dt
+            heapq.heapreplace(queue, (job.deadline, name))
@@ -0,0 +1,639 @@
+"""This module contains the binary storage backends for the scalar time
+series of the devices (setting storage: npy / hdf5) and the containers
+of the cameras for frames and images (FrameStore, ImageContainer).
+Instead of a csv line per sampling, the values are collected as float64
+columns with int64 timestamps (ns since epoch) and appended to the
+output in chunks, one dataset per column. The csv files in the usual
+layout, including the heat maps of the cameras, can be generated from
+the binary output with convert() (multilog.py --to-csv)."""
+from abc import ABC, abstractmethod
+import datetime
+import glob
+import logging
+import os
+import threading
+import time
+import zipfile
+import numpy as np
+import yaml
+
+from .archive import export
+
+logger = logging.getLogger(__name__)
+try:
+    import h5py
+except Exception as e:
+    h5py = None
+    logger.warning("Could not import h5py.", exc_info=True)
+
+BACKENDS = ["csv", "npy", "hdf5"]
+TIMING_COLUMNS = ["time_request", "time_response"]
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def create(backend, filename, chunk_rows=100):
+    """Create the storage of a device. It replaces the device's csv
+    file, which must be initialized with its two header lines (units and
+    column names) before.
+
+    Args:
+        backend (str): "csv", "npy" or "hdf5".
+        filename (str): csv file of the device.
+        chunk_rows (int, optional): number of samplings written at once.
+            Defaults to 100.
+
+    Returns:
+        Storage: None for csv.
+    """
+    if backend == "csv":
+        return None
+    if backend == "npy":
+        return NpyStorage(filename, chunk_rows)
+    if backend == "hdf5":
+        if h5py is None:
+            raise ImportError("h5py is required for storage: hdf5.")
+        return Hdf5Storage(filename, chunk_rows)
+    raise ValueError(f"Unknown storage {backend}, use one of {BACKENDS}.")
+
+
+def to_float(value):
+    """Convert a value to float, NaN if that's not possible."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class Storage(ABC):
+    """Base class of the binary storage backends. The samplings are
+    buffered and written as chunk once chunk_rows samplings are
+    collected and when the storage is closed."""
+
+    def __init__(self, filename, chunk_rows=100):
+        """Read the header of the device's csv file and remove it.
+
+        Args:
+            filename (str): csv file of the device.
+            chunk_rows (int, optional): number of samplings written at
+                once. Defaults to 100.
+        """
+        with open(filename, encoding="utf-8") as f:
+            self.units = f.readline()
+            self.header = f.readline()
+        os.remove(filename)
+        self.filename = os.path.splitext(filename)[0]  # without extension
+        self.chunk_rows = chunk_rows
+        columns = self.header.strip().rstrip(",").split(",")
+        self.columns = columns[2:]  # without time_abs, time_rel
+        self.value_columns = [
+            c for c in self.columns if c not in ["seq"] + TIMING_COLUMNS
+        ]
+        # utc offset at the start, for information; to_csv() converts each
+        # timestamp to local time, as the offset may change (DST)
+        self.utcoffset = datetime.datetime.now().astimezone().utcoffset().total_seconds()
+        self.chunks = 0
+        self.rows = 0
+        self.callback = None  # called with tick and values on append()
+        self.clear()
+
+    def clear(self):
+        """Clear the buffer."""
+        self.buffer = {"time_abs": [], "time_rel": []}
+        for column in self.columns:
+            self.buffer.update({column: []})
+
+    def append(self, tick, values, timing=None):
+        """Append a sampling.
+
+        Args:
+            tick (Tick): timestamp of the sampling step.
+            values (list): values in the order of the csv columns.
+            timing (dict, optional): request / response time in ns, if
+                timing-columns is configured. Defaults to None.
+        """
+        self.buffer["time_abs"].append(tick.epoch_ns)
+        self.buffer["time_rel"].append(tick.time_rel)
+        if "seq" in self.buffer:
+            self.buffer["seq"].append(tick.seq)
+        for column, value in zip(self.value_columns, values):
+            self.buffer[column].append(to_float(value))
+        if "time_request" in self.buffer:
+            # -1: device not sampled (circuit breaker open)
+            timing = timing or {"request": -1, "response": -1}
+            self.buffer["time_request"].append(timing["request"])
+            self.buffer["time_response"].append(timing["response"])
+        if len(self.buffer["time_abs"]) >= self.chunk_rows:
+            self.flush()
+        if self.callback is not None:
+            self.callback(tick, values)
+
+    def flush(self):
+        """Write the buffered samplings as chunk."""
+        if not self.buffer["time_abs"]:
+            return
+        arrays = {}
+        for column, data in self.buffer.items():
+            dtype = np.float64 if column in self.value_columns + ["time_rel"] else np.int64
+            arrays.update({column: np.array(data, dtype=dtype)})
+        self.write_chunk(arrays)
+        self.chunks += 1
+        self.rows += len(self.buffer["time_abs"])
+        self.clear()
+
+    def close(self):
+        """Write the remaining samplings."""
+        self.flush()
+        logger.info(f"Storage: {self.rows} samplings written to {self.path}")
+
+    def metadata(self):
+        """Metadata required to restore the csv file."""
+        return {
+            "units": self.units,
+            "header": self.header,
+            "utcoffset": self.utcoffset,
+        }
+
+    @abstractmethod
+    def write_metadata(self):
+        """Write metadata."""
+
+    @abstractmethod
+    def write_chunk(self, arrays):
+        """Append a chunk.
+
+        Args:
+            arrays (dict): {column: np.array}.
+        """
+
+
+class NpyStorage(Storage):
+    """Directory <device>.npy with one numpy .npz file per chunk
+    containing one array per column and metadata.yml."""
+
+    def __init__(self, filename, chunk_rows=100):
+        super().__init__(filename, chunk_rows)
+        self.path = f"{self.filename}.npy"
+        os.makedirs(self.path)
+        self.write_metadata()
+
+    def write_metadata(self):
+        with open(f"{self.path}/metadata.yml", "w", encoding="utf-8") as f:
+            yaml.dump(self.metadata(), f)
+
+    def write_chunk(self, arrays):
+        np.savez(f"{self.path}/chunk_{self.chunks:06}.npz", **arrays)
+
+
+class Hdf5Storage(Storage):
+    """HDF5 file <device>.h5 with one resizable, chunked dataset per
+    column and the metadata as attributes."""
+
+    def __init__(self, filename, chunk_rows=100):
+        super().__init__(filename, chunk_rows)
+        self.path = f"{self.filename}.h5"
+        self.file = h5py.File(self.path, "w")
+        for column in self.buffer:
+            dtype = "f8" if column in self.value_columns + ["time_rel"] else "i8"
+            self.file.create_dataset(
+                dataset_name(column),
+                (0,),
+                dtype=dtype,
+                maxshape=(None,),
+                chunks=(max(chunk_rows, 1),),
+            )
+        self.write_metadata()
+
+    def write_metadata(self):
+        for key, value in self.metadata().items():
+            self.file.attrs[key] = value
+
+    def write_chunk(self, arrays):
+        for column, array in arrays.items():
+            dataset = self.file[dataset_name(column)]
+            dataset.resize((dataset.shape[0] + len(array),))
+            dataset[-len(array) :] = array
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class NpyAppender:
+    """Numpy .npy file that is appended along the first axis. The
+    header has a fixed size and is updated on flush(), so the file can
+    be memory-mapped at any time (also after a crash, see
+    open_npy())."""
+
+    HEADER_SIZE = 128
+
+    def __init__(self, filename, dtype, shape=()):
+        """Create file.
+
+        Args:
+            filename (str): file path.
+            dtype (numpy.dtype / str): data type.
+            shape (tuple, optional): shape of one item. Defaults to ()
+                (scalar items).
+        """
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.length = 0
+        self.file = open(filename, "wb")
+        self.write_header()
+
+    def write_header(self):
+        """Write the npy header with the current length."""
+        header = {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.length, *self.shape),
+        }
+        header = repr(header).ljust(self.HEADER_SIZE - 11) + "\n"
+        self.file.seek(0)
+        self.file.write(b"\x93NUMPY\x01\x00")
+        self.file.write(len(header).to_bytes(2, "little"))
+        self.file.write(header.encode("latin1"))
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, item):
+        """Append an item.
+
+        Args:
+            item (numpy.array / scalar): data of the given shape.
+        """
+        self.file.write(np.asarray(item, self.dtype).tobytes())
+        self.length += 1
+
+    def flush(self):
+        """Update header and flush file."""
+        self.write_header()
+        self.file.flush()
+
+    def close(self):
+        """Update header and close file."""
+        self.flush()
+        self.file.close()
+
+
+def open_npy(filename):
+    """Memory-map a file written by NpyAppender. The length is derived
+    from the file size, so that also frames appended after the last
+    header update are available.
+
+    Args:
+        filename (str): file path.
+
+    Returns:
+        numpy.memmap: read-only array.
+    """
+    with open(filename, "rb") as f:
+        np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        offset = f.tell()
+    item_size = int(np.prod(shape[1:])) * dtype.itemsize
+    length = (os.path.getsize(filename) - offset) // item_size
+    if length == 0:
+        return np.zeros((0, *shape[1:]), dtype)
+    return np.memmap(filename, dtype, "r", offset, (length, *shape[1:]))
+
+
+class FrameStore:
+    """Container for the frames of a camera in its output directory.
+    The raw frames and their timestamps (int64, ns since epoch) are
+    appended to one file per run:
+    - npy: frames.npy and frames_time.npy, uncompressed and
+      memory-mappable (open_frames()).
+    - hdf5: frames.h5 with datasets frames, time_abs and time_rel,
+      chunked per frame and optionally gzip-compressed.
+    The metadata (frames.yml / attributes) contains the conversion
+    value = raw * scale + offset used for the csv export."""
+
+    def __init__(
+        self,
+        directory,
+        shape,
+        backend="npy",
+        dtype="uint16",
+        scale=1,
+        offset=0,
+        fmt="%.2f",
+        compression=0,
+        flush_frames=10,
+    ):
+        """Create the container.
+
+        Args:
+            directory (str): output directory of the camera.
+            shape (tuple): shape of the frames.
+            backend (str, optional): "npy" or "hdf5". Defaults to "npy".
+            dtype (str, optional): data type of the raw frames. Defaults
+                to "uint16".
+            scale (float, optional): scale of raw values. Defaults to 1.
+            offset (float, optional): offset of scaled values. Defaults
+                to 0.
+            fmt (str, optional): number format of the csv export.
+                Defaults to "%.2f".
+            compression (int, optional): gzip level for hdf5, 0: off.
+                Defaults to 0.
+            flush_frames (int, optional): header / file is updated every
+                flush_frames frames. Defaults to 10.
+        """
+        self.directory = directory
+        self.backend = backend
+        self.flush_frames = flush_frames
+        self.frames = 0
+        metadata = {"scale": scale, "offset": offset, "format": fmt}
+        if backend == "npy":
+            self.path = f"{directory}/frames.npy"
+            self.data = NpyAppender(self.path, dtype, shape)
+            self.time_abs = NpyAppender(f"{directory}/frames_time.npy", np.int64)
+            with open(f"{directory}/frames.yml", "w", encoding="utf-8") as f:
+                yaml.dump(metadata, f)
+        elif backend == "hdf5":
+            if h5py is None:
+                raise ImportError("h5py is required for frame-store: hdf5.")
+            self.path = f"{directory}/frames.h5"
+            self.file = h5py.File(self.path, "w")
+            options = {}
+            if compression:
+                options = {"compression": "gzip", "compression_opts": compression}
+            self.file.create_dataset(
+                "frames",
+                (0, *shape),
+                dtype=dtype,
+                maxshape=(None, *shape),
+                chunks=(1, *shape),
+                **options,
+            )
+            for name, dtype in [("time_abs", "i8"), ("time_rel", "f8")]:
+                self.file.create_dataset(
+                    name, (0,), dtype=dtype, maxshape=(None,), chunks=(1024,)
+                )
+            for key, value in metadata.items():
+                self.file.attrs[key] = value
+        else:
+            raise ValueError(f"Unknown frame-store {backend}, use 'npy' or 'hdf5'.")
+
+    def append(self, frame, tick):
+        """Append a frame.
+
+        Args:
+            frame (numpy.array): raw frame.
+            tick (Tick): timestamp of the sampling step.
+
+        Returns:
+            int: index of the frame in the container.
+        """
+        if self.backend == "npy":
+            self.data.append(frame)
+            self.time_abs.append(tick.epoch_ns)
+        else:
+            for name, value in [
+                ("frames", frame),
+                ("time_abs", tick.epoch_ns),
+                ("time_rel", tick.time_rel),
+            ]:
+                dataset = self.file[name]
+                dataset.resize(self.frames + 1, axis=0)
+                dataset[self.frames] = value
+        self.frames += 1
+        if self.frames % self.flush_frames == 0:
+            self.flush()
+        return self.frames - 1
+
+    def flush(self):
+        """Write headers and buffered data to disk."""
+        if self.backend == "npy":
+            self.data.flush()
+            self.time_abs.flush()
+        else:
+            self.file.flush()
+
+    def close(self):
+        """Close the container."""
+        if self.backend == "npy":
+            self.data.close()
+            self.time_abs.close()
+        else:
+            self.file.close()
+        logger.info(f"FrameStore: {self.frames} frames written to {self.path}")
+
+
+class ImageContainer:
+    """Rolling uncompressed zip files (images_000000.zip, ...) in the
+    output directory of a camera, containing the encoded images. A new
+    file is started after max_frames images. The position of the image
+    data in the file is returned, so that it can be read directly
+    (read_image()) or with any zip tool."""
+
+    def __init__(self, directory, prefix="images", max_frames=1000):
+        """Create container.
+
+        Args:
+            directory (str): output directory of the camera.
+            prefix (str, optional): file name prefix. Defaults to
+                "images".
+            max_frames (int, optional): number of images per file.
+                Defaults to 1000.
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_frames = max_frames
+        self.containers = 0
+        self.frames = 0  # in current file
+        self.file = None
+        self.lock = threading.Lock()
+
+    def append(self, name, data):
+        """Append an image.
+
+        Args:
+            name (str): image name, e.g. img_000001.jpeg.
+            data (bytes): encoded image.
+
+        Returns:
+            tuple: (container file name, offset of the data in bytes,
+                size in bytes)
+        """
+        with self.lock:
+            if self.file is None or self.frames >= self.max_frames:
+                if self.file is not None:
+                    self.file.close()
+                self.filename = f"{self.prefix}_{self.containers:06}.zip"
+                self.file = zipfile.ZipFile(
+                    f"{self.directory}/{self.filename}", "w", zipfile.ZIP_STORED
+                )
+                self.containers += 1
+                self.frames = 0
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            self.file.writestr(info, data)
+            self.file.fp.flush()
+            self.frames += 1
+            # local file header: 30 bytes + name + extra field
+            offset = info.header_offset + 30 + len(info.filename.encode()) + len(info.extra)
+            return self.filename, offset, len(data)
+
+    def close(self):
+        """Close the current file (writes the zip directory)."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        logger.info(f"ImageContainer: {self.containers} files written to {self.directory}")
+
+
+def read_image(directory, container, offset, size):
+    """Read an image from a container as given in _images.csv.
+
+    Args:
+        directory (str): output directory of the camera.
+        container (str): container file name.
+        offset (int): offset of the image data in bytes.
+        size (int): size of the image data in bytes.
+
+    Returns:
+        bytes: encoded image.
+    """
+    with open(f"{directory}/{container}", "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def dataset_name(column):
+    """HDF5 dataset name of a column ("/" is not allowed)."""
+    return column.replace("/", "_")
+
+
+def read(path):
+    """Read the output of a binary storage.
+
+    Args:
+        path (str): <device>.npy directory or <device>.h5 file.
+
+    Returns:
+        tuple: (metadata dict, {column: np.array})
+    """
+    if path.endswith(".h5"):
+        if h5py is None:
+            raise ImportError("h5py is required to read hdf5 files.")
+        with h5py.File(path, "r") as f:
+            metadata = dict(f.attrs)
+            data = {name: f[name][()] for name in f}
+    else:
+        with open(f"{path}/metadata.yml", encoding="utf-8") as f:
+            metadata = yaml.safe_load(f)
+        chunks = {}
+        for filename in sorted(glob.glob(f"{path}/chunk_*.npz")):
+            with np.load(filename) as chunk:
+                for name in chunk.files:
+                    chunks.setdefault(name, []).append(chunk[name])
+        data = {name: np.concatenate(arrays) for name, arrays in chunks.items()}
+    columns = metadata["header"].strip().rstrip(",").split(",")
+    data = {
+        column: data.get(dataset_name(column), np.array([]))
+        for column in columns
+    }
+    return metadata, data
+
+
+def to_csv(path, filename=None):
+    """Write the output of a binary storage as csv file in the layout
+    used by the device.
+
+    Args:
+        path (str): <device>.npy directory or <device>.h5 file.
+        filename (str, optional): csv file. Defaults to <device>.csv.
+
+    Returns:
+        str: csv file.
+    """
+    if filename is None:
+        filename = f"{os.path.splitext(path)[0]}.csv"
+    metadata, data = read(path)
+    # local time of each sampling, the utc offset may change (DST)
+    time_abs = [
+        (EPOCH + datetime.timedelta(microseconds=t // 1000)).astimezone()
+        for t in data.pop("time_abs").tolist()
+    ]
+    columns = [array.tolist() for array in data.values()]
+    separator = "," if metadata["header"].strip().endswith(",") else ""
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(metadata["units"])
+        f.write(metadata["header"])
+        for i, t in enumerate(time_abs):
+            line = t.isoformat(timespec="milliseconds").replace("T", " ")
+            for column in columns:
+                line += f",{column[i]}"
+            f.write(f"{line}{separator}\n")
+    return filename
+
+
+def open_frames(directory):
+    """Open the frame container of a camera.
+
+    Args:
+        directory (str): output directory of the camera.
+
+    Returns:
+        tuple: (metadata dict, time_abs array [ns since epoch], frames
+            array), memory-mapped for npy, h5py datasets for hdf5 (the
+            file is closed with frames.file.close()).
+    """
+    if os.path.exists(f"{directory}/frames.h5"):
+        if h5py is None:
+            raise ImportError("h5py is required to read hdf5 files.")
+        f = h5py.File(f"{directory}/frames.h5", "r")
+        return dict(f.attrs), f["time_abs"], f["frames"]
+    with open(f"{directory}/frames.yml", encoding="utf-8") as f:
+        metadata = yaml.safe_load(f)
+    time_abs = open_npy(f"{directory}/frames_time.npy")
+    frames = open_npy(f"{directory}/frames.npy")
+    length = min(len(time_abs), len(frames))  # in case of a crash
+    return metadata, time_abs[:length], frames[:length]
+
+
+def frames_to_csv(directory, prefix="img_"):
+    """Export the frames of a camera as csv heat maps (one file per
+    frame, named like the images: img_000001.csv, ...).
+
+    Args:
+        directory (str): output directory of the camera.
+        prefix (str, optional): file name prefix. Defaults to "img_".
+
+    Returns:
+        int: number of exported frames.
+    """
+    metadata, time_abs, frames = open_frames(directory)
+    for i in range(len(frames)):
+        np.savetxt(
+            f"{directory}/{prefix}{i + 1:06}.csv",
+            frames[i] * metadata["scale"] + metadata["offset"],
+            metadata["format"],
+        )
+    if hasattr(frames, "file"):
+        frames.file.close()
+    return len(frames)
+
+
+def convert(directory):
+    """Generate the csv files of all binary storages in a directory.
+
+    Args:
+        directory (str): measurement directory.
+
+    Returns:
+        list: generated csv files.
+    """
+    filenames = []
+    for path in sorted(glob.glob(f"{directory}/*.npy") + glob.glob(f"{directory}/*.h5")):
+        filename = to_csv(path)
+        logger.info(f"Converted {path} to {filename}")
+        filenames.append(filename)
+    for path in sorted(glob.glob(f"{directory}/*/frames.npy") + glob.glob(f"{directory}/*/frames.h5")):
+        frames = frames_to_csv(os.path.dirname(path))
+        logger.info(f"Exported {frames} heat maps of {path}")
+        filenames.append(f"{os.path.dirname(path)}/*.csv ({frames} frames)")
+    # the image lists of the IR cameras point to the csv heat maps now
+    filenames += export(directory)
+    return filenames
@@ -0,0 +1,485 @@
+"""This module contains the writer service of multilog. Instead of
+opening, appending and closing the output files in every sampling step,
+the devices pass their lines to write(). While the recording is running,
+the lines are collected by a writer thread that keeps the files open and
+writes them in batches."""
+import glob
+import gzip
+import logging
+import lzma
+import os
+import queue
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+_writer = None  # active Writer, set by Writer.start()
+COMPRESSION = {"gzip": ".gz", "lzma": ".xz"}  # file name suffixes
+
+
+def write(filename, text):
+    """Append text to a file. If the writer service is running, the
+    text is buffered and written by the writer thread, otherwise it's
+    written directly.
+
+    Args:
+        filename (str): file path.
+        text (str): text to be appended, usually one line.
+    """
+    writer = _writer
+    if writer is not None:
+        writer.write(filename, text)
+    else:
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+def compress(data, compression, level=None):
+    """Compress a block of data.
+
+    Args:
+        data (bytes): data.
+        compression (str): "gzip" or "lzma".
+        level (int, optional): compression level (gzip: 1 ... 9, lzma:
+            preset 0 ... 9). Defaults to None (gzip: 6, lzma: 6).
+
+    Returns:
+        bytes: gzip member or xz stream.
+    """
+    if compression == "gzip":
+        return gzip.compress(data, 6 if level is None else level)
+    if compression == "lzma":
+        return lzma.compress(data, preset=level)
+    raise ValueError(f"Unknown compression '{compression}'. Use one of {list(COMPRESSION)}.")
+
+
+def open_text(filename, mode="r", level=None):
+    """Open a text file, compressed if it ends with .gz or .xz.
+
+    Args:
+        filename (str): file path.
+        mode (str, optional): "r", "w" or "a". Defaults to "r".
+        level (int, optional): compression level for writing. Defaults
+            to None.
+
+    Returns:
+        file object
+    """
+    if filename.endswith(COMPRESSION["gzip"]):
+        return gzip.open(filename, f"{mode}t", 6 if level is None else level, "utf-8")
+    if filename.endswith(COMPRESSION["lzma"]):
+        return lzma.open(filename, f"{mode}t", preset=level, encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
+
+
+def segment_files(filename):
+    """Get the existing segments of an output file (compressed or not)
+    in chronological order.
+
+    Args:
+        filename (str): file path of the first segment (without .gz /
+            .xz).
+
+    Returns:
+        list: file paths.
+    """
+    name, extension = os.path.splitext(filename)
+    files = []
+    for pattern in [
+        glob.escape(filename),
+        f"{glob.escape(name)}_[0-9][0-9][0-9][0-9]{extension}",
+    ]:
+        for suffix in ["", *COMPRESSION.values()]:
+            files += sorted(glob.glob(pattern + suffix))
+    return files
+
+
+class OutputFile:
+    """Output file with header (units and column names) that is written
+    compressed and / or split into rolling segments.
+
+    With compression, each batch of lines is compressed as a separate
+    block (gzip member or xz stream). The blocks are concatenated, which
+    is a valid gzip / xz file, so a crash loses at most the last block.
+
+    The first segment is the file itself, the following ones are named
+    <name>_0001.csv, ... and start with the same header. The time range
+    of each segment is taken from the first column (time_abs) of its
+    lines."""
+
+    def __init__(
+        self, filename, compression=None, level=None, max_bytes=None, interval=None
+    ):
+        """Take over a file containing the header.
+
+        Args:
+            filename (str): file path (without .gz / .xz).
+            compression (str, optional): "gzip" or "lzma". Defaults to
+                None.
+            level (int, optional): compression level. Defaults to None.
+            max_bytes (int, optional): roll over once a segment reaches
+                this size. Defaults to None.
+            interval (float, optional): [s] roll over at multiples of
+                this interval (e.g., 3600 for hourly files). Defaults to
+                None.
+        """
+        if compression is not None and compression not in COMPRESSION:
+            raise ValueError(
+                f"Unknown compression '{compression}'. Use one of {list(COMPRESSION)}."
+            )
+        self.filename = filename
+        self.compression = compression
+        self.level = level
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.segmented = bool(max_bytes or interval)
+        with open(filename, encoding="utf-8") as f:
+            self.header = f.read()
+        self.index = 0
+        self.path = filename + COMPRESSION.get(compression, "")
+        if compression is not None:
+            os.remove(filename)
+            self.write_header()
+        self.start_segment()
+
+    def encode(self, text):
+        """Convert lines to the data written to the file.
+
+        Args:
+            text (str): lines.
+
+        Returns:
+            bytes
+        """
+        if self.compression is None:
+            return text.replace("\n", os.linesep).encode("utf-8")
+        return compress(text.encode("utf-8"), self.compression, self.level)
+
+    def write_header(self):
+        """Create the current segment with the header."""
+        with open(self.path, "wb") as f:
+            f.write(self.encode(self.header))
+
+    def start_segment(self):
+        """Reset the statistics of the current segment."""
+        self.size = os.path.getsize(self.path)
+        self.period = self.current_period()
+        self.rows = 0
+        self.time_start = ""
+        self.time_end = ""
+
+    def current_period(self):
+        """Number of the current time interval since epoch."""
+        if not self.interval:
+            return None
+        return int(time.time() // self.interval)
+
+    def due(self):
+        """Check if the current segment is full or its interval is over.
+
+        Returns:
+            bool
+        """
+        if not self.segmented or self.rows == 0:
+            return False
+        if self.max_bytes and self.size >= self.max_bytes:
+            return True
+        return self.period != self.current_period()
+
+    def add(self, text, size):
+        """Update the statistics with lines written to the current
+        segment.
+
+        Args:
+            text (str): lines.
+            size (int): [bytes] written data.
+        """
+        lines = text.splitlines()
+        if not lines:
+            return
+        if self.rows == 0:
+            self.time_start = lines[0].split(",", 1)[0]
+        self.time_end = lines[-1].split(",", 1)[0]
+        self.rows += len(lines)
+        self.size += size
+
+    def entry(self, directory):
+        """Get the manifest line of the current segment.
+
+        Args:
+            directory (str): directory of the manifest.
+
+        Returns:
+            str
+        """
+        return (
+            f"{os.path.relpath(self.filename, directory)},"
+            f"{os.path.relpath(self.path, directory)},"
+            f"{self.time_start},{self.time_end},{self.rows},{self.size},\n"
+        )
+
+    def roll(self):
+        """Start the next segment and write its header."""
+        self.index += 1
+        name, extension = os.path.splitext(self.filename)
+        self.path = (
+            f"{name}_{self.index:04d}{extension}"
+            + COMPRESSION.get(self.compression, "")
+        )
+        self.write_header()
+        self.start_segment()
+
+
+class Writer(threading.Thread):
+    """Writer thread keeping the output files open. The lines are
+    buffered per file and written if flush_rows lines are buffered for a
+    file or flush_interval has elapsed. All buffers are written and the
+    files are closed by close(). Optionally, each batch is recorded in a
+    journal before it's written to the file (see journal.py), and the
+    files registered with register() are compressed and / or split into
+    rolling segments listed in a manifest."""
+
+    def __init__(
+        self,
+        flush_interval=1,
+        flush_rows=100,
+        fsync=False,
+        journal=None,
+        segment_size=None,
+        segment_interval=None,
+        manifest=None,
+    ):
+        """Create writer. It's activated with start().
+
+        Args:
+            flush_interval (float, optional): [s] maximum time lines are
+                buffered. Defaults to 1.
+            flush_rows (int, optional): maximum number of buffered lines
+                per file. Defaults to 100.
+            fsync (bool, optional): force the operating system to write
+                the files to disk on each flush. Defaults to False.
+            journal (str, optional): file path of the journal, None to
+                disable it. Defaults to None.
+            segment_size (int, optional): [bytes] maximum size of a
+                segment. Defaults to None.
+            segment_interval (float, optional): [s] time span of a
+                segment. Defaults to None.
+            manifest (str, optional): file path of the manifest listing
+                the segments, required for segmented files. Defaults
+                to None.
+        """
+        super().__init__(name="Writer", daemon=True)
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+        self.queue = queue.Queue()
+        self.buffers = {}  # filename: [lines]
+        self.files = {}  # filename: file object
+        self.rows = 0  # number of written lines
+        self.flushes = 0
+        self.journal = None
+        if journal is not None:
+            from .journal import Journal
+
+            self.journal = Journal(journal)
+        self.segment_size = segment_size
+        self.segment_interval = segment_interval
+        self.manifest = manifest
+        self.outputs = {}  # filename: OutputFile
+        self.taps = {}  # filename: callback
+
+    def register(self, filename, compression=None, level=None, segments=False):
+        """Write a file compressed and / or in rolling segments. It has to
+        be called before start(), the file must contain the header.
+
+        Args:
+            filename (str): file path.
+            compression (str, optional): "gzip" or "lzma". Defaults to
+                None.
+            level (int, optional): compression level. Defaults to None.
+            segments (bool, optional): split the file into segments
+                according to segment_size and segment_interval. Defaults
+                to False.
+        """
+        self.outputs.update(
+            {
+                filename: OutputFile(
+                    filename,
+                    compression,
+                    level,
+                    self.segment_size if segments else None,
+                    self.segment_interval if segments else None,
+                )
+            }
+        )
+        if self.outputs[filename].segmented and not os.path.exists(self.manifest):
+            with open(self.manifest, "w", encoding="utf-8") as f:
+                f.write("# -,-,datetime,datetime,-,bytes,\n")
+                f.write("file,segment,time_start,time_end,rows,size,\n")
+
+    def path(self, filename):
+        """Get the path the lines of a file are written to, i.e., the
+        current segment (with .gz / .xz if compressed). Starts the next
+        segment if it's due.
+
+        Args:
+            filename (str): file path.
+
+        Returns:
+            str
+        """
+        if filename not in self.outputs:
+            return filename
+        output = self.outputs[filename]
+        if output.due():
+            if output.path in self.files:
+                self.files.pop(output.path).close()
+            self.write_manifest(output)
+            output.roll()
+        return output.path
+
+    def write_manifest(self, output):
+        """Add a finished segment to the manifest.
+
+        Args:
+            output (OutputFile): segmented file.
+        """
+        with open(self.manifest, "a", encoding="utf-8") as f:
+            f.write(output.entry(os.path.dirname(self.manifest)))
+
+    def tap(self, filename, callback):
+        """Pass the text written to a file to a callback as well, e.g.,
+        for the combined table. It has to be called before start().
+
+        Args:
+            filename (str): file path.
+            callback (func): function that is called with the text, in
+                the thread calling write().
+        """
+        self.taps.update({filename: callback})
+
+    def start(self):
+        """Start the writer thread and route write() to it."""
+        global _writer
+        super().start()
+        _writer = self
+
+    def write(self, filename, text):
+        """Buffer text for a file.
+
+        Args:
+            filename (str): file path.
+            text (str): text to be appended.
+        """
+        self.queue.put((filename, text))
+        if filename in self.taps:
+            self.taps[filename](text)
+
+    def run(self):
+        """Main loop of the writer thread."""
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(next_flush - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+            if item is not None:
+                filename, text = item
+                if filename is None:  # close() was called
+                    break
+                if filename not in self.buffers:
+                    self.buffers.update({filename: []})
+                self.buffers[filename].append(text)
+                if len(self.buffers[filename]) >= self.flush_rows:
+                    self.flush([filename])
+            if time.monotonic() >= next_flush:
+                self.flush(list(self.buffers))
+                next_flush = time.monotonic() + self.flush_interval
+        self.flush(list(self.buffers))
+        for f in self.files.values():
+            f.close()
+        for output in self.outputs.values():
+            if output.segmented:
+                self.write_manifest(output)
+        if self.journal is not None:
+            self.journal.close()
+        logger.info(f"Writer: {self.rows} lines written with {self.flushes} flushes")
+
+    def flush(self, filenames):
+        """Write the buffered lines of files. If the journal is enabled,
+        the lines are recorded and synced to disk first, and the journal
+        is truncated once the files are synced as well. Hence, with the
+        journal each output file is synced (os.fsync) on every flush,
+        whatever the fsync setting is.
+
+        Args:
+            filenames (list): file paths.
+        """
+        filenames = [filename for filename in filenames if self.buffers[filename]]
+        if not filenames:
+            return
+        paths = {}  # filename: path of the current segment
+        data = {}  # filename: encoded (compressed) lines
+        for filename in filenames:
+            text = "".join(self.buffers[filename])
+            try:
+                paths.update({filename: self.path(filename)})
+                if filename in self.outputs:
+                    data.update({filename: self.outputs[filename].encode(text)})
+                else:
+                    data.update({filename: text.replace("\n", os.linesep).encode("utf-8")})
+            except Exception as e:
+                logger.exception(f"Writer: Error in preparing {filename}")
+                paths.update({filename: filename})
+                data.update({filename: text.replace("\n", os.linesep).encode("utf-8")})
+        journaled = False
+        if self.journal is not None:
+            try:
+                for filename in filenames:
+                    self.journal.append(paths[filename], data[filename])
+                self.journal.sync()
+                journaled = True
+            except Exception as e:
+                logger.exception(f"Writer: Error in writing the journal")
+        written = True
+        for filename in filenames:
+            lines = self.buffers[filename]
+            path = paths[filename]
+            try:
+                if path not in self.files:
+                    self.files.update({path: open(path, "ab")})
+                f = self.files[path]
+                f.write(data[filename])
+                f.flush()
+                if self.fsync or journaled:
+                    os.fsync(f.fileno())
+                if filename in self.outputs:
+                    self.outputs[filename].add("".join(lines), len(data[filename]))
+                self.rows += len(lines)
+                self.flushes += 1
+            except Exception as e:
+                written = False
+                logger.exception(f"Writer: Error in writing {filename}")
+            lines.clear()
+        if journaled and written:
+            try:
+                self.journal.checkpoint()
+            except Exception as e:
+                logger.exception(f"Writer: Error in truncating the journal")
+
+    def close(self, timeout=None):
+        """Write all buffered lines, close the files and stop the writer
+        thread. Lines written afterwards are written directly.
+
+        Args:
+            timeout (float, optional): [s] timeout for joining the
+                thread. Defaults to None.
+        """
+        global _writer
+        if _writer is self:
+            _writer = None
+        if self.is_alive():
+            self.queue.put((None, None))
+            self.join(timeout)
@@ -0,0 +1,52 @@
+"""Tests of the status columns of the combined table."""
+import datetime
+import time
+
+from multilog.combined import CombinedTable
+from multilog.health import CircuitBreaker
+from multilog.scheduler import EPOCH, Tick
+
+
+class Breaker:
+    """Circuit breaker with a fixed state."""
+
+    def __init__(self, state):
+        self.state = state
+
+    def allow(self):
+        return self.state != CircuitBreaker.OPEN
+
+
+def tick(seq, dt=1.0):
+    """Create the tick of a main step."""
+    time_abs = datetime.datetime.now(datetime.timezone.utc)
+    epoch_ns = (time_abs - EPOCH) // datetime.timedelta(microseconds=1) * 1000
+    return Tick(seq, time.perf_counter_ns(), epoch_ns, time_abs, seq * dt)
+
+
+def test_status(tmp_path):
+    table = CombinedTable(f"{tmp_path}/combined.csv", 1000, delay=1)
+    breaker = Breaker(CircuitBreaker.HEALTHY)
+    for name, dt in [("fast", 1000), ("slow", 2000), ("down", 1000)]:
+        table.add_device(
+            name, "# s,K,", "time_rel,value,", dt, breaker=breaker if name == "down" else None
+        )
+    table.write_header()
+    table.tick(tick(0))
+    table.add("fast", 0.0, ["1"])
+    table.add("slow", 0.0, ["2"])
+    table.add("down", 0.0, ["3"])
+    breaker.state = CircuitBreaker.OPEN
+    table.tick(tick(1))
+    table.add("down", 1.0, ["nan"])  # NaN row while the breaker is open
+    table.tick(tick(2))  # fast is missing in step 1
+    table.add("fast", 1.0, ["4"])  # after the row was written
+    table.close()
+    with open(f"{tmp_path}/combined.csv", encoding="utf-8") as f:
+        rows = [line.strip().split(",") for line in f.readlines()[2:]]
+    assert [row[4::2] for row in rows] == [
+        ["ok", "ok", "ok"],
+        ["missing", "none", "down"],
+        ["missing", "missing", "down"],
+    ]
+    assert table.late == {"fast": 1, "slow": 0, "down": 0}
@@ -0,0 +1,141 @@
+"""Tests of the circuit breaker handling in the sampling loop."""
+import datetime
+import math
+import time
+
+from serial import SerialException
+
+from multilog.acquisition import Sampler
+from multilog.devices import serial_bus
+from multilog.devices.pyrometer_lumasense import PyrometerLumasense
+from multilog.health import CircuitBreaker, nan_like
+from multilog.scheduler import EPOCH, Tick
+
+
+CONFIG = {
+    "serial-interface": {"port": "/dev/multilog-test-missing", "timeout": 0.1},
+    "device-id": "00",
+    "emissivity": 1.0,
+    "transmissivity": 1.0,
+    "t90": 0.01,
+    "t90-dict": {0.01: 4},
+    "timing-columns": 1,
+}
+
+
+class StubPort:
+    """Serial port of a Lumasense pyrometer that can be unplugged. The
+    handles opened before stay dead after the port is plugged in again,
+    like those of a USB-serial adapter."""
+
+    connected = True
+    ports = []
+
+    def __init__(self, **config):
+        if not StubPort.connected:
+            raise SerialException(f"could not open port {config['port']}")
+        self.alive = True
+        self.response = b""
+        StubPort.ports.append(self)
+
+    @classmethod
+    def unplug(cls):
+        cls.connected = False
+        for port in cls.ports:
+            port.alive = False
+
+    def check(self):
+        if not self.alive:
+            raise SerialException("device disconnected")
+
+    def reset_input_buffer(self):
+        self.check()
+
+    def write(self, message):
+        self.check()
+        cmd = message.decode()[2:-1]  # without device-id and \r
+        if cmd == "ms":
+            self.response = b"12345\r"
+        elif len(cmd) > 2:  # setting accepted
+            self.response = b"ok\r"
+        else:
+            self.response = {"em": b"1000\r", "et": b"1000\r", "ez": b"4\r"}[cmd]
+
+    def read_until(self, terminator):
+        self.check()
+        return self.response
+
+    def close(self):
+        self.alive = False
+
+
+def tick(seq, dt=1.0):
+    """Create the tick of a sampling step."""
+    time_abs = datetime.datetime.now(datetime.timezone.utc)
+    epoch_ns = (time_abs - EPOCH) // datetime.timedelta(microseconds=1) * 1000
+    return Tick(seq, time.perf_counter_ns(), epoch_ns, time_abs, seq * dt)
+
+
+def test_nan_like():
+    sampling = {"a": 1.0, "b": {"c": 2, "d": [3.0, "x"]}}
+    empty = nan_like(sampling)
+    assert math.isnan(empty["a"])
+    assert math.isnan(empty["b"]["c"])
+    assert all(math.isnan(value) for value in empty["b"]["d"])
+
+
+def test_open_breaker_writes_nan_rows(tmp_path):
+    devices = {}
+    for name in ["IGA-6-23-adv", "IGA-6-23-vis"]:
+        device = PyrometerLumasense(CONFIG, name)
+        device.init_output(str(tmp_path))
+        devices.update({name: device})
+    sampler = Sampler(devices, 1000)
+    for name, device in devices.items():
+        sampler.breakers.update({name: CircuitBreaker(name, device, interval=60)})
+    try:
+        assert not any(breaker.allow() for breaker in sampler.breakers.values())
+        for seq in range(3):
+            sampler.sample_step(tick(seq))
+    finally:
+        for breaker in sampler.breakers.values():
+            breaker.stop()
+    for name in devices:
+        with open(tmp_path / f"{name}.csv", encoding="utf-8") as f:
+            lines = f.readlines()[2:]
+        assert len(lines) == 3
+        for seq, line in enumerate(lines):
+            fields = line.strip().split(",")
+            assert fields[2] == str(seq)
+            assert fields[3] == "nan"
+
+
+def test_breaker_recovers_after_port_was_unplugged(monkeypatch):
+    monkeypatch.setattr(serial_bus, "Serial", StubPort)
+    monkeypatch.setattr(serial_bus.SerialBus, "_buses", {})
+    monkeypatch.setattr(StubPort, "connected", True)
+    monkeypatch.setattr(StubPort, "ports", [])
+    config = {**CONFIG, "serial-interface": {"port": "/dev/multilog-test-stub"}}
+    device = PyrometerLumasense(config, "IGA-6-23-adv")
+    breaker = CircuitBreaker(
+        "IGA-6-23-adv", device, threshold=1, interval=0.01, max_interval=0.05
+    )
+    try:
+        assert device.sample() == 1234.5
+        StubPort.unplug()
+        assert math.isnan(device.sample())
+        breaker.failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        time.sleep(0.1)  # reconnects fail while the port is unplugged
+        assert breaker.state == CircuitBreaker.OPEN
+        StubPort.connected = True
+        for _ in range(100):
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                break
+            time.sleep(0.01)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert device.sample() == 1234.5
+        breaker.success()
+        assert breaker.state == CircuitBreaker.HEALTHY
+    finally:
+        breaker.stop()
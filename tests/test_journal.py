@@ -0,0 +1,45 @@
+"""Tests of the journal of the writer service."""
+import os
+
+from multilog.journal import MAGIC, recover
+from multilog.writer import Writer
+
+
+def test_journal_size_is_bounded(tmp_path):
+    filenames = [f"{tmp_path}/a.csv", f"{tmp_path}/b.csv"]
+    for filename in filenames:
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("time_abs,time_rel,value,\n")
+    writer = Writer(journal=f"{tmp_path}/journal.bin")
+    sizes = []
+    for batch in range(200):
+        for filename in filenames:
+            writer.buffers.update(
+                {filename: [f"2024-01-01 00:00:00,{batch}.{i},{i},\n" for i in range(10)]}
+            )
+        writer.flush(filenames)
+        sizes.append(os.path.getsize(f"{tmp_path}/journal.bin"))
+    assert max(sizes) == len(MAGIC)
+    assert writer.journal.checkpoints == 200
+    writer.journal.close()
+
+
+def test_recover_after_checkpoint(tmp_path):
+    filename = f"{tmp_path}/a.csv"
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("time_abs,time_rel,value,\n")
+    writer = Writer(journal=f"{tmp_path}/journal.bin")
+    writer.buffers.update({filename: ["2024-01-01 00:00:00,0.0,1,\n"]})
+    writer.flush([filename])
+    with open(filename, "rb") as f:
+        expected = f.read()
+    # the batch in progress is journaled, but only partly written
+    writer.journal.append(filename, "2024-01-01 00:00:01,1.0,2,\n".encode())
+    writer.journal.sync()
+    with open(filename, "ab") as f:
+        f.write(b"2024-01-01 00:0")
+    writer.files[filename].close()
+    writer.journal.file.close()
+    recover(str(tmp_path))
+    with open(filename, "rb") as f:
+        assert f.read() == expected + "2024-01-01 00:00:01,1.0,2,\n".encode()